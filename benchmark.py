@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+from aiohttp import web
+
+from tools.standin_server import standin_app
+from tools.functionalities import search_url, set_base_url, configure_logging
+from tools.metrics import Metrics, get_metrics, set_metrics
+from tools.concurrency import get_concurrency
+
+
+ENGINES = ('static', 'hybrid', 'playwright', 'cards')
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+
+def cpu_seconds():
+    """User + system CPU time of this process and its finished children (parse workers, browsers)."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+async def run_engine(engine, rate, out_dir):
+    """Scrape one search on the stand-in with one engine and return its measurements."""
+    from scrapers import yp_scraper
+    from tools.http_client import YellowPagesClient
+    from tools.http_cache import ResponseCache, set_response_cache
+    from tools.rate_limiter import HostRateLimiter, set_rate_limiter
+    from tools.dedup import SeenIndex
+    from tools.sinks import CsvSink
+    from tools.retry import get_retry_policy, get_dead_letters
+
+    # Exact fetch latencies rather than histogram bucket bounds, which hide anything under a 2x change
+    set_metrics(Metrics(samples=True))
+    # Start cold and unthrottled (apart from --rate), so runs are comparable
+    set_rate_limiter(HostRateLimiter(rate=rate, burst=max(2, int(rate)), jitter=0))
+    set_response_cache(ResponseCache(path=os.path.join(out_dir, 'cache')))
+    os.environ['YP_DEAD_LETTERS'] = os.path.join(out_dir, 'dead_letters.jsonl')
+
+    search = search_url('restaurants', 'WA')
+    sinks = [CsvSink(os.path.join(out_dir, f'{engine}.csv'))]
+    start, cpu_start = time.perf_counter(), cpu_seconds()
+    try:
+        if engine == 'playwright':
+            from scrapers import yp_scraper_clean
+            from tools.browser import get_browser_service
+            async with get_browser_service():
+                urls = await yp_scraper_clean.all_business_urls_playwright(search)
+                listings = await yp_scraper_clean.scrapeMe_playwright(urls, seen=SeenIndex(), sinks=sinks)
+        else:
+            async with YellowPagesClient(cache=False, engine=engine) as client:
+                if engine == 'cards':
+                    # Search result cards only; no detail page is fetched
+                    listings = await yp_scraper.scrapeCards(search, client, seen=SeenIndex(), sinks=sinks)
+                elif engine == 'hybrid':
+                    from tools.browser import get_browser_service
+                    urls = await yp_scraper.yellowPages(search, client)
+                    async with get_browser_service():
+                        listings = await yp_scraper.scrapeMe(urls, client, seen=SeenIndex(), sinks=sinks, engine='hybrid')
+                else:
+                    urls = await yp_scraper.yellowPages(search, client)
+                    listings = await yp_scraper.scrapeMe(urls, client, seen=SeenIndex(), sinks=sinks)
+    finally:
+        for sink in sinks:
+            sink.close()
+    seconds = time.perf_counter() - start
+    metrics = get_metrics()
+    # Page loads of every engine (aiohttp and browser alike) are timed into the 'fetch' stage
+    fetch = metrics.merged('fetch')
+    concurrency = get_concurrency('playwright' if engine == 'playwright' else engine)
+    return {
+        'engine': engine,
+        'listings': listings,
+        'seconds': round(seconds, 2),
+        'listings_per_sec': round(listings / seconds, 2) if seconds else 0,
+        'p50_ms': round(fetch.quantile(0.5) * 1000, 1) if fetch.count else None,
+        'p95_ms': round(fetch.quantile(0.95) * 1000, 1) if fetch.count else None,
+        'cpu_seconds': round(cpu_seconds() - cpu_start, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'final_limit': concurrency.current,
+        'backoffs': concurrency.backoffs,
+        'retries': get_retry_policy().retries,
+        'dead_letters': get_dead_letters().added,
+        'metrics': metrics.snapshot(),
+    }
+
+
+async def benchmark(engines, rate, port, server_options):
+    """Serve the stand-in in this process and run each engine in its own child process."""
+    app = standin_app(**server_options)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    results = []
+    try:
+        for engine in engines:
+            for key in app['stats']:
+                app['stats'][key] = 0
+            with tempfile.TemporaryDirectory() as out_dir:
+                child = await asyncio.create_subprocess_exec(
+                    sys.executable, os.path.abspath(__file__), '--run-engine', engine, '--rate', str(rate),
+                    '--base-url', f"http://127.0.0.1:{port}", '--out-dir', out_dir,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                )
+                output, _ = await child.communicate()
+            lines = output.decode(errors='replace').splitlines()
+            found = [line for line in lines if line.startswith(RESULT_PREFIX)]
+            if found:
+                result = json.loads(found[-1][len(RESULT_PREFIX):])
+            else:
+                print(f"{engine} failed:\n" + '\n'.join(lines[-15:]))
+                errors = [line for line in lines if 'Error' in line] or lines or [f'exit code {child.returncode}']
+                result = {'engine': engine, 'error': errors[-1].strip()[:120]}
+            result['requests'] = app['stats']['requests']
+            result['http_429'] = app['stats']['429']
+            result['http_503'] = app['stats']['503']
+            results.append(result)
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def print_table(results):
+    columns = ('engine', 'listings', 'listings_per_sec', 'p50_ms', 'p95_ms', 'cpu_seconds', 'peak_rss_mb', 'final_limit',
+               'backoffs', 'retries', 'dead_letters', 'requests', 'http_429', 'http_503')
+    print(' | '.join(f"{column:>16}" for column in columns))
+    print('-' * (19 * len(columns)))
+    for result in results:
+        if 'error' in result:
+            print(f"{result['engine']:>16} | failed: {result['error']}")
+        else:
+            print(' | '.join(f"{str(result.get(column)):>16}" for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scraping engines against a local YellowPages stand-in")
+    parser.add_argument('--engines', default=','.join(ENGINES), help="comma separated: " + ', '.join(ENGINES))
+    parser.add_argument('--rate', type=float, default=50, help="requests per second allowed by the rate limiter")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=5, help="result pages of the benchmark search")
+    parser.add_argument('--per-page', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument('--padding-kb', type=int, default=60, help="page weight added to every response")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--run-engine', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--out-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_engine:
+        # Child process: measure a single engine
+        configure_logging()
+        set_base_url(args.base_url)
+        result = asyncio.run(run_engine(args.run_engine, args.rate, args.out_dir))
+        print(RESULT_PREFIX + json.dumps(result))
+    else:
+        server_options = {
+            'pages': args.pages, 'per_page': args.per_page, 'latency': args.latency,
+            'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate, 'padding_kb': args.padding_kb,
+        }
+        results = asyncio.run(benchmark(args.engines.split(','), args.rate, args.port, server_options))
+        print_table(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,205 @@
+import os
+import socket
+import asyncio
+import logging
+import argparse
+from itertools import groupby
+
+from scrapers.yp_scraper import yellowPages, fetchBusinessPage, keepBusinessPage
+from tools.http_client import YellowPagesClient
+from tools.pipeline import ParsePool, run_pipeline
+from tools.work_queue import WorkQueue, AsyncWorkQueue
+from tools.coordinator import RemoteWorkQueue, serve_coordinator
+from tools.scheduler import STATE_POPULATION, estimate_sizes
+from tools.dedup import listing_id
+from tools.retry import describe
+from tools.records import BusinessRecord
+from tools.sinks import default_sinks, write_all, close_all
+from tools.functionalities import search_url, set_base_url, configure_logging
+from tools.rate_limiter import HostRateLimiter, set_rate_limiter
+from tools.metrics import MetricsExporter
+
+
+log = logging.getLogger(__name__)
+
+
+def open_queue(target):
+    """A coordinator url (http://host:port) or the path of a local SQLite queue."""
+    if target.startswith(('http://', 'https://')):
+        return RemoteWorkQueue(target)
+    return AsyncWorkQueue(WorkQueue(target))
+
+
+def seed(queue_path, states, category):
+    """Queue one search task per state, largest state first."""
+    queue = WorkQueue(queue_path)
+    sizes = estimate_sizes(states)
+    items = [
+        (f"{category}:{state}", {
+            'url': search_url(category, state),
+            'state': state,
+            'category': category,
+        })
+        for state in sorted(states, key=sizes.get, reverse=True)
+    ]
+    print(f"Queued {queue.enqueue('search', items)} searches")
+    queue.close()
+
+
+async def keep_leases(queue, worker_id, ids, ttl):
+    """Heartbeat a batch every third of its ttl until cancelled."""
+    while True:
+        await asyncio.sleep(ttl / 3)
+        held = await queue.heartbeat(worker_id, ids, ttl)
+        if len(held) < len(ids):
+            print(f"Lost {len(ids) - len(held)} leases (expired and handed to another worker)")
+
+
+async def run_searches(queue, tasks, client):
+    """
+    Discover the listings of each search task and queue them, once per listing across all states.
+
+    Returns ({task id: result}, {task id: failure reason}).
+    """
+    results, failed = {}, {}
+    for task in tasks:
+        payload = task['payload']
+        try:
+            # strict: a page 1 that failed raises, so the task is retried instead of completed with 0 listings
+            urls = await yellowPages(payload['url'], client, strict=True)
+        except Exception as e:
+            log.warning("Search %s failed: %s", task['key'], e)
+            failed[task['id']] = describe(e)
+            continue
+        added = await queue.enqueue('listing', [
+            (listing_id(url), {'url': url, 'state': payload['state'], 'category': payload['category']}) for url in urls
+        ])
+        print(f"{task['key']}: {len(urls)} listings found, {added} new")
+        results[task['id']] = {'found': len(urls), 'queued': added}
+    return results, failed
+
+
+async def run_listings(tasks, client, parse_pool):
+    """
+    Scrape a batch of listing tasks through the fetch -> parse -> write pipeline.
+
+    Returns ({task id: record rows}, {task id: failure reason}); an error page
+    (404, 403, ...) fails its task instead of completing it with a blank record.
+    """
+    by_url = {task['payload']['url']: task['id'] for task in tasks}
+    records, errors, fetched = {}, {}, {}
+
+    async def fetch(url):
+        return await fetchBusinessPage(url, client, fetched)
+
+    def on_error(url, error):
+        errors[by_url[url]] = describe(error)
+
+    def write(url, res):
+        keepBusinessPage(url, res, client, fetched)
+        records[by_url[url]] = [record.to_row() for record in res]
+
+    await run_pipeline(list(by_url), fetch, parse_pool.parse, write, parsers=parse_pool.workers or 1,
+                       on_error=on_error)
+    results = {task_id: rows for task_id, rows in records.items() if rows}
+    failed = {task_id: errors.get(task_id, 'no records') for task_id in by_url.values() if task_id not in results}
+    return results, failed
+
+
+async def work(target, worker_id, batch=50, ttl=120, idle_wait=5):
+    """
+    Lease tasks from the queue and run them until no work is left anywhere.
+
+    Search tasks add listing tasks; listing tasks return their records to the queue.
+    Workers can be started and stopped at any time, on this host or others.
+    """
+    queue = open_queue(target)
+    done = 0
+    # Each worker keeps its own metrics-<worker id>.prom / .json up to date
+    async with YellowPagesClient() as client, MetricsExporter(prefix=f"metrics-{worker_id}"):
+        with ParsePool() as parse_pool:
+            while True:
+                tasks = await queue.lease(worker_id, batch, ttl)
+                if not tasks:
+                    stats = await queue.stats()
+                    if not any(counts.get('pending') or counts.get('leased') for counts in stats.values()):
+                        break
+                    # Other workers still hold leases; they may queue more listings or give tasks back
+                    await asyncio.sleep(idle_wait)
+                    continue
+
+                heartbeat = asyncio.create_task(keep_leases(queue, worker_id, [task['id'] for task in tasks], ttl))
+                try:
+                    searches = [task for task in tasks if task['kind'] == 'search']
+                    listings = [task for task in tasks if task['kind'] == 'listing']
+                    results, failed = await run_searches(queue, searches, client)
+                    if listings:
+                        listing_results, listing_failed = await run_listings(listings, client, parse_pool)
+                        results.update(listing_results)
+                        failed.update(listing_failed)
+                finally:
+                    heartbeat.cancel()
+                accepted = await queue.complete(worker_id, results)
+                for reason in set(failed.values()):
+                    await queue.fail(worker_id, [task_id for task_id in failed if failed[task_id] == reason], reason)
+                done += len(accepted)
+                print(f"{worker_id}: {done} tasks done | {await queue.stats()}")
+    await queue.close()
+
+
+def export(queue_path, directory='Yellowpage database'):
+    """Write the records collected in the queue to the usual per-state files and the Parquet dataset."""
+    queue = WorkQueue(queue_path)
+    rows = sorted(queue.results('listing'), key=lambda row: (row[1]['state'], row[1]['category']))
+    for (state, category), group in groupby(rows, key=lambda row: (row[1]['state'], row[1]['category'])):
+        sinks = default_sinks(f"{state}_{category}", directory,
+                              partition={'state': state, 'category': category, 'part': 'export'})
+        try:
+            for _, _, records in group:
+                write_all(sinks, [BusinessRecord.from_row(record) for record in records])
+        finally:
+            close_all(sinks)
+        print(f"{state} {category}: {sinks[0].written} records")
+    queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shard a crawl across worker processes and machines")
+    parser.add_argument('--base-url', help="scrape this server instead of yellowpages.com (e.g. the local stand-in)")
+    parser.add_argument('--rate', type=float,
+                        help="requests per second per host (default: YP_RATE or 1); 0 leaves it to the adaptive concurrency limit")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_cmd = commands.add_parser('seed', help="queue the search of each state")
+    seed_cmd.add_argument('--queue', default='crawl_queue.sqlite3')
+    seed_cmd.add_argument('--states', default=','.join(STATE_POPULATION), help="comma separated state codes")
+    seed_cmd.add_argument('--category', default='restaurants')
+
+    serve_cmd = commands.add_parser('serve', help="serve a local queue to workers on other hosts")
+    serve_cmd.add_argument('--queue', default='crawl_queue.sqlite3')
+    serve_cmd.add_argument('--host', default='0.0.0.0')
+    serve_cmd.add_argument('--port', type=int, default=8700)
+
+    work_cmd = commands.add_parser('work', help="lease and run tasks until the queue is drained")
+    work_cmd.add_argument('--queue', default='crawl_queue.sqlite3', help="queue file or coordinator url")
+    work_cmd.add_argument('--id', default=f"{socket.gethostname()}-{os.getpid()}")
+    work_cmd.add_argument('--batch', type=int, default=50)
+    work_cmd.add_argument('--ttl', type=int, default=120, help="lease length in seconds")
+
+    export_cmd = commands.add_parser('export', help="write the collected records to files")
+    export_cmd.add_argument('--queue', default='crawl_queue.sqlite3')
+
+    args = parser.parse_args()
+    configure_logging()
+    if args.base_url:
+        set_base_url(args.base_url)
+    if args.rate is not None:
+        set_rate_limiter(HostRateLimiter(rate=args.rate))
+    if args.command == 'seed':
+        seed(args.queue, args.states.split(','), args.category)
+    elif args.command == 'serve':
+        serve_coordinator(WorkQueue(args.queue), args.host, args.port)
+    elif args.command == 'work':
+        asyncio.run(work(args.queue, args.id, args.batch, args.ttl))
+    else:
+        export(args.queue)
@@ -1,9 +1,37 @@
 import asyncio
+import argparse
 import time
-from scrapers.yp_scraper import all_business_urls, scrapeMe, scrapeBusiness
+from scrapers import yp_scraper
+from scrapers.yp_scraper import scrape, scrapeCards
+from tools.http_client import YellowPagesClient
+from tools.http_cache import get_response_cache
+from tools.functionalities import configure_logging
+from tools.sinks import default_sinks, write_all, close_all, search_partition
+from tools.metrics import MetricsExporter, get_metrics
+from tools.browser import get_browser_service
+from tools.dedup import SeenIndex, set_seen_index
+from tools.rate_limiter import HostRateLimiter, set_rate_limiter
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape one YellowPages search")
+    parser.add_argument('--cards', action='store_true',
+                        help="build records from the search result cards instead of one detail page per business")
+    parser.add_argument('--columns', default='',
+                        help="with --cards: comma separated columns the output needs, e.g. Email,Website; "
+                             "a card missing one of them is completed from its detail page")
+    parser.add_argument('--engine', choices=('static', 'hybrid'), default='static',
+                        help="hybrid: load a listing in a browser only when its static page is unusable")
+    parser.add_argument('--fresh', action='store_true',
+                        help="scrape listings again that earlier runs already did (see seen_listings.bin)")
+    parser.add_argument('--rate', type=float,
+                        help="requests per second per host (default: YP_RATE or 1); 0 leaves it to the adaptive concurrency limit")
+    args = parser.parse_args()
+    configure_logging()
+    if args.fresh:
+        set_seen_index(SeenIndex())
+    if args.rate is not None:
+        set_rate_limiter(HostRateLimiter(rate=args.rate))
     start_time = time.time()
     
     async def main():
@@ -13,20 +41,35 @@ if __name__ == "__main__":
         # Example url below:
         # url = https://www.yellowpages.com/search?search_terms=Barbers&geo_location_terms=Moreno+Valley%2C+CA
         # time_interval = 4
-        print("Scraping Business urls. Please wait..")
-        bizz_urls = await all_business_urls(url)
-        print(f"DEBUG: Found {len(bizz_urls)} business URLs")
-        print(f"DEBUG: First few URLs: {bizz_urls[:3] if bizz_urls else 'None'}")
-        
-        if not bizz_urls:
-            print("DEBUG: No business URLs found, stopping here")
-            return None
-            
-        print("Scraping datas.")
-        scrape_datas = await scrapeMe(bizz_urls)        
-        return scrape_datas
+        # One pooled client serves both search pages and detail pages for the whole run
+        # metrics.prom / metrics.json are refreshed every 30s while it runs; the hybrid
+        # engine's fallback browser (started on its first escalation only) closes with them
+        async with YellowPagesClient(engine=args.engine) as client, MetricsExporter(), get_browser_service():
+            if args.cards:
+                columns = [column.strip() for column in args.columns.split(',') if column.strip()]
+                print("Scraping search result cards. Please wait..")
+                return await scrapeCards(url, client, columns)
+
+            print("Scraping datas. Businesses are scraped as their search page comes in..")
+            sinks, scraped, started = None, 0, time.time()
+            try:
+                async for record in scrape(url, client, engine=args.engine):
+                    if sinks is None:
+                        # Named after the category page 1 reported
+                        sinks = default_sinks(yp_scraper.categories, partition=search_partition(url))
+                        print(f"First record after {round(time.time() - started, 1)} seconds")
+                    write_all(sinks, [record])
+                    scraped += 1
+            finally:
+                if sinks is not None:
+                    close_all(sinks)
+            print(f"Scraped {scraped} businesses")
+            print(client.concurrency.summary())
+            return scraped or None
 
     print(asyncio.run(main()))
+    print(get_response_cache().summary())
+    print(get_metrics().summary())
 
     total_time = round(time.time()-start_time, 2)
     time_in_secs = round(total_time)
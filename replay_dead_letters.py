@@ -0,0 +1,88 @@
+import os
+import asyncio
+import argparse
+
+from scrapers.yp_scraper import fetchSearchPage, scrapeMe
+from tools.extraction import get_extractor
+from tools.http_client import YellowPagesClient
+from tools.retry import DeadLetters, set_dead_letters
+from tools.dedup import dedupe_urls
+from tools.sinks import default_sinks, close_all
+from tools.functionalities import set_base_url, configure_logging
+from tools.rate_limiter import HostRateLimiter, set_rate_limiter
+
+
+async def replay(path, include_permanent=False, directory='Yellowpage database'):
+    """
+    Scrape the urls of a dead-letter file again.
+
+    Search pages are fetched again and their listings scraped along with the failed
+    detail pages; records go to <directory>/dead_letter_replay.csv/.xlsx. Failures
+    during the replay are collected in <path>.replay, and only once the replay has
+    finished is the dead-letter file rewritten with what still fails (plus the
+    permanent failures that were not replayed). An interrupted replay leaves the
+    file untouched.
+
+    Args:
+        path: Dead-letter file
+        include_permanent: Also replay failures classified as permanent (e.g. HTTP 404)
+        directory: Output directory of the replayed records
+    """
+    dead_letters = DeadLetters(path)
+    entries = dead_letters.latest()
+    if not entries:
+        print(f"Nothing to replay in {path}")
+        return 0
+
+    # Not worth asking again; they stay on file
+    skipped = [entry for entry in entries if not entry['retryable'] and not include_permanent]
+    entries = [entry for entry in entries if entry not in skipped]
+    print(f"Replaying {len(entries)} urls ({len(skipped)} permanent failures kept)")
+
+    # What fails again goes to a file of its own until the replay is over
+    failed_again = DeadLetters(path + '.replay')
+    if os.path.exists(failed_again.path):
+        os.remove(failed_again.path)
+    set_dead_letters(failed_again)
+
+    async with YellowPagesClient() as client:
+        detail_urls = [entry['url'] for entry in entries if entry['kind'] == 'detail']
+        for entry in entries:
+            if entry['kind'] == 'search':
+                try:
+                    search = await fetchSearchPage(entry['url'], client, get_extractor())
+                except Exception as e:
+                    print(f"Search page {entry['url']} failed again: {e}")
+                    continue
+                if search is not None:
+                    detail_urls += search['business_urls']
+
+        sinks = default_sinks('dead_letter_replay', directory)
+        try:
+            scraped = await scrapeMe(dedupe_urls(detail_urls), client, sinks=sinks)
+        finally:
+            close_all(sinks)
+
+    still_failing = failed_again.latest()
+    dead_letters.replace(skipped + still_failing)
+    if os.path.exists(failed_again.path):
+        os.remove(failed_again.path)
+    print(f"Replayed {len(entries)} urls: {scraped} records written to {directory}, "
+          f"{len(still_failing)} still failing")
+    return scraped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the urls that failed in earlier runs again")
+    parser.add_argument('--file', default='dead_letters.jsonl', help="dead-letter file to replay")
+    parser.add_argument('--all', action='store_true', help="also replay permanent failures (e.g. HTTP 404)")
+    parser.add_argument('--base-url', help="scrape this server instead of yellowpages.com (e.g. the local stand-in)")
+    parser.add_argument('--rate', type=float,
+                        help="requests per second per host (default: YP_RATE or 1); 0 leaves it to the adaptive concurrency limit")
+    args = parser.parse_args()
+    configure_logging()
+    if args.base_url:
+        set_base_url(args.base_url)
+    if args.rate is not None:
+        set_rate_limiter(HostRateLimiter(rate=args.rate))
+    asyncio.run(replay(args.file, args.all))
@@ -1,170 +1,517 @@
-import re
+import time
 import asyncio
+import logging
 import aiohttp
 import requests
-import pandas as pd
-from lxml import etree
-from time import sleep
-from bs4 import BeautifulSoup
+from contextlib import nullcontext, aclosing, AsyncExitStack
 
-from tools.functionalities import userAgents, randomTime, verify_yellow, yaml_by_select, yp_lists,create_path
-       
+from tools.functionalities import yp_lists, base_url, create_path
+from tools.extraction import get_extractor, extract_business, extract_search_page, missing_columns
+from tools.http_client import YellowPagesClient
+from tools.pagination import fetch_remaining_pages, stream_remaining_pages
+from tools.dedup import dedupe_urls, dedupe_records, dedupe_stream, get_seen_index, listing_id
+from tools.pipeline import ParsePool, run_pipeline, stream_records
+from tools.retry import FetchFailed, status_error, get_dead_letters, get_retry_policy
+from tools.sinks import default_sinks, write_all, close_all, search_partition, ChangeSink
+from tools.fingerprints import FingerprintStore
+from tools.records import BusinessRecord
+from tools.metrics import get_metrics
+from scrapers.yp_scraper_hybrid import HybridFetcher
+
+
+log = logging.getLogger(__name__)
    
-async def yellowPages(yp_url): # play parameter is for playwright | heads parameter is for switching a browser headless.       
-    # Try to bypass Cloudflare with better browser mimicking
-    connector = aiohttp.TCPConnector(ssl=False, limit=1, limit_per_host=1)
-    timeout = aiohttp.ClientTimeout(total=60)
+SEARCH_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+
+
+async def fetchSearchPage(url, client, extractor, cards=False, strict=False):
+    """
+    Fetch and parse one search page. Returns the extractor's search_page dict (with its cards if asked), or None on failure.
+
+    Pages that fail even after their retries go to the dead-letter file, unless
+    strict: then a non-200 response raises FetchFailed and nothing is dead-lettered,
+    for callers that retry the page themselves.
+    """
+    try:
+        response = await client.fetch(url, headers={**SEARCH_HEADERS, 'Referer': f"{base_url()}/"})
+    except Exception as e:
+        if not strict:
+            get_dead_letters().add(url, e, 'search')
+        raise
+    log.debug("HTTP %s for %s (%d bytes)", response.status, url, len(response.body))
+    
+    if response.status != 200:
+        error = status_error(url, response.status, response.headers)
+        if strict:
+            raise error
+        get_dead_letters().add(url, error, 'search')
+        return None
+        
+    # Making soup and using LXML for xpath approach:
+    search = extract_search_page(response.body, extractor=extractor, cards=cards)
+    
+    global categories
+    categories = search['categories']
+    log.debug("Categories found: %s, business links: %d", categories, len(search['business_urls']))
+    return search
+
+
+async def yellowPages(yp_url, client=None, page_concurrency=4, cards=False, strict=False): # client is the shared YellowPagesClient for the whole run.
+    # With cards, the search result cards (BusinessRecords) are returned instead of the business urls.
+    # With strict, a page 1 that could not be fetched raises instead of looking like a search without results.
+    if client is None:
+        async with YellowPagesClient() as client:
+            return await yellowPages(yp_url, client, page_concurrency, cards, strict)
+
+    log.debug("Starting yellowPages with URL: %s", yp_url)
     
-    # Create a session that looks more like a real browser
-    async with aiohttp.ClientSession(
-        connector=connector, 
-        timeout=timeout,
-        cookie_jar=aiohttp.CookieJar(),
-        headers={
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Cache-Control': 'max-age=0',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1',
-        }
-    ) as session:
-        print(f"DEBUG: Starting yellowPages with URL: {yp_url}")
+    # if verify_yellow(yp_url):
+    #     return "Invalid link"
+
+    # Parquet partition (state/category) of everything scraped from this search
+    global partition
+    partition = search_partition(yp_url)
+
+    extractor = get_extractor()
+
+    # Page 1 tells us how many result pages really exist:
+    try:
+        first = await fetchSearchPage(f"{yp_url}&page=1", client, extractor, cards, strict)
+    except (requests.exceptions.ConnectTimeout, aiohttp.ClientError, FetchFailed) as e:
+        if strict:
+            raise
+        log.warning("Connection error on page 1, skipping url %s: %s", yp_url, e)
+        return []
+
+    # If the search_words contains 'No results' then script will exit. I approach this step if user type a gibberish word or the search word doesn't exist.
+    if first is None or first['no_results']:
+        print(f"No content. Please try again in few minutes.")
+        return []
+
+    total_pages = first['total_pages']
+    log.debug("Detected %d result pages", total_pages)
+    collect = 'cards' if cards else 'business_urls'
+    total_business_urls = list(first[collect])
+
+    # Remaining pages are fetched concurrently; the first empty page cancels the rest.
+    total_business_urls += await fetch_remaining_pages(
+        yp_lists(yp_url, total_pages)[1:],
+        lambda url: fetchSearchPage(url, client, extractor, cards),
+        page_concurrency,
+        collect,
+    )
+    # The same listing often shows up on several search pages
+    total_business_urls = dedupe_records(total_business_urls) if cards else dedupe_urls(total_business_urls)
         
-        # if verify_yellow(yp_url):
-        #     return "Invalid link"
-
-        scrape = yaml_by_select('selectors')    
-        print(f"DEBUG: Business URL selector: {scrape['business_urls']}")
-
-        # 101 is just a random number. The scraper will exist if there are no contents.
-        total_page_urls = yp_lists(yp_url)
-        total_business_urls = []
-
-        # Iterating and using beautifulsoup to extract all business urls:
-        for idx, url in enumerate(total_page_urls):      
-            print(f"DEBUG: Processing page {idx+1}/{len(total_page_urls)}: {url}")
-            try:                
-                headers = {
-                    'User-Agent': userAgents(),
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Referer': 'https://www.yellowpages.com/',
-                    'Cache-Control': 'max-age=0'
-                }
-                async with session.get(url, headers=headers) as response:
-                    print(f"DEBUG: HTTP Status for page {idx+1}: {response.status}")
-                    
-                    if response.status != 200:
-                        print(f"DEBUG: Non-200 status code, skipping page")
-                        continue
-                        
-                    # sleep(randomTime(interval))
-                    # Making soup and using LXML for xpath approach:
-                    response_text = await response.text()
-                    print(f"DEBUG: Response text length: {len(response_text)}")
-                    
-                    soup = etree.HTML(str(BeautifulSoup(response_text, 'lxml')))
-                    
-                    global categories
-                    categories_raw = soup.xpath(scrape['categories'])
-                    print(f"DEBUG: Categories found: {categories_raw}")
-                    categories = f"""{''.join(categories_raw)} in ."""
-                    
-                    page_content = ''.join(soup.xpath(scrape['page_content']))
-                    print(f"DEBUG: Page content: {page_content[:100]}...")
-
-                    # If the search_words contains 'No results' then script will exit. I approach this step if user type a gibberish word or the search word doesn't exist.
-                    pattern = re.search("^No results found for.*", page_content)  
-                    
-                    business_links_raw = soup.xpath(scrape['business_urls'])
-                    print(f"DEBUG: Raw business links found: {len(business_links_raw)}")
-                    print(f"DEBUG: First few raw links: {business_links_raw[:3]}")
-                    
-                    business_links = [f"https://www.yellowpages.com{link}" for link in business_links_raw]
-                    print(f"DEBUG: Processed business links: {len(business_links)}")
-                    total_business_urls.extend(business_links)
-                    
-                    if pattern != None: 
-                        print(f"DEBUG: 'No results' pattern found: {pattern}")
-                        print(f"No content. Please try again in few minutes.")           
-                        break
-                    
-                    # Add delay between requests to avoid rate limiting
-                    if idx > 0:
-                        sleep(randomTime(3))  # 1-3 seconds delay
-                    
-                    # Stop after first page for debugging
-                    if idx == 0:
-                        print(f"DEBUG: Stopping after first page for debugging")
-                        break                           
-            except (requests.exceptions.ConnectTimeout, aiohttp.ClientError) as e:
-                print(f"DEBUG: Connection error on page {idx+1}: {e}")
-                print(f"Connection error. Skipping url {url}")
-                break
-            except Exception as e:
-                print(f"DEBUG: Unexpected error on page {idx+1}: {e}")
-                break                  
-            
-        print(f"DEBUG: Final total business URLs found: {len(total_business_urls)}")
-        return total_business_urls
+    log.debug("Final total business URLs found: %d", len(total_business_urls))
+    return total_business_urls
     
 
-async def all_business_urls(url):
-    boy_task = await asyncio.create_task(yellowPages(url))
+async def discover(yp_url, client, page_concurrency=4):
+    """
+    yellowPages as an async generator: yields business urls as soon as their search page is in.
+
+    Each url comes once (canonical, first sighting wins), so detail scraping can
+    start on page 1's listings while the other pages are still loading.
+    """
+    global partition
+    partition = search_partition(yp_url)
+    extractor = get_extractor()
+
+    try:
+        first = await fetchSearchPage(f"{yp_url}&page=1", client, extractor)
+    except (requests.exceptions.ConnectTimeout, aiohttp.ClientError, FetchFailed) as e:
+        log.warning("Connection error on page 1, skipping url %s: %s", yp_url, e)
+        return
+    if first is None or first['no_results']:
+        print(f"No content. Please try again in few minutes.")
+        return
+
+    new_urls = dedupe_stream()
+    for url in new_urls(first['business_urls']):
+        yield url
+    pages = stream_remaining_pages(
+        yp_lists(yp_url, first['total_pages'])[1:],
+        lambda url: fetchSearchPage(url, client, extractor),
+        page_concurrency,
+    )
+    async with aclosing(pages):
+        async for urls in pages:
+            for url in new_urls(urls):
+                yield url
+
+
+async def all_business_urls(url, client=None):
+    boy_task = await asyncio.create_task(yellowPages(url, client))
     return boy_task
 
     
-async def scrapeBusiness(urls):
-    scrape = yaml_by_select('selectors')
+async def fetchBusinessPage(url, client, fetched=None):
+    """
+    Fetch one business detail page body; an error page raises FetchFailed instead of parsing into an empty record.
+
+    With a fetched dict the response is kept there until keepBusinessPage() knows
+    whether its record was complete.
+    """
+    response = await client.fetch(url)
+    if response.status != 200:
+        raise status_error(url, response.status)
+    if fetched is not None:
+        fetched[url] = response
+    return response.body
+
+
+def keepBusinessPage(url, res, client, fetched):
+    """Cache the page fetchBusinessPage() kept for url, but only if it produced a record with a business name."""
+    response = fetched.pop(url, None)
+    if response is not None and res and res[0].business:
+        client.store(url, response)
+
+
+async def scrapeBusiness(urls, client=None):
+    if client is None:
+        async with YellowPagesClient() as client:
+            return await scrapeBusiness(urls, client)
+
     # responses = await all_business_urls(urls)
-    yellow_in_dicts = []
-    async with aiohttp.ClientSession() as session:        
-        async with session.get(urls, headers={'User-Agent': userAgents()}) as response:  
-            # sleep(2)      
-            content = await response.read()
-            soup = etree.HTML(str(BeautifulSoup(content, 'lxml')))
-            business_names = ''.join(soup.xpath(scrape['business_name']))            
-            datas = {
-                "Business": business_names,
-                "Contact": ''.join(soup.xpath(scrape['contact'])),
-                "Email": ''.join(soup.xpath(scrape['email'])).replace("mailto:", ""),
-                "Address": ''.join(soup.xpath(scrape['address'])),
-                "Map and direction": ''.join(f'''https://www.yellowpages.com{soup.xpath(scrape['map_and_direction'])}'''), 
-                "Review": ''.join(soup.xpath(scrape['review'])).replace("rating-stars ", ""),
-                "Review count": re.sub(r"[()]", "", ''.join(soup.xpath(scrape['review_count']))), 
-                "Hyperlink": urls,
-                "Images": ''.join(soup.xpath(scrape['images'])), 
-                "Website": ''.join(soup.xpath(scrape['website'])), 
-            }
-            yellow_in_dicts.append(datas)
-        return yellow_in_dicts
-
-
-async def scrapeMe(url_lists):    
-    yellow_in_dicts = []
-    print(f"Scraping | {categories}. Number of business | {len(url_lists)}. Please wait.")
+    response = await client.fetch(urls)
+    return extract_business(response.body, urls)
+
+
+def detail_stages(client, parse_pool, engine='static', browser_pages=2):
+    """
+    fetch / parse / keep functions and parse slots of run_pipeline for an engine's detail pages.
+
+    'static' fetches with the client only; 'hybrid' escalates single urls to a
+    browser page when their static page is unusable (see HybridFetcher), with
+    browser_pages extra parse slots so escalations never hold up static parsing.
+    Returns (fetch, parse, keep, parsers, hybrid); hybrid is the HybridFetcher or None.
+    """
+    parsers = parse_pool.workers or 1
+    if engine == 'hybrid':
+        hybrid = HybridFetcher(client, parse_pool, browser_pages=browser_pages)
+        return hybrid.fetch, hybrid.parse, lambda url, res: None, parsers + browser_pages, hybrid
+
+    # Responses waiting for their record before they may be cached
+    fetched = {}
+
+    async def fetch(url):
+        return await fetchBusinessPage(url, client, fetched)
+
+    def keep(url, res):
+        keepBusinessPage(url, res, client, fetched)
+
+    return fetch, parse_pool.parse, keep, parsers, None
+
+
+def print_hybrid_summary(hybrid):
+    if hybrid is not None:
+        print(hybrid.summary())
+        if hybrid.counters['escalated']:
+            print(hybrid.interception.summary())
+
+
+async def scrapeMe(url_lists, client=None, seen=None, sinks=None, parse_pool=None, fetchers=20, engine='static',
+                   browser_pages=2):
+    """
+    Scrape every business and stream each record to the sinks as soon as it is done.
+
+    Runs as a fetch -> parse -> write pipeline: fetchers pages are downloaded at
+    once, parsing happens in a ParsePool (one process per core unless parse_pool is
+    given) and a single writer feeds the sinks. Without sinks, records go to a CSV
+    and an .xlsx named after the category under 'Yellowpage database'. With
+    engine='hybrid', a listing whose static page is unusable is loaded again on
+    one of browser_pages browser pages. Returns the number of records written.
+    """
+    if client is None:
+        async with YellowPagesClient(engine=engine) as client:
+            return await scrapeMe(url_lists, client, seen, sinks, parse_pool, fetchers, engine, browser_pages)
+    if parse_pool is None:
+        with ParsePool(engine=engine) as parse_pool:
+            return await scrapeMe(url_lists, client, seen, sinks, parse_pool, fetchers, engine, browser_pages)
+
+    # Listings already scraped (on another page, category or state) are not fetched again
+    if seen is None:
+        seen = get_seen_index()
+    url_lists = seen.filter(url_lists)
+
+    own_sinks = sinks is None
+    if own_sinks:
+        sinks = default_sinks(globals().get('categories', 'YellowPages_Data'), partition=globals().get('partition'))
+    print(f"Scraping | {globals().get('categories', 'YellowPages_Data')}. Number of business | {len(url_lists)}. Please wait.")
     
-    tasks =[]
-    for url in url_lists:
-        bizz_name = ' '.join(url.split("/")[-1].split("?")[0].split("-")[:-1])
-        sleep(.5)
-        print(f"Scraping business: {bizz_name}")
-        tasks.append(scrapeBusiness(url))
-    # tasks = [scrapeBusiness(url) for url in url_lists]    
-    results = await asyncio.gather(*tasks)
-    for res in results:
-        yellow_in_dicts += res
-
-    create_path('Yellowpage database')
-    df = pd.DataFrame(yellow_in_dicts)
-    df.to_excel(f'Yellowpage database//{categories}.xlsx', index=False)
+    fetch, parse, keep, parsers, hybrid = detail_stages(client, parse_pool, engine, browser_pages)
+
+    def dead_letter(url, error):
+        get_dead_letters().add(url, error, 'detail')
+
+    def write(url, res):
+        log.debug("Scraped business: %s", url)
+        keep(url, res)
+        write_all(sinks, res)
+        if res:
+            seen.add(url)
+
+    try:
+        scraped = await run_pipeline(url_lists, fetch, parse, write, fetchers=fetchers, parsers=parsers,
+                                     on_error=dead_letter)
+    finally:
+        if hybrid is not None:
+            await hybrid.close()
+        if own_sinks:
+            close_all(sinks)
+    print_hybrid_summary(hybrid)
+    print(seen.summary())
+    print(client.concurrency.summary())
+    print(get_retry_policy().summary())
+    if get_dead_letters().added:
+        print(get_dead_letters().summary())
     print('Scraping complete.')
+    return scraped
+
+
+async def scrape(query, client=None, seen=None, parse_pool=None, fetchers=20, page_concurrency=4, engine='static',
+                 browser_pages=2, frontier=None, frontier_key=None, on_discovered=None):
+    """
+    Stream the BusinessRecords of a search: `async for record in scrape(url): ...`
+
+    Discovery and detail scraping overlap: the business urls of each search page
+    go to the detail fetchers as soon as that page is in, so the first records
+    arrive after a couple of page loads and the full url list is never collected.
+    Records come in the order they finish. Listings already in the SeenIndex are
+    skipped; failures go to the dead-letter file. Writing them is up to the caller.
+
+    With a CrawlFrontier, discovered urls are checkpointed under frontier_key as
+    they come in, the records an interrupted run finished are yielded first and
+    only the rest is scraped, like scrape_playwright.
+
+    Args:
+        query: Search url (see search_url())
+        seen: SeenIndex of listings scraped before (default: the shared one)
+        fetchers: Number of detail pages fetched at once
+        page_concurrency: Number of search pages fetched at once
+        engine: 'static', or 'hybrid' to escalate unusable detail pages to a browser
+        browser_pages: Browser pages of the hybrid engine's escalations
+        on_discovered: Called with the number of urls found once the search is exhausted
+    """
+    if seen is None:
+        seen = get_seen_index()
+    finished = set()
+    if frontier is not None:
+        finished = set(frontier.discovered_urls(frontier_key)) - set(frontier.pending_urls(frontier_key))
+        # Listings checkpointed by an earlier run go out first, straight from the frontier
+        for record in frontier.records(frontier_key):
+            yield record
+
+    async def urls():
+        found = 0
+        async with aclosing(discover(query, client, page_concurrency)) as discovered:
+            async for url in discovered:
+                found += 1
+                if listing_id(url) in seen:
+                    seen.avoided += 1
+                    continue
+                if frontier is not None:
+                    frontier.add_urls(frontier_key, [url])
+                if url not in finished:
+                    yield url
+        if on_discovered is not None:
+            on_discovered(found)
+
+    def dead_letter(url, error):
+        get_dead_letters().add(url, error, 'detail')
+
+    async with AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(YellowPagesClient(engine=engine))
+        if parse_pool is None:
+            parse_pool = stack.enter_context(ParsePool(engine=engine))
+        fetch, parse, keep, parsers, hybrid = detail_stages(client, parse_pool, engine, browser_pages)
+        if hybrid is not None:
+            stack.push_async_callback(hybrid.close)
+            stack.callback(print_hybrid_summary, hybrid)
+
+        async def produce(emit):
+            async def write(url, res):
+                keep(url, res)
+                for record in res:
+                    await emit(record)
+                if res:
+                    # Checkpointed before it counts as seen, so a crash in between cannot lose it
+                    if frontier is not None:
+                        frontier.complete_url(frontier_key, url, res)
+                    seen.add(url)
+
+            await run_pipeline(urls(), fetch, parse, write, fetchers=fetchers, parsers=parsers, on_error=dead_letter)
+
+        records = await stack.enter_async_context(aclosing(stream_records(produce)))
+        async for record in records:
+            yield record
+
+
+async def scrapeCards(yp_url, client=None, columns=None, seen=None, sinks=None, parse_pool=None, fetchers=20):
+    """
+    Cards-only scrape of a search: records come straight from its search result cards.
+
+    Cards already carry the name, phone, address, rating and often the website, so
+    a phone/address export needs the search pages only. columns lists the exported
+    columns the output must have (e.g. ('Business', 'Contact', 'Email')); a card
+    that lacks any of them is completed from its detail page, and only those
+    detail pages are fetched. Without columns no detail page is fetched at all.
+    Returns the number of records written.
+    """
+    if client is None:
+        async with YellowPagesClient() as client:
+            return await scrapeCards(yp_url, client, columns, seen, sinks, parse_pool, fetchers)
+
+    columns = tuple(columns or ())
+    missing_columns(BusinessRecord(), columns)  # fail on unknown column names before any fetch
+    cards = await yellowPages(yp_url, client, cards=True)
+    if seen is None:
+        seen = get_seen_index()
+    fresh = set(seen.filter([card.hyperlink for card in cards]))
+    cards = [card for card in cards if card.hyperlink in fresh]
+
+    # Cards missing a requested column, by url, until their detail page fills them in
+    incomplete = {card.hyperlink: card for card in cards if missing_columns(card, columns)}
+    complete = [card for card in cards if card.hyperlink not in incomplete]
+    get_metrics().inc('detail_fetches_skipped', len(complete))
+
+    own_sinks = sinks is None
+    if own_sinks:
+        sinks = default_sinks(globals().get('categories', 'YellowPages_Data'), partition=globals().get('partition'))
+    print(f"Scraping cards | {globals().get('categories', 'YellowPages_Data')}. Number of business | {len(cards)}, "
+          f"{len(incomplete)} of them need their detail page. Please wait.")
+
+    written = [0]
+    fetched = {}
+
+    def write(url, res):
+        keepBusinessPage(url, res, client, fetched)
+        # A failed detail fetch still leaves us the card itself
+        records = [record.merged(incomplete[url]) for record in res] or [incomplete[url]]
+        write_all(sinks, records)
+        written[0] += len(records)
+        seen.add(url)
+
+    async def fetch(url):
+        return await fetchBusinessPage(url, client, fetched)
+
+    def dead_letter(url, error):
+        get_dead_letters().add(url, error, 'detail')
+
+    try:
+        write_all(sinks, complete)
+        written[0] += len(complete)
+        for card in complete:
+            seen.add(card.hyperlink)
+        if incomplete:
+            with ParsePool() if parse_pool is None else nullcontext(parse_pool) as pool:
+                await run_pipeline(list(incomplete), fetch, pool.parse, write, fetchers=fetchers,
+                                   parsers=pool.workers or 1, on_error=dead_letter)
+    finally:
+        if own_sinks:
+            close_all(sinks)
+    print(f"Cards: {len(complete)} records from search cards alone, {len(incomplete)} completed from detail pages")
+    print(client.concurrency.summary())
+    if get_dead_letters().added:
+        print(get_dead_letters().summary())
+    print('Scraping complete.')
+    return written[0]
+
+
+async def refreshMe(url_lists, scope, client=None, store=None, sinks=None, changes=None, parse_pool=None, fetchers=20,
+                    directory='Yellowpage database'):
+    """
+    Incremental re-scrape of a scope (e.g. "WA/restaurants") scraped before.
+
+    Every listing is fetched with the validators of its last fetch, so the server
+    can answer 304. Pages whose raw hash is unchanged are neither parsed nor
+    written. Of the rest, only records whose fields changed are written. The
+    changes log gets one line per new, changed or disappeared listing.
+
+    Args:
+        url_lists: Business urls the scope's search lists today
+        scope: Key of the listing set, e.g. "<state>/<category>"
+        store: FingerprintStore (default: listing_fingerprints.sqlite3)
+        sinks: Sinks for the new and changed records (default: <prefix>_refresh CSV + .xlsx)
+        changes: ChangeSink for the change log (default: <prefix>_changes_<date>.jsonl)
+
+    Returns a dict counting new, changed, unchanged, removed and failed listings.
+    """
+    if client is None:
+        async with YellowPagesClient() as client:
+            return await refreshMe(url_lists, scope, client, store, sinks, changes, parse_pool, fetchers, directory)
+    if parse_pool is None:
+        with ParsePool() as parse_pool:
+            return await refreshMe(url_lists, scope, client, store, sinks, changes, parse_pool, fetchers, directory)
+
+    own_store, own_sinks, own_changes = store is None, sinks is None, changes is None
+    store = store or FingerprintStore()
+    prefix = scope.replace('/', '_')
+    if own_sinks:
+        sinks = default_sinks(f"{prefix}_refresh", directory)
+    if own_changes:
+        create_path(directory)
+        changes = ChangeSink(f"{directory}//{prefix}_changes_{time.strftime('%Y%m%d')}.jsonl")
+
+    url_lists = dedupe_urls(url_lists)
+    run_id = store.start_run(scope, url_lists)
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+    # Body and headers of the pages that changed, until their records are written
+    fetched, failures = {}, set()
+    print(f"Refreshing | {scope}. Number of business | {len(url_lists)}. Please wait.")
+
+    async def fetch(url):
+        response = await client.fetch(url, headers=store.conditional_headers(url), revalidate=True)
+        if response.status == 304 or (response.status == 200 and store.page_unchanged(url, response.body)):
+            return None
+        if response.status != 200:
+            raise status_error(url, response.status)
+        fetched[url] = (response.body, response.headers)
+        return response.body
+
+    def on_error(url, error):
+        failures.add(url)
+        fetched.pop(url, None)
+        counts['failed'] += 1
+        get_dead_letters().add(url, error, 'detail')
+
+    def write(url, res):
+        if url not in fetched:
+            # Unchanged page (304 or same hash), or a failure already counted
+            counts['unchanged'] += url not in failures
+            return
+        body, headers = fetched.pop(url)
+        if not res:
+            counts['failed'] += 1
+        for record in res:
+            change = store.update(url, scope, run_id, body, record, headers)
+            counts[change] += 1
+            if change != 'unchanged':
+                write_all(sinks, [record])
+                changes.write_change(change, url, record)
 
+    try:
+        await run_pipeline(url_lists, fetch, parse_pool.parse, write, fetchers=fetchers,
+                           parsers=parse_pool.workers or 1, on_error=on_error)
+        for url, record in store.finish_run(scope, run_id, counts):
+            counts['removed'] += 1
+            changes.write_change('removed', url, record)
+    finally:
+        if own_sinks:
+            close_all(sinks)
+        if own_changes:
+            changes.close()
+        if own_store:
+            store.close()
+    print(f"Refresh of {scope}: " + ', '.join(f"{count} {name}" for name, count in counts.items()))
+    return counts
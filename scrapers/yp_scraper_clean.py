@@ -1,356 +1,411 @@
-import re
 import asyncio
-import pandas as pd
-from playwright.async_api import async_playwright
-from time import sleep
-from bs4 import BeautifulSoup
-from lxml import etree
+import logging
+from contextlib import aclosing
 
-from tools.functionalities import userAgents, randomTime, verify_yellow, yaml_by_select, yp_lists, create_path
+from tools.functionalities import yp_lists
+from tools.extraction import get_extractor, extract_search_page
+from tools.metrics import get_metrics
+from tools.concurrency import get_concurrency
+from tools.retry import status_error, get_retry_policy, get_dead_letters
+from tools.rate_limiter import get_rate_limiter
+from tools.http_cache import get_response_cache
+from tools.pagination import fetch_remaining_pages, stream_remaining_pages
+from tools.page_pool import PagePool
+from tools.browser import get_browser_service
+from tools.interception import InterceptionProfile
+from tools.dedup import dedupe_urls, dedupe_stream, get_seen_index, listing_id
+from tools.sinks import default_sinks, write_all, close_all, search_partition
+from tools.pipeline import stream_records
 
 
-async def yellowPages_playwright(yp_url):
+log = logging.getLogger(__name__)
+
+async def load_page(page, url, labels, settle=0):
     """
-    Playwright-based scraper that can handle Cloudflare protection
-    Uses single browser window throughout the process
+    Navigate page to url once and return its HTML.
+
+    Raises FetchFailed for a non-200 response (retryable for 429/5xx), so callers
+    can run it through the RetryPolicy.
+
+    Args:
+        page: Playwright page to load the url in
+        url: Page to load
+        labels: Metrics labels (engine, page_type)
+        settle: Extra seconds given to the page's scripts before reading it
     """
-    async with async_playwright() as p:
-        print(f"Starting Yellow Pages scraper for: {yp_url}")
+    metrics = get_metrics()
+    await get_rate_limiter().acquire(url)
+    with metrics.timer('fetch', **labels):
+        # Browser page loads share one adaptive in-flight limit
+        async with get_concurrency('playwright').slot() as outcome:
+            response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
+            outcome.status = response.status
+        metrics.inc('responses', status=response.status, **labels)
+        if response.status != 200:
+            raise status_error(url, response.status, response.headers)
         
-        # Launch browser with anti-detection options
-        browser = await p.chromium.launch(
-            headless=False,  # Set to True for headless mode
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
-        )
+        # Wait for potential Cloudflare challenge to complete
+        try:
+            await page.wait_for_selector('body', timeout=10000)
+            if settle:
+                await asyncio.sleep(settle)  # Additional wait for JS execution
+        except:
+            log.debug("Timeout waiting for content on %s, continuing", url)
+        content = await page.content()
         
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080},
-            extra_http_headers={
-                'Accept-Language': 'en-US,en;q=0.9',
-            }
-        )
+        # Check if blocked by Cloudflare
+        if 'cloudflare' in content.lower() or 'checking your browser' in content.lower():
+            log.info("Detected Cloudflare challenge on %s, waiting", url)
+            metrics.inc('challenges', **labels)
+            await asyncio.sleep(10)
+            content = await page.content()
+    return content
+
+
+async def fetchSearchPage_playwright(pages, url, extractor):
+    """Load one search page on a page borrowed from the pool. Returns the search_page dict, or None on failure."""
+    global categories
+    cache = get_response_cache()
+    cached = cache.get(url)
+    metrics = get_metrics()
+    if cached and cached['fresh']:
+        metrics.inc('cache_hits', engine='playwright', page_type='search')
+        search = extract_search_page(cached['body'], 'playwright', extractor)
+        categories = search['categories']
+        return search
+    
+    page = await pages.get()
+    try:
+        labels = {'engine': 'playwright', 'page_type': 'search'}
+        try:
+            content = await get_retry_policy().run(url, lambda: load_page(page, url, labels, settle=3), 'playwright')
+        except Exception as e:
+            # Still failing after the retries: keep the page for a replay instead of losing the state
+            get_dead_letters().add(url, e, 'search')
+            return None
+        
+        # Parse once with lxml
+        search = extract_search_page(content, 'playwright', extractor)
         
-        page = await context.new_page()
+        if search['business_urls']:
+            cache.put(url, content.encode('utf-8'))
+        
+        # Extract categories
+        categories = search['categories']
+        log.debug("Found %d businesses on %s", len(search['business_urls']), url)
+        return search
+    finally:
+        pages.put_nowait(page)
+
+
+async def yellowPages_playwright(yp_url, page_concurrency=4, interception=None):
+    """
+    Playwright-based scraper that can handle Cloudflare protection
+    Reads the real page count from page 1, then loads the remaining pages concurrently
+    """
+    # Parquet partition (state/category) of everything scraped from this search
+    global partition
+    partition = search_partition(yp_url)
+
+    print(f"Starting Yellow Pages scraper for: {yp_url}")
+    
+    # The worker's long-lived browser; this search only gets a context of its own.
+    # Skip images, fonts, CSS and ad/analytics hosts; only the DOM is read
+    service = get_browser_service()
+    interception = interception or InterceptionProfile()
+    context = await service.new_context(
+        interception=interception,
+        extra_http_headers={
+            'Accept-Language': 'en-US,en;q=0.9',
+        }
+    )
+    
+    try:
+        # A small set of tabs shared by the concurrent page loads
+        pages = asyncio.Queue()
+        for _ in range(page_concurrency):
+            pages.put_nowait(await context.new_page())
         
         # Load selectors
-        scrape = yaml_by_select('selectors')
+        extractor = get_extractor()
         
         # First, determine the total number of pages by checking the first page
         print("Determining total number of pages...")
         try:
-            response = await page.goto(yp_url, wait_until='domcontentloaded', timeout=60000)
-            await page.wait_for_selector('body', timeout=10000)
-            await asyncio.sleep(3)
-            
-            content = await page.content()
-            soup = etree.HTML(str(BeautifulSoup(content, 'lxml')))
-            
-            # Try to detect pagination - look for pagination elements
-            pagination_elements = soup.xpath(scrape['pagination'])
-            total_pages = 1  # Default to 1 page
-            
-            if pagination_elements:
-                # Extract page numbers from pagination
-                page_numbers = []
-                for element in pagination_elements:
-                    try:
-                        # Extract text and try to convert to int
-                        text = element.strip()
-                        if text.isdigit():
-                            page_numbers.append(int(text))
-                    except:
-                        continue
-                
-                if page_numbers:
-                    total_pages = max(page_numbers)
-                    print(f"Detected {total_pages} total pages from pagination")
-                else:
-                    # Fallback: try to find "Next" button and estimate
-                    next_buttons = soup.xpath("//a[contains(text(), 'Next') or contains(@class, 'next')]")
-                    if next_buttons:
-                        print("Found 'Next' button, will scrape until no more results")
-                        total_pages = 100  # Set a reasonable maximum
-                    else:
-                        print("No pagination detected, assuming single page")
-            else:
-                print("No pagination elements found, assuming single page")
-                
+            first = await fetchSearchPage_playwright(pages, f"{yp_url}&page=1", extractor)
         except Exception as e:
-            print(f"Error detecting pagination: {e}")
-            total_pages = 50  # Conservative fallback
-        
-        # Generate page URLs based on detected or estimated page count
-        total_page_urls = [f"{yp_url}&page={num}" for num in range(1, total_pages + 1)]
-        total_business_urls = []
+            log.warning("Error loading first page of %s: %s", yp_url, e)
+            first = None
         
-        print(f"Processing up to {len(total_page_urls)} pages...")
+        if first is None or first['no_results'] or not first['business_urls']:
+            print("No results found, stopping search")
+            print(interception.summary())
+            return []
         
-        for idx, url in enumerate(total_page_urls):
-            print(f"Processing page {idx+1}/{len(total_page_urls)}")
-            
-            try:
-                # Navigate to the page
-                response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
-                
-                if response.status != 200:
-                    print(f"Failed to load page {idx+1}: HTTP {response.status}")
-                    continue
-                
-                # Wait for potential Cloudflare challenge to complete
-                try:
-                    await page.wait_for_selector('body', timeout=10000)
-                    await asyncio.sleep(3)  # Additional wait for JS execution
-                except:
-                    print("Timeout waiting for content, continuing...")
-                
-                # Get page content
-                content = await page.content()
-                
-                # Check if blocked by Cloudflare
-                if 'cloudflare' in content.lower() or 'checking your browser' in content.lower():
-                    print("Detected Cloudflare challenge, waiting...")
-                    await asyncio.sleep(10)
-                    content = await page.content()
-                
-                # Parse with BeautifulSoup and lxml
-                soup = etree.HTML(str(BeautifulSoup(content, 'lxml')))
-                
-                # Extract categories
-                categories_raw = soup.xpath(scrape['categories'])
-                global categories
-                categories = f"""{''.join(categories_raw)} in ."""
-                
-                # Extract page content to check for "No results"
-                page_content = ''.join(soup.xpath(scrape['page_content']))
-                
-                # Check for "No results" pattern
-                pattern = re.search("^No results found for.*", page_content)
-                
-                # Extract business URLs
-                business_links_raw = soup.xpath(scrape['business_urls'])
-                print(f"Found {len(business_links_raw)} businesses on page {idx+1}")
-                
-                # If no businesses found, we might have reached the end
-                if len(business_links_raw) == 0:
-                    print(f"No businesses found on page {idx+1}, stopping pagination")
-                    break
-                
-                business_links = [f"https://www.yellowpages.com{link}" for link in business_links_raw]
-                total_business_urls.extend(business_links)
-                
-                if pattern is not None:
-                    print("No results found, stopping search")
-                    break
-                
-                # Add delay between pages
-                if idx > 0:
-                    await asyncio.sleep(2)
-                    
-            except Exception as e:
-                print(f"Error processing page {idx+1}: {e}")
-                continue
+        total_pages = first['total_pages']
+        print(f"Detected {total_pages} total pages from pagination")
+        total_business_urls = list(first['business_urls'])
         
-        await browser.close()
+        # Remaining pages load concurrently; the first empty page cancels the rest
+        total_business_urls += await fetch_remaining_pages(
+            yp_lists(yp_url, total_pages)[1:],
+            lambda url: fetchSearchPage_playwright(pages, url, extractor),
+            page_concurrency,
+        )
+        # The same listing often shows up on several search pages
+        total_business_urls = dedupe_urls(total_business_urls)
         
+        print(interception.summary())
         print(f"Total business URLs found: {len(total_business_urls)}")
         return total_business_urls
+    finally:
+        await service.close_context(context)
 
 
-async def scrapeBusiness_single(page, url, scrape):
+async def scrapeBusiness_single(page, url, extractor, engine='playwright'):
     """Scrape individual business using shared page"""
     yellow_in_dicts = []
+    metrics = get_metrics()
+    labels = {'engine': engine, 'page_type': 'detail'}
     
     try:
-        response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
-        
-        if response.status != 200:
-            print(f"Failed to load business page: HTTP {response.status}")
-            return yellow_in_dicts
-        
-        # Wait for content
-        await page.wait_for_selector('body', timeout=10000)
-        content = await page.content()
-        
-        # Debug: Check content length and basic structure
-        print(f"DEBUG: Content length for business page: {len(content)}")
+        cache = get_response_cache()
+        cached = cache.get(url)
+        if cached and cached['fresh']:
+            metrics.inc('cache_hits', **labels)
+            with metrics.timer('parse', **labels):
+                soup = extractor.parse(cached['body'])
+            if soup is not None:
+                with metrics.timer('extract', **labels):
+                    yellow_in_dicts.append(extractor.business(soup, url))
+                return yellow_in_dicts
         
-        # Check if we're blocked by Cloudflare on business page
-        if 'cloudflare' in content.lower() or 'checking your browser' in content.lower():
-            print("DEBUG: Detected Cloudflare challenge on business page, waiting...")
-            await asyncio.sleep(10)
-            content = await page.content()
-            print(f"DEBUG: Content length after Cloudflare wait: {len(content)}")
+        # Timeouts, resets, 429 and 5xx are retried with backoff before giving up
+        content = await get_retry_policy().run(url, lambda: load_page(page, url, labels), engine)
         
-        # Parse content with better error handling
-        bs_soup = BeautifulSoup(content, 'lxml')
-        if not bs_soup or not bs_soup.body:
-            print(f"DEBUG: BeautifulSoup failed to parse content or no body found")
+        # Parse content once with lxml
+        with metrics.timer('parse', **labels):
+            soup = extractor.parse(content)
+        if soup is None:
+            log.debug("Empty content for %s, nothing to parse", url)
             return yellow_in_dicts
         
-        # Try multiple parsing approaches
-        soup = None
-        try:
-            # First attempt: standard etree.HTML
-            soup = etree.HTML(str(bs_soup))
-        except Exception as e:
-            print(f"DEBUG: First etree.HTML attempt failed: {e}")
-            try:
-                # Second attempt: parse directly from content
-                soup = etree.HTML(content)
-            except Exception as e2:
-                print(f"DEBUG: Second etree.HTML attempt failed: {e2}")
-                try:
-                    # Third attempt: clean the HTML first
-                    cleaned_html = str(bs_soup).encode('utf-8', 'ignore').decode('utf-8')
-                    soup = etree.HTML(cleaned_html)
-                except Exception as e3:
-                    print(f"DEBUG: Third etree.HTML attempt failed: {e3}")
-        
-        if soup is None:
-            print(f"DEBUG: All HTML parsing attempts failed, trying BeautifulSoup fallback")
-            # Fallback: use BeautifulSoup directly with CSS selectors
-            try:
-                # Convert XPath selectors to approximate CSS selectors
-                business_names = ""
-                contact = ""
-                email = ""
-                address = ""
-                
-                # Try to find business name with different selectors
-                name_element = bs_soup.find('h1', class_='dockable business-name')
-                if name_element:
-                    business_names = name_element.get_text(strip=True)
-                else:
-                    # Try alternative selectors
-                    name_element = bs_soup.find('h1') or bs_soup.find('h2') or bs_soup.find('h3')
-                    if name_element:
-                        business_names = name_element.get_text(strip=True)
-                
-                # Try to find contact
-                contact_element = bs_soup.find('a', class_='phone dockable')
-                if contact_element:
-                    contact_strong = contact_element.find('strong')
-                    if contact_strong:
-                        contact = contact_strong.get_text(strip=True)
-                
-                print(f"DEBUG: BeautifulSoup fallback found business: '{business_names}'")
-                
-                datas = {
-                    "Business": business_names,
-                    "Contact": contact,
-                    "Email": email,
-                    "Address": address,
-                    "Map and direction": f"https://www.yellowpages.com",
-                    "Review": "",
-                    "Review count": "",
-                    "Hyperlink": url,
-                    "Images": "",
-                    "Website": "",
-                }
-                yellow_in_dicts.append(datas)
-                
-            except Exception as fallback_error:
-                print(f"DEBUG: BeautifulSoup fallback also failed: {fallback_error}")
-                return yellow_in_dicts
+        # Try to extract business name first to check if page structure is correct
+        with metrics.timer('extract', **labels):
+            datas = extractor.business(soup, url)
+        if not datas.business:
+            # The page title usually tells which kind of page came back instead
+            log.debug("No business name found on %s (title %s), page might have a different structure",
+                      url, soup.xpath('//title/text()'))
+            metrics.inc('empty_records', **labels)
         else:
-            # Standard XPath extraction
-            # Try to extract business name first to check if page structure is correct
-            business_names = ''.join(soup.xpath(scrape['business_name']))
-            if not business_names:
-                print(f"DEBUG: No business name found, page might have different structure")
-                # Let's check what the page title is
-                title_elements = soup.xpath('//title/text()')
-                print(f"DEBUG: Page title: {title_elements}")
-            
-            datas = {
-                "Business": business_names,
-                "Contact": ''.join(soup.xpath(scrape['contact'])),
-                "Email": ''.join(soup.xpath(scrape['email'])).replace("mailto:", ""),
-                "Address": ''.join(soup.xpath(scrape['address'])),
-                "Map and direction": f"https://www.yellowpages.com{''.join(soup.xpath(scrape['map_and_direction']))}",
-                "Review": ''.join(soup.xpath(scrape['review'])).replace("rating-stars ", ""),
-                "Review count": re.sub(r"[()]", "", ''.join(soup.xpath(scrape['review_count']))),
-                "Hyperlink": url,
-                "Images": ''.join(soup.xpath(scrape['images'])),
-                "Website": ''.join(soup.xpath(scrape['website'])),
-            }
-            yellow_in_dicts.append(datas)
+            cache.put(url, content.encode('utf-8'))
+        
+        yellow_in_dicts.append(datas)
         
     except Exception as e:
-        print(f"Error scraping business {url}: {e}")
-        print(f"DEBUG: Exception type: {type(e).__name__}")
-        import traceback
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        log.debug("Traceback for %s", url, exc_info=True)
+        metrics.inc('fetch_errors', **labels)
+        # Kept for a later replay rather than silently dropped
+        get_dead_letters().add(url, e, 'detail')
     
     return yellow_in_dicts
 
 
-async def scrapeMe_playwright(url_lists, state_info=None):
-    """Main scraping function using single Playwright browser window"""
-    yellow_in_dicts = []
+async def scrapeMe_playwright(url_lists, state_info=None, pages=4, contexts=2, interception=None, frontier=None, seen=None, sinks=None):
+    """
+    Main scraping function using one Playwright browser with a pool of pages
+
+    Up to pages businesses are scraped concurrently, spread over contexts browser
+    contexts; how many page loads are really in flight follows the adaptive
+    'playwright' concurrency limit.
+    With a CrawlFrontier, listings finished by an earlier run are skipped and every
+    finished listing is checkpointed as soon as it is scraped. Listings already in
+    the SeenIndex (e.g. scraped for a neighbouring state) are never fetched again.
+    Records are streamed to the sinks (CSV + .xlsx by default) as each listing
+    finishes; returns the number of records written.
+    """
     
     # Determine filename based on state info or categories
     if state_info:
         state_name = state_info.get('name', 'Unknown')
         state_code = state_info.get('code', 'XX')
         filename_prefix = f"{state_name.replace(' ', '_')}_{state_code}"
+        partition_info = {'state': state_code, 'category': state_info.get('category', 'unknown'), 'part': state_code}
         print(f"Scraping restaurants in {state_name} ({state_code}). Number of businesses: {len(url_lists)}")
     else:
         filename_prefix = f"{categories}" if 'categories' in globals() else "YellowPages_Data"
+        partition_info = globals().get('partition')
         print(f"Scraping {categories}. Number of businesses: {len(url_lists)}")
     
-    # Use single browser instance for all business scraping
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=False,  # Set to True for headless mode
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
-        )
-        
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080}
-        )
-        
-        page = await context.new_page()
-        scrape = yaml_by_select('selectors')
-        
-        # Process businesses sequentially to maintain single window
-        for idx, url in enumerate(url_lists):
-            bizz_name = ' '.join(url.split("/")[-1].split("?")[0].split("-")[:-1])
-            if state_info:
-                print(f"Scraping ({idx+1}/{len(url_lists)}) in {state_info['name']}: {bizz_name}")
-            else:
-                print(f"Scraping ({idx+1}/{len(url_lists)}): {bizz_name}")
-            
-            result = await scrapeBusiness_single(page, url, scrape)
-            yellow_in_dicts += result
-            
-            # Small delay between requests
-            await asyncio.sleep(1)
-        
-        await browser.close()
-
-    # Save results
-    create_path('Yellowpage database')
-    df = pd.DataFrame(yellow_in_dicts)
+    if seen is None:
+        seen = get_seen_index()
+    url_lists = seen.filter(url_lists)
     
-    # Save with state-specific filename if state info provided
-    excel_filename = f'Yellowpage database//{filename_prefix}.xlsx'
-    df.to_excel(excel_filename, index=False)
-    print(f'Scraping complete. Results saved to: {excel_filename}')
+    if frontier is not None:
+        frontier_key = state_info['code'] if state_info else filename_prefix
+        frontier.add_urls(frontier_key, url_lists)
+        pending = set(frontier.pending_urls(frontier_key))
+        if len(pending) < len(url_lists):
+            print(f"Resuming: {len(url_lists) - len(pending)} businesses already scraped, {len(pending)} left")
+        url_lists = [url for url in url_lists if url in pending]
     
-    return yellow_in_dicts
+    # The worker's long-lived browser scrapes every business; contexts are recycled as they wear
+    service = get_browser_service()
+    interception = interception or InterceptionProfile()
+    pool = PagePool(service, pages=pages, contexts=contexts, interception=interception)
+    positions = {url: idx for idx, url in enumerate(url_lists)}
+    
+    async def scrape(page, url):
+        log.debug("Scraping (%d/%d): %s", positions[url] + 1, len(url_lists), url)
+        result = await scrapeBusiness_single(page, url, get_extractor())
+        write_all(sinks, result)
+        if result:
+            # Checkpointed before it counts as seen, so a crash in between cannot lose it
+            if frontier is not None:
+                frontier.complete_url(frontier_key, url, result)
+            seen.add(url)
+        return len(result)
+    
+    own_sinks = sinks is None
+    if own_sinks:
+        sinks = default_sinks(filename_prefix, partition=partition_info)
+    # Businesses are shared out to the pool's pages from one work queue
+    try:
+        # Listings checkpointed by an earlier run go out first, straight from the frontier
+        if frontier is not None:
+            write_all(sinks, frontier.records(frontier_key))
+        await pool.run(url_lists, scrape)
+    finally:
+        if own_sinks:
+            close_all(sinks)
+    print(interception.summary())
+    print(seen.summary())
+    print(get_concurrency('playwright').summary())
+    print(get_retry_policy().summary())
+    if get_dead_letters().added:
+        print(get_dead_letters().summary())
+    if pool.replaced:
+        print(f"Replaced {pool.replaced} crashed pages during the run")
+    print(service.summary())
+
+    print(f'Scraping complete. Results saved to: {", ".join(getattr(sink, "path", type(sink).__name__) for sink in sinks)}')
+    
+    return sinks[0].written if sinks else 0
+
+
+async def discover_playwright(yp_url, tabs, extractor, page_concurrency=2):
+    """
+    yellowPages_playwright as an async generator over already open tabs.
+
+    Yields each business url once, as soon as its search page has loaded, so
+    detail scraping can start on page 1's listings while later pages load.
+    """
+    try:
+        first = await fetchSearchPage_playwright(tabs, f"{yp_url}&page=1", extractor)
+    except Exception as e:
+        log.warning("Error loading first page of %s: %s", yp_url, e)
+        first = None
+    if first is None or first['no_results'] or not first['business_urls']:
+        print("No results found, stopping search")
+        return
+
+    new_urls = dedupe_stream()
+    for url in new_urls(first['business_urls']):
+        yield url
+    pages = stream_remaining_pages(
+        yp_lists(yp_url, first['total_pages'])[1:],
+        lambda url: fetchSearchPage_playwright(tabs, url, extractor),
+        page_concurrency,
+    )
+    async with aclosing(pages):
+        async for urls in pages:
+            for url in new_urls(urls):
+                yield url
+
+
+async def scrape_playwright(query, pages=4, contexts=2, page_concurrency=2, interception=None, frontier=None,
+                            frontier_key=None, seen=None, on_discovered=None):
+    """
+    Stream the BusinessRecords of a search from one browser: `async for record in scrape_playwright(url): ...`
+
+    Search pages load on page_concurrency tabs of their own while pages browser
+    pages scrape the listings they turn up, so detail scraping starts with page 1
+    instead of after the whole search. Records come in the order they finish;
+    writing them is up to the caller.
+
+    With a CrawlFrontier, discovered urls are checkpointed under frontier_key as
+    they come in, the records an interrupted run finished are yielded first and
+    only the rest is scraped. Listings already in the SeenIndex are skipped.
+    on_discovered(count) is called with the number of urls found once the search
+    is exhausted.
+    """
+    global partition
+    partition = search_partition(query)
+    if seen is None:
+        seen = get_seen_index()
+    finished = set()
+    if frontier is not None:
+        finished = set(frontier.discovered_urls(frontier_key)) - set(frontier.pending_urls(frontier_key))
+        # Listings checkpointed by an earlier run go out first, straight from the frontier
+        for record in frontier.records(frontier_key):
+            yield record
+
+    # The worker's long-lived browser; the search gets a context of its own, closed when it is done
+    service = get_browser_service()
+    interception = interception or InterceptionProfile()
+    search_context = await service.new_context(interception=interception, extra_http_headers={
+        'Accept-Language': 'en-US,en;q=0.9',
+    })
+    try:
+        tabs = asyncio.Queue()
+        for _ in range(page_concurrency):
+            tabs.put_nowait(await search_context.new_page())
+        pool = PagePool(service, pages=pages, contexts=contexts, interception=interception)
+        extractor = get_extractor()
+
+        async def urls():
+            found = 0
+            async with aclosing(discover_playwright(query, tabs, extractor, page_concurrency)) as discovered:
+                async for url in discovered:
+                    found += 1
+                    if listing_id(url) in seen:
+                        seen.avoided += 1
+                        continue
+                    if frontier is not None:
+                        frontier.add_urls(frontier_key, [url])
+                    if url not in finished:
+                        yield url
+            log.debug("Discovery of %s done, %d business URLs found", query, found)
+            if on_discovered is not None:
+                on_discovered(found)
+
+        async def produce(emit):
+            async def scrape(page, url):
+                result = await scrapeBusiness_single(page, url, get_extractor())
+                for record in result:
+                    await emit(record)
+                if result:
+                    # Checkpointed before it counts as seen, so a crash in between cannot lose it
+                    if frontier is not None:
+                        frontier.complete_url(frontier_key, url, result)
+                    seen.add(url)
+                return len(result)
+
+            await pool.run(urls(), scrape)
+
+        async with aclosing(stream_records(produce)) as records:
+            async for record in records:
+                yield record
+    finally:
+        print(interception.summary())
+        print(seen.summary())
+        print(get_concurrency('playwright').summary())
+        print(get_retry_policy().summary())
+        if get_dead_letters().added:
+            print(get_dead_letters().summary())
+        print(service.summary())
+        await service.close_context(search_context)
 
 
 async def all_business_urls_playwright(url):
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from tools.metrics import get_metrics
+from tools.retry import get_retry_policy
+from tools.http_cache import get_response_cache
+from tools.interception import InterceptionProfile
+from tools.browser import get_browser_service
+from scrapers.yp_scraper_clean import load_page
+
+
+log = logging.getLogger(__name__)
+
+class HybridFetcher:
+    """
+    Static-first business fetching with a per-url browser fallback, for run_pipeline.
+
+    fetch() downloads every url with the pooled aiohttp client and parse() extracts
+    it in the ParsePool like the static engine. Only a url whose response is
+    non-200 (or failed) or whose record misses a required field is loaded again in
+    a Playwright page; that body goes through the same ParsePool. The pages live
+    in one context of the worker's shared browser, opened lazily on the first
+    escalation, so a run that never escalates never starts a browser.
+
+    Args:
+        client: Shared YellowPagesClient
+        parse_pool: ParsePool extracting both static and browser bodies
+        required_fields: BusinessRecord fields that must be non-empty for a static result to count
+        browser_pages: Number of Playwright pages used for escalations
+        service: BrowserService of the fallback browser (default: the process-wide one)
+    """
+
+    def __init__(self, client, parse_pool, required_fields=('business',), browser_pages=2, service=None):
+        self.client = client
+        self.parse_pool = parse_pool
+        self.required_fields = required_fields
+        self.browser_pages = browser_pages
+        self.service = service or get_browser_service()
+        self.counters = {'static': 0, 'escalated': 0, 'browser_ok': 0, 'browser_failed': 0}
+        self.interception = InterceptionProfile()
+        # Static responses until parse() knows whether they may be cached
+        self._responses = {}
+        # Urls whose body already came from the browser
+        self._escalated = set()
+        self._context = None
+        self._pages = None
+        self._lock = asyncio.Lock()
+
+    async def _start_browser(self):
+        async with self._lock:
+            if self._context is not None:
+                return
+            self._context = await self.service.new_context(interception=self.interception)
+            self._pages = asyncio.Queue()
+            for _ in range(self.browser_pages):
+                self._pages.put_nowait(await self._context.new_page())
+
+    def _complete(self, records):
+        return bool(records) and all(getattr(records[0], field) for field in self.required_fields)
+
+    async def _load(self, url):
+        """Load url in a browser page and return its HTML."""
+        self.counters['escalated'] += 1
+        self._escalated.add(url)
+        get_metrics().inc('escalations', engine='hybrid', page_type='detail')
+        labels = {'engine': 'hybrid', 'page_type': 'detail'}
+        try:
+            await self._start_browser()
+            page = await self._pages.get()
+            try:
+                return await get_retry_policy().run(url, lambda: load_page(page, url, labels), 'hybrid')
+            finally:
+                self._pages.put_nowait(page)
+                self.service.navigated(self._context)
+        except Exception:
+            self._escalated.discard(url)
+            self.counters['browser_failed'] += 1
+            raise
+
+    async def fetch(self, url):
+        """Body of url: the static page if it came back 200, else the browser's."""
+        try:
+            response = await self.client.fetch(url)
+            if response.status == 200:
+                self._responses[url] = response
+                return response.body
+            log.debug("Escalating %s to browser (HTTP %s)", url, response.status)
+        except Exception as e:
+            log.debug("Static fetch failed for %s: %s, escalating to browser", url, e)
+        return await self._load(url)
+
+    async def parse(self, body, url):
+        """Extract a body from fetch(); an incomplete static record is escalated and extracted again."""
+        # A url's bookkeeping goes whether or not its parse succeeds
+        try:
+            try:
+                records = await self.parse_pool.parse(body, url)
+            finally:
+                response = self._responses.pop(url, None)
+            if url not in self._escalated:
+                if self._complete(records):
+                    self.counters['static'] += 1
+                    # Only a complete page may be cached, or the next run would be served it again
+                    self.client.store(url, response)
+                    return records
+                log.debug("Escalating %s to browser (required fields missing)", url)
+                body = await self._load(url)
+                records = await self.parse_pool.parse(body, url)
+        finally:
+            self._escalated.discard(url)
+        if self._complete(records):
+            self.counters['browser_ok'] += 1
+            get_response_cache().put(url, body.encode('utf-8'))
+        else:
+            self.counters['browser_failed'] += 1
+        return records
+
+    def summary(self):
+        total = self.counters['static'] + self.counters['escalated']
+        rate = self.counters['escalated'] / total * 100 if total else 0
+        return f"Engines: {self.counters} | escalated {rate:.1f}% of {total} listings"
+
+    async def close(self):
+        """Close the escalation context; the shared browser stays up for the rest of the run."""
+        if self._context is not None:
+            await self.service.close_context(self._context)
+            self._context = None
+
@@ -1,124 +1,82 @@
-import re
 import asyncio
-import pandas as pd
-from playwright.async_api import async_playwright
-from time import sleep
-from bs4 import BeautifulSoup
-from lxml import etree
+import logging
 
-from tools.functionalities import userAgents, randomTime, verify_yellow, yaml_by_select, yp_lists, create_path
+from tools.functionalities import yp_lists
+from tools.extraction import get_extractor
+from tools.metrics import get_metrics
+from tools.concurrency import get_concurrency
+from tools.retry import get_retry_policy, get_dead_letters
+from tools.http_cache import get_response_cache
+from tools.pagination import fetch_remaining_pages
+from tools.page_pool import PagePool
+from tools.browser import get_browser_service
+from tools.interception import InterceptionProfile
+from tools.dedup import dedupe_urls, get_seen_index
+from tools.sinks import default_sinks, write_all, close_all, search_partition
+from scrapers.yp_scraper_clean import load_page, fetchSearchPage_playwright
 
 
-async def yellowPages_playwright(yp_url):
+log = logging.getLogger(__name__)
+
+
+async def yellowPages_playwright(yp_url, page_concurrency=4, interception=None):
     """
     Playwright-based scraper that can handle Cloudflare protection
     """
-    async with async_playwright() as p:
-        print(f"DEBUG: Starting Playwright yellowPages with URL: {yp_url}")
-        
-        # Launch browser with options to avoid detection
-        browser = await p.chromium.launch(
-            headless=False,  # Set to True once working
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
-        )
-        
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080},
-            extra_http_headers={
-                'Accept-Language': 'en-US,en;q=0.9',
-            }
-        )
-        
-        page = await context.new_page()
+    # Parquet partition (state/category) of everything scraped from this search
+    global partition, categories
+    partition = search_partition(yp_url)
+
+    log.debug("Starting Playwright yellowPages with URL: %s", yp_url)
+    
+    # A context of the worker's shared browser; skip images, fonts, CSS and ad/analytics hosts
+    service = get_browser_service()
+    interception = interception or InterceptionProfile()
+    context = await service.new_context(
+        interception=interception,
+        extra_http_headers={
+            'Accept-Language': 'en-US,en;q=0.9',
+        }
+    )
+    
+    try:
+        pages = asyncio.Queue()
+        for _ in range(page_concurrency):
+            pages.put_nowait(await context.new_page())
         
         # Load selectors
-        scrape = yaml_by_select('selectors')
-        print(f"DEBUG: Business URL selector: {scrape['business_urls']}")
-        
-        # Generate page URLs - limit for testing or use all
-        total_page_urls = yp_lists(yp_url)[:5]  # Test first 5 pages, change to [:] for all pages
-        total_business_urls = []
-        
-        for idx, url in enumerate(total_page_urls):
-            print(f"DEBUG: Processing page {idx+1}/{len(total_page_urls)}: {url}")
-            
-            try:
-                # Navigate to the page
-                response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
-                print(f"DEBUG: HTTP Status for page {idx+1}: {response.status}")
-                
-                if response.status != 200:
-                    print(f"DEBUG: Non-200 status code, skipping page")
-                    continue
-                
-                # Wait for potential Cloudflare challenge to complete
-                try:
-                    # Wait for either content to load or Cloudflare challenge
-                    await page.wait_for_selector('body', timeout=10000)
-                    await asyncio.sleep(3)  # Additional wait for any JS to execute
-                except:
-                    print("DEBUG: Timeout waiting for content, continuing anyway")
-                
-                # Get page content
-                content = await page.content()
-                print(f"DEBUG: Page content length: {len(content)}")
-                
-                # Check if we're blocked by Cloudflare
-                if 'cloudflare' in content.lower() or 'checking your browser' in content.lower():
-                    print("DEBUG: Detected Cloudflare challenge page")
-                    # Wait longer for Cloudflare to resolve
-                    await asyncio.sleep(10)
-                    content = await page.content()
-                    print(f"DEBUG: Content length after waiting for Cloudflare: {len(content)}")
-                
-                # Parse with BeautifulSoup and lxml
-                soup = etree.HTML(str(BeautifulSoup(content, 'lxml')))
-                
-                # Extract categories
-                categories_raw = soup.xpath(scrape['categories'])
-                print(f"DEBUG: Categories found: {categories_raw}")
-                global categories
-                categories = f"""{''.join(categories_raw)} in ."""
-                
-                # Extract page content to check for "No results"
-                page_content = ''.join(soup.xpath(scrape['page_content']))
-                print(f"DEBUG: Page content: {page_content[:100]}...")
-                
-                # Check for "No results" pattern
-                pattern = re.search("^No results found for.*", page_content)
-                
-                # Extract business URLs
-                business_links_raw = soup.xpath(scrape['business_urls'])
-                print(f"DEBUG: Raw business links found: {len(business_links_raw)}")
-                print(f"DEBUG: First few raw links: {business_links_raw[:3]}")
-                
-                business_links = [f"https://www.yellowpages.com{link}" for link in business_links_raw]
-                print(f"DEBUG: Processed business links: {len(business_links)}")
-                total_business_urls.extend(business_links)
-                
-                if pattern is not None:
-                    print(f"DEBUG: 'No results' pattern found: {pattern}")
-                    print(f"No content. Please try again in few minutes.")
-                    break
-                
-                # Add small delay between pages
-                if idx > 0:
-                    await asyncio.sleep(2)
-                    
-            except Exception as e:
-                print(f"DEBUG: Error processing page {idx+1}: {e}")
-                continue
-        
-        await browser.close()
+        extractor = get_extractor()
+        
+        # Page 1 tells us how many result pages really exist
+        try:
+            first = await fetchSearchPage_playwright(pages, f"{yp_url}&page=1", extractor)
+        except Exception as e:
+            log.warning("Error processing page 1 of %s: %s", yp_url, e)
+            first = None
+        
+        if first is None or first['no_results']:
+            print(f"No content. Please try again in few minutes.")
+            print(interception.summary())
+            return []
+        
+        categories = first['categories']
+        total_pages = first['total_pages']
+        log.debug("Categories found: %s, %d result pages", categories, total_pages)
+        total_business_urls = list(first['business_urls'])
+        
+        total_business_urls += await fetch_remaining_pages(
+            yp_lists(yp_url, total_pages)[1:],
+            lambda url: fetchSearchPage_playwright(pages, url, extractor),
+            page_concurrency,
+        )
+        # The same listing often shows up on several search pages
+        total_business_urls = dedupe_urls(total_business_urls)
         
-        print(f"DEBUG: Final total business URLs found: {len(total_business_urls)}")
+        print(interception.summary())
+        log.debug("Final total business URLs found: %d", len(total_business_urls))
         return total_business_urls
+    finally:
+        await service.close_context(context)
 
 
 async def all_business_urls_playwright(url):
@@ -126,86 +84,82 @@ async def all_business_urls_playwright(url):
     return await yellowPages_playwright(url)
 
 
-async def scrapeBusiness_playwright_single(page, urls, scrape):
+async def scrapeBusiness_playwright_single(page, urls, extractor):
     """Playwright-based individual business scraper using shared page"""
     yellow_in_dicts = []
+    metrics = get_metrics()
+    labels = {'engine': 'playwright', 'page_type': 'detail'}
     
     try:
-        response = await page.goto(urls, wait_until='domcontentloaded', timeout=60000)
-        
-        if response.status != 200:
-            print(f"DEBUG: Failed to load business page: {response.status}")
-            return yellow_in_dicts
-        
-        # Wait for content
-        await page.wait_for_selector('body', timeout=10000)
-        content = await page.content()
+        cache = get_response_cache()
+        cached = cache.get(urls)
+        if cached and cached['fresh']:
+            metrics.inc('cache_hits', **labels)
+            with metrics.timer('parse', **labels):
+                tree = extractor.parse(cached['body'])
+            if tree is not None:
+                with metrics.timer('extract', **labels):
+                    yellow_in_dicts.append(extractor.business(tree, urls))
+                return yellow_in_dicts
+        
+        content = await get_retry_policy().run(urls, lambda: load_page(page, urls, labels), 'playwright')
         
         # Parse content
-        soup = etree.HTML(str(BeautifulSoup(content, 'lxml')))
-        
-        business_names = ''.join(soup.xpath(scrape['business_name']))
-        datas = {
-            "Business": business_names,
-            "Contact": ''.join(soup.xpath(scrape['contact'])),
-            "Email": ''.join(soup.xpath(scrape['email'])).replace("mailto:", ""),
-            "Address": ''.join(soup.xpath(scrape['address'])),
-            "Map and direction": ''.join(f'''https://www.yellowpages.com{soup.xpath(scrape['map_and_direction'])}'''),
-            "Review": ''.join(soup.xpath(scrape['review'])).replace("rating-stars ", ""),
-            "Review count": re.sub(r"[()]", "", ''.join(soup.xpath(scrape['review_count']))),
-            "Hyperlink": urls,
-            "Images": ''.join(soup.xpath(scrape['images'])),
-            "Website": ''.join(soup.xpath(scrape['website'])),
-        }
-        yellow_in_dicts.append(datas)
+        with metrics.timer('parse', **labels):
+            tree = extractor.parse(content)
+        if tree is not None:
+            with metrics.timer('extract', **labels):
+                datas = extractor.business(tree, urls)
+            if datas.business:
+                cache.put(urls, content.encode('utf-8'))
+            yellow_in_dicts.append(datas)
         
     except Exception as e:
-        print(f"DEBUG: Error scraping business {urls}: {e}")
+        metrics.inc('fetch_errors', **labels)
+        get_dead_letters().add(urls, e, 'detail')
     
     return yellow_in_dicts
 
 
-async def scrapeMe_playwright(url_lists):
-    """Main scraping function using Playwright with single browser window"""
-    yellow_in_dicts = []
+async def scrapeMe_playwright(url_lists, pages=4, contexts=2, interception=None, seen=None, sinks=None):
+    """
+    Main scraping function using Playwright with a pool of pages over several contexts
+
+    Records are streamed to the sinks (CSV + .xlsx by default) as each listing
+    finishes; returns the number of records written.
+    """
+    if seen is None:
+        seen = get_seen_index()
+    url_lists = seen.filter(url_lists)
     print(f"Scraping | {categories}. Number of business | {len(url_lists)}. Please wait.")
     
-    # Use single browser instance for all business scraping
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=False,
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-web-security',
-                '--disable-features=VizDisplayCompositor'
-            ]
-        )
-        
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080}
-        )
-        
-        page = await context.new_page()
-        scrape = yaml_by_select('selectors')
-        
-        # Process businesses sequentially to maintain single window
-        for url in url_lists:
-            bizz_name = ' '.join(url.split("/")[-1].split("?")[0].split("-")[:-1])
-            print(f"Scraping business: {bizz_name}")
-            
-            result = await scrapeBusiness_playwright_single(page, url, scrape)
-            yellow_in_dicts += result
-            
-            # Small delay between requests
-            await asyncio.sleep(1)
-        
-        await browser.close()
+    # The worker's shared browser scrapes every business; contexts are recycled as they wear
+    service = get_browser_service()
+    interception = interception or InterceptionProfile()
+    pool = PagePool(service, pages=pages, contexts=contexts, interception=interception)
+    
+    async def scrape(page, url):
+        log.debug("Scraping business: %s", url)
+        result = await scrapeBusiness_playwright_single(page, url, get_extractor())
+        write_all(sinks, result)
+        if result:
+            seen.add(url)
+        return len(result)
+    
+    own_sinks = sinks is None
+    if own_sinks:
+        sinks = default_sinks(categories, partition=globals().get('partition'))
+    # Process businesses concurrently on the pool's pages
+    try:
+        await pool.run(url_lists, scrape)
+    finally:
+        if own_sinks:
+            close_all(sinks)
+    print(interception.summary())
+    print(seen.summary())
+    print(get_concurrency('playwright').summary())
+    print(service.summary())
 
-    create_path('Yellowpage database')
-    df = pd.DataFrame(yellow_in_dicts)
-    df.to_excel(f'Yellowpage database//{categories}.xlsx', index=False)
     print('Scraping complete.')
     
-    return yellow_in_dicts 
\ No newline at end of file
+    return sinks[0].written if sinks else 0 
\ No newline at end of file
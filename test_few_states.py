@@ -1,8 +1,20 @@
 import asyncio
+import argparse
 import time
 import os
 from datetime import datetime
-from scrapers.yp_scraper_clean import all_business_urls_playwright, scrapeMe_playwright
+from contextlib import AsyncExitStack
+from scrapers.yp_scraper_clean import scrape_playwright
+from scrapers.yp_scraper import scrape
+from tools.http_client import YellowPagesClient
+from tools.pipeline import ParsePool
+from tools.http_cache import get_response_cache
+from tools.functionalities import search_url, configure_logging
+from tools.rate_limiter import HostRateLimiter, set_rate_limiter
+from tools.metrics import MetricsExporter, get_metrics
+from tools.browser import get_browser_service
+from tools.scheduler import estimate_sizes, run_longest_first
+from tools.sinks import default_sinks, write_all, close_all, search_partition
 
 
 # Test with just a few states first
@@ -15,9 +27,12 @@ TEST_STATES = {
 }
 
 
-async def scrape_state_restaurants(state_code, state_name):
+async def scrape_state_restaurants(state_code, state_name, pages=4, engine='playwright', client=None, parse_pool=None):
     """
-    Scrape all restaurants from a specific state
+    Scrape all restaurants from a specific state using up to pages browser pages
+
+    engine='hybrid' fetches statically over client and parse_pool and uses the
+    browser pages only for listings whose static page is unusable.
     """
     print(f"\n{'='*80}")
     print(f"🏛️  SCRAPING {state_name.upper()} ({state_code}) RESTAURANTS")
@@ -26,15 +41,36 @@ async def scrape_state_restaurants(state_code, state_name):
     state_start_time = time.time()
     
     # Generate URL for the state
-    url = f"https://www.yellowpages.com/search?search_terms=restaurants&geo_location_terms={state_code}"
+    url = search_url('restaurants', state_code)
     print(f"URL: {url}")
     
     try:
-        # Get all business URLs for this state
-        print(f"🔍 Finding all restaurant URLs in {state_name}...")
-        all_bizz_urls = await all_business_urls_playwright(url)
+        # Restaurants are scraped as the search pages turn them up, not after the whole search
+        print(f"🔍 Finding and scraping restaurants in {state_name} as the search pages come in...")
+        found = [0]
+        
+        def discovered(count):
+            found[0] = count
+        
+        # State information for proper file naming
+        sinks = default_sinks(f"{state_name.replace(' ', '_')}_{state_code}",
+                              partition=search_partition(url))
+        scrape_data = 0
+        try:
+            if engine == 'hybrid':
+                records = scrape(url, client, parse_pool=parse_pool, engine='hybrid', browser_pages=pages,
+                                 on_discovered=discovered)
+            else:
+                records = scrape_playwright(url, pages=pages, contexts=min(2, pages), on_discovered=discovered)
+            async for record in records:
+                write_all(sinks, [record])
+                scrape_data += 1
+                if scrape_data == 1:
+                    print(f"📥 First {state_name} restaurant after {round(time.time() - state_start_time, 1)} seconds")
+        finally:
+            close_all(sinks)
         
-        if not all_bizz_urls:
+        if not found[0] and not scrape_data:
             print(f"❌ No restaurants found in {state_name}")
             return {
                 'state': state_name,
@@ -45,22 +81,13 @@ async def scrape_state_restaurants(state_code, state_name):
                 'time_taken': 0
             }
         
-        print(f"✅ Found {len(all_bizz_urls)} restaurants in {state_name}")
-        
-        # Scrape all businesses from this state (no user intervention)
-        print(f"🏃‍♂️ Scraping ALL {len(all_bizz_urls)} restaurants from {state_name}...")
-        
-        # Pass state information to scraper for proper file naming
-        state_info = {'name': state_name, 'code': state_code}
-        scrape_data = await scrapeMe_playwright(all_bizz_urls, state_info)
-        
         state_time = round(time.time() - state_start_time, 2)
         
         result = {
             'state': state_name,
             'state_code': state_code,
-            'total_found': len(all_bizz_urls),
-            'total_scraped': len(scrape_data) if scrape_data else 0,
+            'total_found': found[0],
+            'total_scraped': scrape_data or 0,
             'status': 'completed',
             'time_taken': state_time
         }
@@ -85,9 +112,12 @@ async def scrape_state_restaurants(state_code, state_name):
         }
 
 
-async def test_scrape_few_states():
+async def test_scrape_few_states(parallel=3, page_budget=12, engine='playwright'):
     """
     Test scraping with just a few small states
+
+    parallel states run at once, largest (by population) first, sharing page_budget browser pages.
+    engine is 'playwright' or 'hybrid' (static first, browser per listing only when needed).
     """
     print(f"🧪 TESTING WITH {len(TEST_STATES)} SMALL STATES")
     print(f"📅 Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -104,46 +134,60 @@ async def test_scrape_few_states():
     total_states = len(TEST_STATES)
     completed_states = 0
     
-    for state_code, state_name in TEST_STATES.items():
-        try:
-            print(f"\n🏁 PROGRESS: {completed_states}/{total_states} states completed")
-            
-            # Scrape this state
-            state_result = await scrape_state_restaurants(state_code, state_name)
-            state_results.append(state_result)
-            completed_states += 1
+    sizes = estimate_sizes(TEST_STATES)
+    pages_per_state = max(1, page_budget // max(1, parallel))
+    
+    def state_job(state_code, state_name):
+        async def job():
+            try:
+                return await scrape_state_restaurants(state_code, state_name, pages=pages_per_state, engine=engine,
+                                                      client=client, parse_pool=parse_pool)
+            except Exception as e:
+                print(f"❌ CRITICAL ERROR processing {state_name}: {e}")
+                return {
+                    'state': state_name,
+                    'state_code': state_code,
+                    'total_found': 0,
+                    'total_scraped': 0,
+                    'status': f'critical_error: {str(e)}',
+                    'time_taken': 0
+                }
+        return job
+    
+    def state_done(state_code, state_result):
+        nonlocal completed_states
+        state_results.append(state_result)
+        completed_states += 1
+        print(f"\n🏁 PROGRESS: {completed_states}/{total_states} states completed")
+        
+        # Save intermediate results after each state
+        with open(f"{results_dir}/test_progress.txt", "w") as f:
+            f.write(f"TEST Restaurant Scraping Progress\n")
+            f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"Progress: {completed_states}/{total_states} states\n\n")
             
-            # Save intermediate results after each state
-            with open(f"{results_dir}/test_progress.txt", "w") as f:
-                f.write(f"TEST Restaurant Scraping Progress\n")
-                f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Progress: {completed_states}/{total_states} states\n\n")
-                
-                total_found = sum(r['total_found'] for r in state_results)
-                total_scraped = sum(r['total_scraped'] for r in state_results)
-                
-                f.write(f"SUMMARY SO FAR:\n")
-                f.write(f"Total Restaurants Found: {total_found:,}\n")
-                f.write(f"Total Restaurants Scraped: {total_scraped:,}\n\n")
-                
-                f.write("STATE DETAILS:\n")
-                for result in state_results:
-                    f.write(f"{result['state']:<20} | Found: {result['total_found']:>6} | Scraped: {result['total_scraped']:>6} | Status: {result['status']}\n")
+            total_found = sum(r['total_found'] for r in state_results)
+            total_scraped = sum(r['total_scraped'] for r in state_results)
             
-            print(f"💾 Progress saved to {results_dir}/test_progress.txt")
+            f.write(f"SUMMARY SO FAR:\n")
+            f.write(f"Total Restaurants Found: {total_found:,}\n")
+            f.write(f"Total Restaurants Scraped: {total_scraped:,}\n\n")
             
-        except Exception as e:
-            print(f"❌ CRITICAL ERROR processing {state_name}: {e}")
-            state_results.append({
-                'state': state_name,
-                'state_code': state_code,
-                'total_found': 0,
-                'total_scraped': 0,
-                'status': f'critical_error: {str(e)}',
-                'time_taken': 0
-            })
-            completed_states += 1
-            continue
+            f.write("STATE DETAILS:\n")
+            for result in state_results:
+                f.write(f"{result['state']:<20} | Found: {result['total_found']:>6} | Scraped: {result['total_scraped']:>6} | Status: {result['status']}\n")
+        
+        print(f"💾 Progress saved to {results_dir}/test_progress.txt")
+    
+    # One headless browser serves every state; it closes once the last state is done
+    client = parse_pool = None
+    async with MetricsExporter(prefix=f"{results_dir}/metrics"), get_browser_service(), AsyncExitStack() as stack:
+        if engine == 'hybrid':
+            # One pooled client and one ParsePool serve every state
+            client = await stack.enter_async_context(YellowPagesClient(engine='hybrid'))
+            parse_pool = stack.enter_context(ParsePool(engine='hybrid'))
+        await run_longest_first({code: state_job(code, name) for code, name in TEST_STATES.items()}, sizes,
+                                concurrency=parallel, on_done=state_done)
     
     # Final summary
     total_time = round(time.time() - overall_start_time, 2)
@@ -158,6 +202,9 @@ async def test_scrape_few_states():
     print(f"   📋 Total Restaurants Scraped: {total_scraped:,}")
     print(f"   ⏱️  Total Time: {total_time/60:.1f} minutes")
     print(f"   💾 Results saved in: {results_dir}/")
+    print(f"   🗄️  {get_response_cache().summary()}")
+    print(f"   📈 {get_metrics().summary()}")
+    print(f"   🌐 {get_browser_service().summary()}")
     
     # Estimate for full 50-state operation
     avg_time_per_state = total_time / len(state_results) if state_results else 0
@@ -178,9 +225,19 @@ if __name__ == "__main__":
     print("⚠️  This will test with just 5 small states first")
     print("⚠️  Use this to validate the system before running all 50 states")
     
+    parser = argparse.ArgumentParser(description="Scrape restaurants from a few small US states")
+    parser.add_argument('--engine', choices=('playwright', 'hybrid'), default='playwright',
+                        help="hybrid: fetch statically and load a listing in the browser only when its page is unusable")
+    parser.add_argument('--rate', type=float,
+                        help="requests per second per host (default: YP_RATE or 1); 0 leaves it to the adaptive concurrency limit")
+    args = parser.parse_args()
+    configure_logging()
+    if args.rate is not None:
+        set_rate_limiter(HostRateLimiter(rate=args.rate))
+    
     # Start the test scraping
     start_time = time.time()
-    results = asyncio.run(test_scrape_few_states())
+    results = asyncio.run(test_scrape_few_states(engine=args.engine))
     total_time = round(time.time() - start_time, 2)
     
     print(f"\n🏁 TEST COMPLETED!")
@@ -1,31 +1,37 @@
 import asyncio
 import time
 from scrapers.yp_scraper_playwright import all_business_urls_playwright, scrapeMe_playwright
+from tools.http_cache import get_response_cache
+from tools.functionalities import search_url, configure_logging
+from tools.metrics import get_metrics
+from tools.browser import get_browser_service
 
 
 if __name__ == "__main__":
+    configure_logging()
     start_time = time.time()
     
     async def main():
         # Use the correct HTTPS URL format
-        url = "https://www.yellowpages.com/search?search_terms=restaurants&geo_location_terms=WA"
-        print(f"DEBUG: Using URL: {url}")
+        url = search_url('restaurants', 'WA')
         
-        print("Scraping Business urls with Playwright. Please wait..")
-        bizz_urls = await all_business_urls_playwright(url)
-        print(f"DEBUG: Found {len(bizz_urls)} business URLs")
-        print(f"DEBUG: First few URLs: {bizz_urls[:3] if bizz_urls else 'None'}")
-        
-        if not bizz_urls:
-            print("DEBUG: No business URLs found, stopping here")
-            return None
+        # Discovery and detail scraping share one browser
+        async with get_browser_service():
+            print(f"Scraping Business urls with Playwright from {url}. Please wait..")
+            bizz_urls = await all_business_urls_playwright(url)
+            print(f"Found {len(bizz_urls)} business URLs")
             
-        print("Scraping business data...")
-        scrape_datas = await scrapeMe_playwright(bizz_urls)        
-        return scrape_datas
+            if not bizz_urls:
+                return None
+                
+            print("Scraping business data...")
+            scrape_datas = await scrapeMe_playwright(bizz_urls)        
+            return scrape_datas
 
     result = asyncio.run(main())
     print(f"Final result: {result}")
+    print(get_response_cache().summary())
+    print(get_metrics().summary())
 
     total_time = round(time.time()-start_time, 2)
     time_in_secs = round(total_time)
@@ -1,8 +1,22 @@
 import asyncio
+import argparse
 import time
 import os
 from datetime import datetime
-from scrapers.yp_scraper_clean import all_business_urls_playwright, scrapeMe_playwright
+from contextlib import AsyncExitStack
+from scrapers.yp_scraper_clean import all_business_urls_playwright, scrapeMe_playwright, scrape_playwright
+from scrapers.yp_scraper import refreshMe, scrape, yellowPages
+from tools.http_client import YellowPagesClient
+from tools.pipeline import ParsePool
+from tools.http_cache import get_response_cache
+from tools.functionalities import search_url, set_base_url, configure_logging
+from tools.rate_limiter import HostRateLimiter, set_rate_limiter
+from tools.metrics import MetricsExporter, get_metrics
+from tools.browser import get_browser_service
+from tools.checkpoint import CrawlFrontier
+from tools.dedup import SeenIndex
+from tools.scheduler import estimate_sizes, run_longest_first
+from tools.sinks import default_sinks, write_all, close_all, search_partition
 
 
 # All 50 US states with their abbreviations
@@ -20,9 +34,58 @@ US_STATES = {
 }
 
 
-async def scrape_state_restaurants(state_code, state_name):
+async def stream_state_restaurants(state_code, state_name, url, frontier=None, seen=None, pages=4, engine='playwright',
+                                   client=None, parse_pool=None):
+    """
+    Scrape a state's restaurants while its search is still being paged through.
+
+    Records go to the state's CSV/.xlsx/Parquet as they come in. engine is
+    'playwright' (every page in the browser) or 'hybrid' (static fetches over
+    client and parse_pool, single listings escalated to pages browser pages).
+    Returns (restaurants found, records written).
+    """
+    found = [0]
+
+    def discovered(count):
+        found[0] = count
+        if frontier is not None:
+            frontier.mark_state({'state': state_name, 'state_code': state_code, 'status': 'discovered',
+                                 'total_found': count})
+
+    sinks = default_sinks(f"{state_name.replace(' ', '_')}_{state_code}",
+                          partition=search_partition(url))
+    written = 0
+    try:
+        if engine == 'hybrid':
+            records = scrape(url, client, seen, parse_pool, engine='hybrid', browser_pages=pages, frontier=frontier,
+                             frontier_key=state_code, on_discovered=discovered)
+        else:
+            records = scrape_playwright(url, pages=pages, contexts=min(2, pages), frontier=frontier,
+                                        frontier_key=state_code, seen=seen, on_discovered=discovered)
+        async for record in records:
+            write_all(sinks, [record])
+            written += 1
+            if written == 1:
+                print(f"📥 First {state_name} restaurant in")
+    finally:
+        close_all(sinks)
+    print(f"Results saved to: {', '.join(getattr(sink, 'path', type(sink).__name__) for sink in sinks)}")
+    return found[0], written
+
+
+async def scrape_state_restaurants(state_code, state_name, frontier=None, seen=None, pages=4, refresh=False,
+                                   engine='playwright', client=None, parse_pool=None):
     """
     Scrape all restaurants from a specific state
+
+    Listings are scraped as the search pages turn them up (see
+    stream_state_restaurants). With a frontier, the urls of an interrupted run
+    that had finished discovery are reused and only the listings not yet
+    checkpointed are scraped. pages is the number of browser pages this state
+    may use. With refresh, the listings are re-checked against
+    their fingerprints from earlier runs and only new, changed and disappeared
+    ones are written. engine='hybrid' scrapes with static fetches over client
+    and parse_pool and loads only unusable listings in the browser.
     """
     print(f"\n{'='*80}")
     print(f"🏛️  SCRAPING {state_name.upper()} ({state_code}) RESTAURANTS")
@@ -31,15 +94,52 @@ async def scrape_state_restaurants(state_code, state_name):
     state_start_time = time.time()
     
     # Generate URL for the state
-    url = f"https://www.yellowpages.com/search?search_terms=restaurants&geo_location_terms={state_code}"
+    url = search_url('restaurants', state_code)
     print(f"URL: {url}")
     
     try:
-        # Get all business URLs for this state
-        print(f"🔍 Finding all restaurant URLs in {state_name}...")
-        all_bizz_urls = await all_business_urls_playwright(url)
+        # Reuse the URLs a crashed run finished discovering; a partly discovered state streams again
+        discovered = frontier is not None and frontier.state_status(state_code) == 'discovered'
+        known_urls = frontier.discovered_urls(state_code) if discovered else []
+        # Static search pages are cheap, so the hybrid engine always pages through the search again
+        if not refresh and (engine == 'hybrid' or not known_urls):
+            # Listings are scraped while the search is still being paged through
+            print(f"🔍 Finding and scraping restaurants in {state_name} as the search pages come in...")
+            total_found, scrape_data = await stream_state_restaurants(state_code, state_name, url, frontier, seen, pages,
+                                                                      engine, client, parse_pool)
+        else:
+            if known_urls:
+                all_bizz_urls = known_urls
+                print(f"♻️  Reusing {len(all_bizz_urls)} restaurant URLs discovered in a previous run")
+            else:
+                print(f"🔍 Finding all restaurant URLs in {state_name}...")
+                if engine == 'hybrid':
+                    all_bizz_urls = await yellowPages(url, client)
+                else:
+                    all_bizz_urls = await all_business_urls_playwright(url)
+                if frontier is not None and all_bizz_urls:
+                    frontier.add_urls(state_code, all_bizz_urls)
+                    frontier.mark_state({'state': state_name, 'state_code': state_code, 'status': 'discovered',
+                                         'total_found': len(all_bizz_urls)})
+            total_found, scrape_data = len(all_bizz_urls), 0
+            
+            if all_bizz_urls:
+                print(f"✅ Found {len(all_bizz_urls)} restaurants in {state_name}")
+                
+                # Scrape all businesses from this state (no user intervention)
+                print(f"🏃‍♂️ Scraping ALL {len(all_bizz_urls)} restaurants from {state_name}...")
+                
+                if refresh:
+                    # Conditional static fetches; unchanged pages are never parsed or written
+                    changes = await refreshMe(all_bizz_urls, f"{state_code}/restaurants")
+                    scrape_data = changes['new'] + changes['changed']
+                else:
+                    # Pass state information to scraper for proper file naming
+                    state_info = {'name': state_name, 'code': state_code, 'category': 'restaurants'}
+                    scrape_data = await scrapeMe_playwright(all_bizz_urls, state_info, pages=pages,
+                                                            contexts=min(2, pages), frontier=frontier, seen=seen)
         
-        if not all_bizz_urls:
+        if not total_found and not scrape_data:
             print(f"❌ No restaurants found in {state_name}")
             return {
                 'state': state_name,
@@ -50,22 +150,13 @@ async def scrape_state_restaurants(state_code, state_name):
                 'time_taken': 0
             }
         
-        print(f"✅ Found {len(all_bizz_urls)} restaurants in {state_name}")
-        
-        # Scrape all businesses from this state (no user intervention)
-        print(f"🏃‍♂️ Scraping ALL {len(all_bizz_urls)} restaurants from {state_name}...")
-        
-        # Pass state information to scraper for proper file naming
-        state_info = {'name': state_name, 'code': state_code}
-        scrape_data = await scrapeMe_playwright(all_bizz_urls, state_info)
-        
         state_time = round(time.time() - state_start_time, 2)
         
         result = {
             'state': state_name,
             'state_code': state_code,
-            'total_found': len(all_bizz_urls),
-            'total_scraped': len(scrape_data) if scrape_data else 0,
+            'total_found': total_found,
+            'total_scraped': scrape_data or 0,
             'status': 'completed',
             'time_taken': state_time
         }
@@ -90,9 +181,17 @@ async def scrape_state_restaurants(state_code, state_name):
         }
 
 
-async def scrape_all_states():
+async def scrape_all_states(resume=False, frontier_path='crawl_frontier.sqlite3', parallel=3, page_budget=12, refresh=False,
+                            engine='playwright'):
     """
     Scrape restaurants from all 50 US states
+
+    Progress is checkpointed to a CrawlFrontier; with resume=True finished states
+    are skipped and a partially scraped state continues where it stopped.
+    parallel states run at once, largest first (by listings found in earlier runs,
+    else by population), sharing page_budget browser pages between them.
+    With refresh, each state is an incremental refresh (see scrape_state_restaurants).
+    engine is 'playwright' or 'hybrid' (static first, browser per listing only when needed).
     """
     print(f"🇺🇸 STARTING NATIONWIDE RESTAURANT SCRAPING")
     print(f"📅 Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -100,56 +199,86 @@ async def scrape_all_states():
     print(f"🍽️  Category: Restaurants")
     
     overall_start_time = time.time()
-    state_results = []
+    frontier = CrawlFrontier(frontier_path)
+    # Restaurants near a state line show up in both states' searches; scrape them once
+    seen = SeenIndex(f"{os.path.splitext(frontier_path)[0]}.seen")
+    if not resume:
+        frontier.reset()
+        seen.reset()
+    state_results = frontier.state_results()
     
-    # Create results directory
-    results_dir = f"USA_Restaurants_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # Create results directory (a resumed run keeps writing to the original one)
+    results_dir = frontier.get_meta('results_dir') or f"USA_Restaurants_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    frontier.set_meta('results_dir', results_dir)
     os.makedirs(results_dir, exist_ok=True)
     
     total_states = len(US_STATES)
-    completed_states = 0
+    completed_states = len(state_results)
+    if state_results:
+        print(f"♻️  Resuming: {completed_states} states already finished")
+    
+    pending_states = [code for code in US_STATES if frontier.state_status(code) not in ('completed', 'no_results')]
+    sizes = estimate_sizes(pending_states, known=frontier.listing_counts())
+    pages_per_state = max(1, page_budget // max(1, parallel))
+    print(f"🗓️  Running {parallel} states at once ({pages_per_state} pages each), largest first: "
+          f"{', '.join(sorted(pending_states, key=sizes.get, reverse=True)[:5])}...")
     
-    for state_code, state_name in US_STATES.items():
-        try:
-            print(f"\n🏁 PROGRESS: {completed_states}/{total_states} states completed")
-            print(f"⏳ Estimated time remaining: {((time.time() - overall_start_time) / max(completed_states, 1)) * (total_states - completed_states) / 60:.1f} minutes")
+    def state_job(state_code, state_name):
+        async def job():
+            try:
+                return await scrape_state_restaurants(state_code, state_name, frontier, seen, pages=pages_per_state,
+                                                      refresh=refresh, engine=engine, client=client,
+                                                      parse_pool=parse_pool)
+            except Exception as e:
+                print(f"❌ CRITICAL ERROR processing {state_name}: {e}")
+                return {
+                    'state': state_name,
+                    'state_code': state_code,
+                    'total_found': 0,
+                    'total_scraped': 0,
+                    'status': f'critical_error: {str(e)}',
+                    'time_taken': 0
+                }
+        return job
+    
+    def state_done(state_code, state_result):
+        nonlocal completed_states
+        state_results.append(state_result)
+        if not state_result['status'].startswith('critical_error'):
+            frontier.mark_state(state_result)
+        completed_states += 1
+        print(f"\n🏁 PROGRESS: {completed_states}/{total_states} states completed")
+        print(f"⏳ Estimated time remaining: {((time.time() - overall_start_time) / max(completed_states, 1)) * (total_states - completed_states) / 60:.1f} minutes")
+        
+        # Save intermediate results after each state
+        with open(f"{results_dir}/progress_summary.txt", "w") as f:
+            f.write(f"USA Restaurant Scraping Progress\n")
+            f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"Progress: {completed_states}/{total_states} states\n\n")
             
-            # Scrape this state
-            state_result = await scrape_state_restaurants(state_code, state_name)
-            state_results.append(state_result)
-            completed_states += 1
+            total_found = sum(r['total_found'] for r in state_results)
+            total_scraped = sum(r['total_scraped'] for r in state_results)
             
-            # Save intermediate results after each state
-            with open(f"{results_dir}/progress_summary.txt", "w") as f:
-                f.write(f"USA Restaurant Scraping Progress\n")
-                f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Progress: {completed_states}/{total_states} states\n\n")
-                
-                total_found = sum(r['total_found'] for r in state_results)
-                total_scraped = sum(r['total_scraped'] for r in state_results)
-                
-                f.write(f"SUMMARY SO FAR:\n")
-                f.write(f"Total Restaurants Found: {total_found:,}\n")
-                f.write(f"Total Restaurants Scraped: {total_scraped:,}\n\n")
-                
-                f.write("STATE DETAILS:\n")
-                for result in state_results:
-                    f.write(f"{result['state']:<20} | Found: {result['total_found']:>6} | Scraped: {result['total_scraped']:>6} | Status: {result['status']}\n")
+            f.write(f"SUMMARY SO FAR:\n")
+            f.write(f"Total Restaurants Found: {total_found:,}\n")
+            f.write(f"Total Restaurants Scraped: {total_scraped:,}\n\n")
             
-            print(f"💾 Progress saved to {results_dir}/progress_summary.txt")
+            f.write("STATE DETAILS:\n")
+            for result in state_results:
+                f.write(f"{result['state']:<20} | Found: {result['total_found']:>6} | Scraped: {result['total_scraped']:>6} | Status: {result['status']}\n")
             
-        except Exception as e:
-            print(f"❌ CRITICAL ERROR processing {state_name}: {e}")
-            state_results.append({
-                'state': state_name,
-                'state_code': state_code,
-                'total_found': 0,
-                'total_scraped': 0,
-                'status': f'critical_error: {str(e)}',
-                'time_taken': 0
-            })
-            completed_states += 1
-            continue
+        print(f"💾 Progress saved to {results_dir}/progress_summary.txt")
+    
+    # metrics.prom / metrics.json in the results directory are refreshed every 30s during the run;
+    # one headless browser serves every state and closes once the last one is done
+    client = parse_pool = None
+    async with MetricsExporter(prefix=f"{results_dir}/metrics"), get_browser_service(), AsyncExitStack() as stack:
+        if engine == 'hybrid':
+            # One pooled client and one ParsePool serve every state
+            client = await stack.enter_async_context(YellowPagesClient(engine='hybrid'))
+            parse_pool = stack.enter_context(ParsePool(engine='hybrid'))
+        await run_longest_first({code: state_job(code, US_STATES[code]) for code in pending_states}, sizes,
+                                concurrency=parallel, on_done=state_done)
     
     # Final summary
     total_time = round(time.time() - overall_start_time, 2)
@@ -164,6 +293,10 @@ async def scrape_all_states():
     print(f"   📋 Total Restaurants Scraped: {total_scraped:,}")
     print(f"   ⏱️  Total Time: {total_time/3600:.1f} hours ({total_time/60:.1f} minutes)")
     print(f"   💾 Results saved in: {results_dir}/")
+    print(f"   🗄️  {get_response_cache().summary()}")
+    print(f"   🔁 {seen.summary()}")
+    print(f"   📈 {get_metrics().summary()}")
+    print(f"   🌐 {get_browser_service().summary()}")
     
     # Save final summary
     with open(f"{results_dir}/FINAL_SUMMARY.txt", "w") as f:
@@ -191,9 +324,30 @@ if __name__ == "__main__":
     print("⚠️  This process may take many hours to complete.")
     print("⚠️  Results will be saved automatically as we progress.")
     
+    parser = argparse.ArgumentParser(description="Scrape restaurants from all 50 US states")
+    parser.add_argument('--resume', action='store_true', help="skip finished states and listings from the last run")
+    parser.add_argument('--frontier', default='crawl_frontier.sqlite3', help="checkpoint file for the crawl frontier")
+    parser.add_argument('--parallel', type=int, default=3, help="number of states scraped at once")
+    parser.add_argument('--pages', type=int, default=12, help="browser pages shared by all running states")
+    parser.add_argument('--refresh', action='store_true',
+                        help="monthly refresh: only write listings that are new, changed or gone since the last run")
+    parser.add_argument('--engine', choices=('playwright', 'hybrid'), default='playwright',
+                        help="hybrid: fetch statically and load a listing in the browser only when its page is unusable")
+    parser.add_argument('--base-url', help="scrape this server instead of yellowpages.com (e.g. the local stand-in)")
+    parser.add_argument('--rate', type=float,
+                        help="requests per second per host (default: YP_RATE or 1); 0 leaves it to the adaptive concurrency limit")
+    args = parser.parse_args()
+    configure_logging()
+    if args.base_url:
+        set_base_url(args.base_url)
+    if args.rate is not None:
+        set_rate_limiter(HostRateLimiter(rate=args.rate))
+    
     # Start the nationwide scraping
     start_time = time.time()
-    results = asyncio.run(scrape_all_states())
+    results = asyncio.run(scrape_all_states(resume=args.resume, frontier_path=args.frontier,
+                                           parallel=args.parallel, page_budget=args.pages, refresh=args.refresh,
+                                           engine=args.engine))
     total_time = round(time.time() - start_time, 2)
     
     print(f"\n🏁 MISSION ACCOMPLISHED!")
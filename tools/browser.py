@@ -0,0 +1,220 @@
+import os
+import time
+import asyncio
+import logging
+from playwright.async_api import async_playwright
+
+from tools.metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
+
+# Chromium flags and context options of every scraping browser
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor'
+]
+CONTEXT_OPTIONS = {
+    'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'viewport': {'width': 1920, 'height': 1080},
+}
+
+# Executable names of Chromium's processes (browser, renderers, GPU, utilities)
+BROWSER_PROCESSES = ('chrome', 'chromium', 'headless_shell')
+
+
+def browser_rss_mb(root=None):
+    """
+    Resident memory (MB) of the Chromium processes below root (default: this process).
+
+    Read from /proc, so Linux only; returns None elsewhere. Worker processes of a
+    ParsePool are not counted, only the browser's own process tree.
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    root = root or os.getpid()
+    children, names, rss = {}, {}, {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+            with open(f'/proc/{entry}/statm') as f:
+                resident = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue  # exited while we were looking
+        # "pid (comm) state ppid ..."; comm may itself contain spaces or parentheses
+        name, _, rest = stat[stat.index('(') + 1:].rpartition(')')
+        pid, ppid = int(entry), int(rest.split()[1])
+        children.setdefault(ppid, []).append(pid)
+        names[pid] = name
+        rss[pid] = resident * page_size
+    total, stack = 0, list(children.get(root, []))
+    while stack:
+        pid = stack.pop()
+        if any(name in names[pid].lower() for name in BROWSER_PROCESSES):
+            total += rss[pid]
+        stack.extend(children.get(pid, []))
+    return total / 2 ** 20
+
+
+class BrowserService:
+    """
+    One long-lived Chromium per worker process, shared by every search and state it scrapes.
+
+    Discovery and detail scraping take their contexts from new_context() instead of
+    launching a browser each, so a 50-state run pays for one cold start. Contexts
+    are disposable: PagePool replaces one once due_for_recycle() says so, after
+    recycle_after navigations or when the browser's memory passes max_memory_mb,
+    which keeps a run of many hours from slowly creeping. A browser that crashed
+    or disconnected is relaunched on the next new_context().
+
+    Use as an async context manager (or call close()) around the whole run.
+
+    Args:
+        headless: Launch without a window
+        recycle_after: Navigations after which a context is replaced
+        max_memory_mb: Browser RSS above which every older context is replaced (None: no limit)
+        memory_check_interval: Seconds between two memory readings
+        launch_args: Chromium command line flags
+    """
+
+    def __init__(self, headless=True, recycle_after=250, max_memory_mb=2048, memory_check_interval=15.0,
+                 launch_args=None):
+        self.headless = headless
+        self.recycle_after = recycle_after
+        self.max_memory_mb = max_memory_mb
+        self.memory_check_interval = memory_check_interval
+        self.launch_args = launch_args or BROWSER_ARGS
+        self.launches = 0
+        self.recycled = 0
+        self.memory_mb = None
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+        # context -> [created (monotonic), navigations]
+        self._contexts = {}
+        self._memory_checked = None
+        self._over_memory_since = None
+        self.metrics = get_metrics()
+
+    async def browser(self):
+        """The running browser, launched (or relaunched after a crash) on demand."""
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                if self._browser is not None:
+                    log.warning("Browser disconnected, relaunching")
+                    self._contexts.clear()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+                self.launches += 1
+                self.metrics.inc('browser_launches')
+                log.info("Launched %s Chromium (launch %d)", 'headless' if self.headless else 'headful', self.launches)
+            return self._browser
+
+    async def new_context(self, interception=None, **options):
+        """
+        A fresh browser context with CONTEXT_OPTIONS (overridden by options).
+
+        Args:
+            interception: Optional InterceptionProfile installed on the context
+        """
+        browser = await self.browser()
+        context = await browser.new_context(**{**CONTEXT_OPTIONS, **options})
+        if interception is not None:
+            await interception.install(context)
+        self._contexts[context] = [time.monotonic(), 0]
+        return context
+
+    def navigated(self, context, count=1):
+        """Count navigations made in a context handed out by new_context()."""
+        if context in self._contexts:
+            self._contexts[context][1] += count
+
+    def due_for_recycle(self, context):
+        """Whether a context has used up its navigations, or predates a reading over the memory limit."""
+        state = self._contexts.get(context)
+        if state is None:
+            return False
+        created, navigations = state
+        if navigations >= self.recycle_after:
+            return True
+        over_since = self._check_memory()
+        return over_since is not None and created < over_since
+
+    def _check_memory(self):
+        """Monotonic time of the latest reading over max_memory_mb, None while memory is fine."""
+        if self.max_memory_mb is None:
+            return None
+        now = time.monotonic()
+        if self._memory_checked is None or now - self._memory_checked >= self.memory_check_interval:
+            self._memory_checked = now
+            self.memory_mb = browser_rss_mb()
+            if self.memory_mb is not None:
+                self.metrics.set('browser_memory_mb', round(self.memory_mb, 1))
+            if self.memory_mb is not None and self.memory_mb > self.max_memory_mb:
+                log.info("Browser at %.0f MB (limit %d MB), recycling its contexts", self.memory_mb, self.max_memory_mb)
+                self._over_memory_since = now
+            else:
+                self._over_memory_since = None
+        return self._over_memory_since
+
+    async def close_context(self, context, recycled=False):
+        """Close a context; recycled marks it as replaced for wear rather than finished with."""
+        self._contexts.pop(context, None)
+        if recycled:
+            self.recycled += 1
+            self.metrics.inc('contexts_recycled')
+        try:
+            await context.close()
+        except Exception:
+            pass  # Already gone with a crashed browser
+
+    def summary(self):
+        memory = f", {self.memory_mb:.0f} MB" if self.memory_mb is not None else ''
+        return f"Browser: {self.launches} launches, {self.recycled} contexts recycled{memory}"
+
+    async def close(self):
+        """Close the browser; the next new_context() launches a new one."""
+        async with self._lock:
+            self._contexts.clear()
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+_service = None
+
+
+def get_browser_service():
+    """
+    Return this process's BrowserService.
+
+    Headless unless YP_HEADLESS=0 (handy for watching a Cloudflare challenge).
+    """
+    global _service
+    if _service is None:
+        _service = BrowserService(headless=os.environ.get('YP_HEADLESS', '1') != '0')
+    return _service
+
+
+def set_browser_service(service):
+    global _service
+    _service = service
@@ -0,0 +1,126 @@
+import json
+import time
+import sqlite3
+
+from tools.records import BusinessRecord
+
+
+class CrawlFrontier:
+    """
+    Durable crawl frontier for long multi-state runs.
+
+    Records every state's status, the business urls discovered for it and the
+    scraped record for each completed url in one SQLite file, so a crashed run
+    restarted with --resume only pays for the work that is left.
+
+    Args:
+        path: SQLite file holding the frontier
+    """
+
+    def __init__(self, path='crawl_frontier.sqlite3'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS states (
+                state_code TEXT PRIMARY KEY,
+                state TEXT,
+                status TEXT NOT NULL,
+                total_found INTEGER DEFAULT 0,
+                total_scraped INTEGER DEFAULT 0,
+                time_taken REAL DEFAULT 0,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT NOT NULL,
+                state_code TEXT NOT NULL,
+                done INTEGER DEFAULT 0,
+                record TEXT,
+                PRIMARY KEY (state_code, url)
+            );
+            CREATE TABLE IF NOT EXISTS listing_counts (
+                state_code TEXT PRIMARY KEY,
+                total_found INTEGER NOT NULL
+            );
+        """)
+        self.db.commit()
+
+    def reset(self):
+        """Forget every state and url, for a fresh (non-resumed) run. Listing counts are kept for scheduling."""
+        self.db.executescript("DELETE FROM meta; DELETE FROM states; DELETE FROM urls;")
+        self.db.commit()
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+        self.db.commit()
+
+    def state_status(self, state_code):
+        row = self.db.execute("SELECT status FROM states WHERE state_code = ?", (state_code,)).fetchone()
+        return row[0] if row else None
+
+    def mark_state(self, result):
+        """Store a state result dict (state, state_code, status, total_found, total_scraped, time_taken)."""
+        self.db.execute(
+            "INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (result['state_code'], result['state'], result['status'], result.get('total_found', 0),
+             result.get('total_scraped', 0), result.get('time_taken', 0), time.time()),
+        )
+        if result.get('total_found'):
+            self.db.execute("INSERT OR REPLACE INTO listing_counts VALUES (?, ?)", (result['state_code'], result['total_found']))
+        self.db.commit()
+
+    def state_results(self, statuses=('completed', 'no_results')):
+        """Return stored state result dicts whose status is in statuses."""
+        rows = self.db.execute(
+            f"SELECT state, state_code, total_found, total_scraped, status, time_taken FROM states "
+            f"WHERE status IN ({','.join('?' * len(statuses))})", statuses,
+        ).fetchall()
+        return [
+            {'state': r[0], 'state_code': r[1], 'total_found': r[2], 'total_scraped': r[3], 'status': r[4], 'time_taken': r[5]}
+            for r in rows
+        ]
+
+    def listing_counts(self):
+        """Listings found per state by any earlier run, even one that was reset since."""
+        return dict(self.db.execute("SELECT state_code, total_found FROM listing_counts"))
+
+    def add_urls(self, state_code, urls):
+        """Record the business urls discovered for a state."""
+        self.db.executemany(
+            "INSERT OR IGNORE INTO urls (url, state_code) VALUES (?, ?)", [(url, state_code) for url in urls]
+        )
+        self.db.commit()
+
+    def discovered_urls(self, state_code):
+        return [r[0] for r in self.db.execute("SELECT url FROM urls WHERE state_code = ? ORDER BY rowid", (state_code,))]
+
+    def pending_urls(self, state_code):
+        return [r[0] for r in self.db.execute("SELECT url FROM urls WHERE state_code = ? AND done = 0 ORDER BY rowid", (state_code,))]
+
+    def complete_url(self, state_code, url, records):
+        """Mark a url as scraped and keep its records so the state file can be rebuilt after a crash."""
+        self.db.execute(
+            "UPDATE urls SET done = 1, record = ? WHERE state_code = ? AND url = ?",
+            (json.dumps([record.to_row() for record in records]), state_code, url),
+        )
+        self.db.commit()
+
+    def records(self, state_code):
+        """Yield every record scraped so far for a state, in discovery order."""
+        for (record,) in self.db.execute(
+            "SELECT record FROM urls WHERE state_code = ? AND done = 1 ORDER BY rowid", (state_code,)
+        ).fetchall():
+            for row in json.loads(record or '[]'):
+                yield BusinessRecord.from_row(row)
+
+    def close(self):
+        self.db.close()
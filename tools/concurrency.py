@@ -0,0 +1,185 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+from tools.metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
+
+# Responses that mean the server wants fewer requests from us
+OVERLOAD_STATUSES = (429, 503)
+
+# get_concurrency() defaults per engine; browser page loads are much heavier than plain GETs
+ENGINE_DEFAULTS = {
+    'playwright': {'initial': 2, 'max_limit': 16},
+}
+
+
+def is_timeout(error):
+    """asyncio/aiohttp timeouts and Playwright's TimeoutError (which is not an asyncio one)."""
+    return isinstance(error, asyncio.TimeoutError) or type(error).__name__ == 'TimeoutError'
+
+
+class Outcome:
+    """What a request tracked by AdaptiveConcurrency.slot() ended with; set status inside the block."""
+
+    __slots__ = ('status',)
+
+    def __init__(self):
+        self.status = None
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the number of requests in flight.
+
+    Every request takes a slot with acquire() and hands it back with
+    release(latency, status, error). While responses come back healthy and the
+    limit is actually in use, the limit grows by increase per limit's worth of
+    requests (additive increase). A 429/503, a timeout or a latency spike above
+    latency_tolerance times the usual latency cuts it by decrease (multiplicative
+    decrease), at most once per cooldown so one burst of failures counts once.
+    The run settles just below the point where the server starts pushing back.
+
+    The current limit is exported as the 'concurrency_limit' gauge.
+
+    Args:
+        initial: Starting limit
+        min_limit: The limit never drops below this
+        max_limit: The limit never grows above this (keep it <= the connection pool size)
+        increase: Slots added per limit's worth of healthy requests
+        decrease: Factor the limit is multiplied by on overload
+        latency_tolerance: A response slower than this many times the usual latency is a spike
+        cooldown: Minimum seconds between two decreases (default: the usual latency, at least 1s)
+        engine: Engine label of the metrics
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=20, increase=1.0, decrease=0.5, latency_tolerance=3.0,
+                 cooldown=None, engine='static'):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.engine = engine
+        self.in_flight = 0
+        self.latency = None
+        self.backoffs = 0
+        self._healthy = 0
+        self._last_decrease = None
+        self._waiters = deque()
+        self.metrics = get_metrics()
+        self._publish()
+
+    @property
+    def current(self):
+        """Whole number of requests allowed in flight right now."""
+        return int(self.limit)
+
+    async def acquire(self):
+        """Wait for a free slot."""
+        if self.in_flight < self.current and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; give it back
+                self.in_flight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                # (_wake() may already have dropped it)
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency, status=None, error=None):
+        """
+        Return a slot and feed the request's outcome into the limit.
+
+        Args:
+            latency: Seconds the request took
+            status: HTTP status of the response, if one came back
+            error: Exception the request raised, if any
+        """
+        saturated = self.in_flight >= self.current
+        self.in_flight -= 1
+        if status in OVERLOAD_STATUSES or is_timeout(error):
+            self._back_off(f"HTTP {status}" if status else "timeout")
+        elif error is None:
+            if self.latency is not None and self._healthy >= 10 and latency > self.latency * self.latency_tolerance:
+                self._back_off(f"latency {latency:.2f}s vs usual {self.latency:.2f}s")
+            else:
+                self._healthy += 1
+                self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+                # Only grow a limit that is actually being used
+                if saturated and self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                    self._publish()
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        """acquire() and release() around a block, timing it; the block sets outcome.status."""
+        await self.acquire()
+        outcome, start = Outcome(), time.perf_counter()
+        try:
+            yield outcome
+        except Exception as e:
+            self.release(time.perf_counter() - start, outcome.status, e)
+            raise
+        except BaseException:
+            # Cancelled: give the slot back without judging the server
+            self.in_flight -= 1
+            self._wake()
+            raise
+        else:
+            self.release(time.perf_counter() - start, outcome.status)
+
+    def _back_off(self, reason):
+        now = asyncio.get_running_loop().time()
+        cooldown = self.cooldown if self.cooldown is not None else max(1.0, self.latency or 0)
+        if self._last_decrease is not None and now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        self.backoffs += 1
+        self.metrics.inc('concurrency_backoffs', engine=self.engine)
+        self._publish()
+        log.info("%s concurrency down to %d (%s)", self.engine, self.current, reason)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.current:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _publish(self):
+        self.metrics.set('concurrency_limit', self.current, engine=self.engine)
+
+    def summary(self):
+        return f"Concurrency ({self.engine}): limit {self.current} (max {self.max_limit}), backed off {self.backoffs} times"
+
+
+_controllers = {}
+
+
+def get_concurrency(engine, **options):
+    """
+    Return the process-wide AdaptiveConcurrency of an engine.
+
+    Everything fetching through one engine shares one limit, since it all lands on
+    the same host. options are AdaptiveConcurrency arguments (over ENGINE_DEFAULTS),
+    used on first call only.
+    """
+    if engine not in _controllers:
+        _controllers[engine] = AdaptiveConcurrency(engine=engine, **{**ENGINE_DEFAULTS.get(engine, {}), **options})
+    return _controllers[engine]
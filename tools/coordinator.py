@@ -0,0 +1,103 @@
+import aiohttp
+from aiohttp import web
+
+
+def coordinator_app(queue):
+    """
+    Small HTTP front for a WorkQueue, so workers on other machines can share one queue.
+
+    Every endpoint takes and returns JSON:
+        POST /enqueue    {kind, items: [[key, payload], ...]}  -> {added}
+        POST /lease      {worker, batch, ttl, kinds}           -> {tasks}
+        POST /heartbeat  {worker, ids, ttl}                    -> {held}
+        POST /complete   {worker, results: {id: result}}       -> {accepted}
+        POST /fail       {worker, ids, error}                  -> {failed}
+        GET  /stats                                            -> {kind: {status: count}}
+    """
+    async def enqueue(request):
+        body = await request.json()
+        return web.json_response({'added': queue.enqueue(body['kind'], body['items'])})
+
+    async def lease(request):
+        body = await request.json()
+        tasks = queue.lease(body['worker'], body.get('batch', 50), body.get('ttl', 120), body.get('kinds'))
+        return web.json_response({'tasks': tasks})
+
+    async def heartbeat(request):
+        body = await request.json()
+        return web.json_response({'held': queue.heartbeat(body['worker'], body['ids'], body.get('ttl', 120))})
+
+    async def complete(request):
+        body = await request.json()
+        results = {int(task_id): result for task_id, result in body['results'].items()}
+        return web.json_response({'accepted': queue.complete(body['worker'], results)})
+
+    async def fail(request):
+        body = await request.json()
+        return web.json_response({'failed': queue.fail(body['worker'], body['ids'], body.get('error', ''))})
+
+    async def stats(request):
+        return web.json_response(queue.stats())
+
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.add_routes([
+        web.post('/enqueue', enqueue),
+        web.post('/lease', lease),
+        web.post('/heartbeat', heartbeat),
+        web.post('/complete', complete),
+        web.post('/fail', fail),
+        web.get('/stats', stats),
+    ])
+    return app
+
+
+def serve_coordinator(queue, host='0.0.0.0', port=8700):
+    """Serve a WorkQueue to remote workers until interrupted."""
+    web.run_app(coordinator_app(queue), host=host, port=port)
+
+
+class RemoteWorkQueue:
+    """
+    Client for a coordinator; same methods as WorkQueue, but async.
+
+    Args:
+        base_url: Coordinator address, e.g. http://10.0.0.5:8700
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._session = None
+
+    async def _post(self, path, body):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+        async with self._session.post(f"{self.base_url}{path}", json=body) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def enqueue(self, kind, items):
+        return (await self._post('/enqueue', {'kind': kind, 'items': [list(item) for item in items]}))['added']
+
+    async def lease(self, worker, batch=50, ttl=120, kinds=None):
+        return (await self._post('/lease', {'worker': worker, 'batch': batch, 'ttl': ttl, 'kinds': kinds}))['tasks']
+
+    async def heartbeat(self, worker, ids, ttl=120):
+        return (await self._post('/heartbeat', {'worker': worker, 'ids': ids, 'ttl': ttl}))['held']
+
+    async def complete(self, worker, results):
+        return (await self._post('/complete', {'worker': worker, 'results': results}))['accepted']
+
+    async def fail(self, worker, ids, error=''):
+        return (await self._post('/fail', {'worker': worker, 'ids': ids, 'error': str(error)}))['failed']
+
+    async def stats(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+        async with self._session.get(f"{self.base_url}/stats") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
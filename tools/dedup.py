@@ -0,0 +1,169 @@
+import os
+import re
+import heapq
+import hashlib
+from array import array
+from bisect import bisect_left
+from urllib.parse import urlsplit, urlunsplit
+
+
+def canonical_url(url):
+    """Business url without its tracking query string (?lid=..., utm_*) or fragment."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def listing_id(url):
+    """
+    Stable numeric id of a listing.
+
+    YellowPages detail urls end in "<slug>-<id>" (e.g. /seattle-wa/mip/joes-pizza-4856211);
+    anything else falls back to a 64-bit hash of the canonical url.
+    """
+    path = urlsplit(url).path.rstrip('/')
+    match = re.search(r"-(\d+)$", path)
+    if match and int(match.group(1)) < 2 ** 63:
+        return int(match.group(1))
+    return int.from_bytes(hashlib.sha1(canonical_url(url).encode()).digest()[:8], 'big') | 2 ** 63
+
+
+def dedupe_urls(urls):
+    """Canonicalize business urls and drop repeats of the same listing, keeping the first."""
+    return dedupe_stream()(urls)
+
+
+def dedupe_stream():
+    """
+    dedupe_urls across batches, e.g. search pages that come in one at a time.
+
+    Returns a function taking a batch of urls and returning the canonical urls of
+    the listings that neither this batch nor an earlier one had before.
+    """
+    found = set()
+
+    def new_urls(urls):
+        unique = []
+        for url in urls:
+            lid = listing_id(url)
+            if lid not in found:
+                found.add(lid)
+                unique.append(canonical_url(url))
+        return unique
+
+    return new_urls
+
+
+def dedupe_records(records):
+    """dedupe_urls for records (e.g. search cards): drops repeated listings and canonicalizes their hyperlink."""
+    found = set()
+    unique = []
+    for record in records:
+        lid = listing_id(record.hyperlink)
+        if lid not in found:
+            found.add(lid)
+            record.hyperlink = canonical_url(record.hyperlink)
+            unique.append(record)
+    return unique
+
+
+class SeenIndex:
+    """
+    Memory-compact set of listing ids already scraped.
+
+    Ids live in a sorted array of unsigned 64-bit ints (8 bytes each) plus a small
+    set of recent additions that is merged in every merge_every ids, so millions of
+    listings fit in a few tens of MB. With a path, every id is also appended to a
+    binary log and reloaded on the next start.
+
+    Args:
+        path: Optional file the index is persisted to
+        merge_every: Recent ids kept in a plain set before merging into the array
+    """
+
+    def __init__(self, path=None, merge_every=65536):
+        self.path = path
+        self.merge_every = merge_every
+        self._sorted = array('Q')
+        self._recent = set()
+        self.avoided = 0
+        self._log = None
+        if path:
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self._sorted.frombytes(f.read())
+                self._sorted = array('Q', sorted(set(self._sorted)))
+            self._log = open(path, 'ab')
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, lid):
+        if lid in self._recent:
+            return True
+        idx = bisect_left(self._sorted, lid)
+        return idx < len(self._sorted) and self._sorted[idx] == lid
+
+    def _merge(self):
+        self._sorted = array('Q', heapq.merge(self._sorted, sorted(self._recent)))
+        self._recent = set()
+
+    def add(self, url):
+        """Mark a listing as scraped. Returns False if it was already known."""
+        lid = listing_id(url)
+        if lid in self:
+            return False
+        self._recent.add(lid)
+        if self._log is not None:
+            self._log.write(array('Q', [lid]).tobytes())
+            self._log.flush()
+        if len(self._recent) >= self.merge_every:
+            self._merge()
+        return True
+
+    def filter(self, urls):
+        """
+        Canonical urls of the listings that still need a detail fetch.
+
+        Drops repeats within urls and listings already in the index, and counts
+        every dropped url as an avoided fetch.
+        """
+        unique = [url for url in dedupe_urls(urls) if listing_id(url) not in self]
+        self.avoided += len(urls) - len(unique)
+        return unique
+
+    def summary(self):
+        return f"Dedup: {self.avoided} duplicate detail fetches avoided, {len(self)} listings seen"
+
+    def reset(self):
+        self._sorted = array('Q')
+        self._recent = set()
+        self.avoided = 0
+        if self._log is not None:
+            self._log.close()
+            self._log = open(self.path, 'wb')
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+_seen = None
+
+
+def get_seen_index():
+    """
+    Return the process-wide SeenIndex used when no other index is passed in.
+
+    Persisted to seen_listings.bin (YP_SEEN_INDEX overrides the path; set it
+    empty for an in-memory index), so a later run skips what an earlier one scraped.
+    """
+    global _seen
+    if _seen is None:
+        _seen = SeenIndex(os.environ.get('YP_SEEN_INDEX', 'seen_listings.bin') or None)
+    return _seen
+
+
+def set_seen_index(index):
+    global _seen
+    _seen = index
@@ -0,0 +1,177 @@
+import re
+import math
+import time
+from lxml import etree
+
+from tools.resources import get_registry, load_yaml
+from tools.records import BusinessRecord, COLUMN_NAMES
+from tools.functionalities import base_url
+from tools.metrics import get_metrics
+
+
+SELECTORS_PATH = "scrapers//selectors.yml"
+
+# Every byte body is UTF-8: the client transcodes responses (see utf8_body) and
+# Playwright pages are cached as content.encode('utf-8')
+HTML_PARSER = etree.HTMLParser(encoding='utf-8')
+
+
+class Extractor:
+    """
+    Single-parse extraction engine shared by every scraper.
+
+    Each selector in selectors.yml is compiled to an etree.XPath object once,
+    and every page is parsed a single time straight from the raw response. The
+    `cards` group holds the search result card selectors of cards-only mode.
+    """
+
+    def __init__(self, selectors):
+        self.selectors = selectors
+        self.xpaths = {name: etree.XPath(expr) for name, expr in selectors.items() if isinstance(expr, str)}
+        self.card_xpaths = {name: etree.XPath(expr) for name, expr in selectors.get('cards', {}).items()}
+
+    def parse(self, content):
+        """Parse UTF-8 bytes (aiohttp, cache) or text (Playwright) into an lxml tree, or None if empty."""
+        if not content:
+            return None
+        if isinstance(content, bytes):
+            return etree.HTML(content, HTML_PARSER)
+        return etree.HTML(content)
+
+    def text(self, tree, name):
+        return ''.join(self.xpaths[name](tree))
+
+    def card_text(self, card, name, separator=''):
+        return separator.join(part.strip() for part in self.card_xpaths[name](card) if part.strip())
+
+    def business(self, tree, url):
+        """Extract one BusinessRecord from a business detail page."""
+        return BusinessRecord(
+            business=self.text(tree, 'business_name'),
+            contact=self.text(tree, 'contact'),
+            email=self.text(tree, 'email').replace("mailto:", ""),
+            address=self.text(tree, 'address'),
+            map_and_direction=f"{base_url()}{self.text(tree, 'map_and_direction')}",
+            review=self.text(tree, 'review').replace("rating-stars ", ""),
+            review_count=re.sub(r"[()]", "", self.text(tree, 'review_count')),
+            hyperlink=url,
+            images=self.text(tree, 'images'),
+            website=self.text(tree, 'website'),
+        )
+
+    def page_count(self, tree, per_page=30, max_pages=100):
+        """
+        Work out how many search pages exist from the pagination block of page 1.
+
+        Reads either a "Showing 1-30 of 1234" range (result count divided by the
+        range's page size) or page links such as "1 2 ... 40" (their largest
+        number) from the `pagination` selector. Returns 1 if the block is missing.
+        """
+        block = ' '.join(
+            ''.join(element.itertext()) if hasattr(element, 'itertext') else str(element)
+            for element in self.xpaths['pagination'](tree)
+        )
+        numbers = [int(n.replace(',', '')) for n in re.findall(r"\d[\d,]*", block)]
+        if not numbers:
+            return 1
+        showing = re.search(r"(\d[\d,]*)\s*-\s*(\d[\d,]*)\s+of\s+(\d[\d,]*)", block)
+        if not showing:
+            return max(1, min(max(numbers), max_pages))
+        first, last, total = (int(n.replace(',', '')) for n in showing.groups())
+        per_page = max(last - first + 1, 1)
+        return max(1, min(math.ceil(total / per_page), max_pages))
+
+    def cards(self, tree):
+        """
+        Extract a BusinessRecord from every result card of a search page.
+
+        Cards carry name, phone, address, rating and sometimes the website; Email,
+        Map and direction and usually Images are left blank (see missing_columns).
+        """
+        records = []
+        for card in self.card_xpaths['card'](tree):
+            link = self.card_text(card, 'business_url')
+            if not link:
+                continue  # ad slots and "featured" blocks without a listing
+            records.append(BusinessRecord(
+                business=self.card_text(card, 'business_name', ' '),
+                contact=self.card_text(card, 'contact'),
+                address=', '.join(filter(None, (self.card_text(card, 'street'), self.card_text(card, 'locality')))),
+                review=self.card_text(card, 'review').replace("result-rating", "").strip(),
+                review_count=re.sub(r"[()]", "", self.card_text(card, 'review_count')),
+                hyperlink=f"{base_url()}{link}",
+                images=self.card_text(card, 'images'),
+                website=self.card_text(card, 'website'),
+            ))
+        return records
+
+    def search_page(self, tree, cards=False):
+        """
+        Extract the category label, 'No results' flag, business links and page count of a search page.
+
+        With cards, the page's result cards are extracted as well (under "cards").
+        """
+        page_content = self.text(tree, 'page_content')
+        search = {
+            "categories": f"""{self.text(tree, 'categories')} in .""",
+            "page_content": page_content,
+            "no_results": re.search("^No results found for.*", page_content) is not None,
+            "business_urls": [f"{base_url()}{link}" for link in self.xpaths['business_urls'](tree)],
+            "total_pages": self.page_count(tree),
+        }
+        if cards:
+            search["cards"] = self.cards(tree)
+        return search
+
+
+def missing_columns(record, columns):
+    """The columns (exported names) of columns that are blank in record, e.g. Email on a search card."""
+    unknown = set(columns) - set(COLUMN_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))} (expected some of {', '.join(COLUMN_NAMES)})")
+    row = record.to_row()
+    return [column for column in columns if not row[column]]
+
+
+def get_extractor():
+    """
+    Return the process-wide Extractor, compiling selectors.yml on first use.
+
+    Recompiled when selectors.yml changes on disk; call this per listing (it is
+    cheap) rather than holding on to one Extractor for a whole run.
+    """
+    return get_registry().load('extractor', SELECTORS_PATH, lambda path: Extractor(load_yaml(path)))
+
+
+def timed_extract_business(body, url):
+    """
+    Parse a business detail page body into a list of BusinessRecords (empty if the body is blank).
+
+    Returns (records, parse_seconds, extract_seconds). A plain module-level function
+    so it can run in ParsePool worker processes, whose metrics the parent records.
+    """
+    extractor = get_extractor()
+    start = time.perf_counter()
+    tree = extractor.parse(body)
+    parsed = time.perf_counter()
+    records = [extractor.business(tree, url)] if tree is not None else []
+    return records, parsed - start, time.perf_counter() - parsed
+
+
+def extract_business(body, url, engine='static'):
+    """timed_extract_business in this process, with its timings recorded under engine."""
+    records, parse_seconds, extract_seconds = timed_extract_business(body, url)
+    metrics = get_metrics()
+    metrics.observe('parse', parse_seconds, engine=engine, page_type='detail')
+    metrics.observe('extract', extract_seconds, engine=engine, page_type='detail')
+    return records
+
+
+def extract_search_page(body, engine='static', extractor=None, cards=False):
+    """Parse and extract a search page body (search_page dict, with its cards if asked), recording both stages."""
+    extractor = extractor or get_extractor()
+    metrics = get_metrics()
+    with metrics.timer('parse', engine=engine, page_type='search'):
+        tree = extractor.parse(body)
+    with metrics.timer('extract', engine=engine, page_type='search'):
+        return extractor.search_page(tree, cards)
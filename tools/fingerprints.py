@@ -0,0 +1,155 @@
+import json
+import time
+import sqlite3
+import hashlib
+
+from tools.dedup import listing_id
+from tools.records import BusinessRecord
+
+
+def page_hash(body):
+    """Hash of a raw page body (bytes or str)."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).hexdigest()
+
+
+def record_hash(record):
+    """Hash of a record's extracted fields; equal hashes mean nothing we keep has changed."""
+    return hashlib.sha256(json.dumps(record.values(), separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Per-listing fingerprints for incremental refreshes.
+
+    Keyed by listing id, it keeps the hash of the last raw page, the hash and JSON
+    of the last extracted record, and the page's ETag / Last-Modified. A refresh
+    sends conditional requests with those validators, skips parsing when the page
+    hash is unchanged and only reports listings that are new, changed or gone.
+
+    A refresh of a scope (e.g. "WA/restaurants") is a run: start_run() marks every
+    listing the search still lists, finish_run() returns the ones it no longer does.
+
+    Args:
+        path: SQLite file holding the fingerprints
+    """
+
+    def __init__(self, path='listing_fingerprints.sqlite3'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                url TEXT NOT NULL,
+                page_hash TEXT,
+                record_hash TEXT,
+                record TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                first_seen REAL,
+                last_changed REAL,
+                last_run INTEGER,
+                removed INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS listings_scope ON listings (scope, last_run);
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                counts TEXT
+            );
+        """)
+        self.db.commit()
+
+    def start_run(self, scope, urls):
+        """Begin a refresh of scope; every url in urls counts as still listed. Returns the run id."""
+        run_id = self.db.execute("INSERT INTO runs (scope, started_at) VALUES (?, ?)", (scope, time.time())).lastrowid
+        self.db.executemany(
+            "UPDATE listings SET last_run = ? WHERE listing_id = ?",
+            ((run_id, listing_id(url)) for url in urls),
+        )
+        self.db.commit()
+        return run_id
+
+    def get(self, url):
+        row = self.db.execute(
+            "SELECT page_hash, record_hash, etag, last_modified, removed FROM listings WHERE listing_id = ?",
+            (listing_id(url),),
+        ).fetchone()
+        if row is None:
+            return None
+        return {'page_hash': row[0], 'record_hash': row[1], 'etag': row[2], 'last_modified': row[3], 'removed': bool(row[4])}
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since from the last fetch of this listing (none once it was removed)."""
+        known = self.get(url)
+        headers = {}
+        if not known or known['removed']:
+            return headers
+        if known['etag']:
+            headers['If-None-Match'] = known['etag']
+        if known['last_modified']:
+            headers['If-Modified-Since'] = known['last_modified']
+        return headers
+
+    def page_unchanged(self, url, body):
+        known = self.get(url)
+        return known is not None and not known['removed'] and known['page_hash'] == page_hash(body)
+
+    def update(self, url, scope, run_id, body, record, headers=None):
+        """
+        Store the listing's latest page and record. Returns 'new', 'changed' or 'unchanged'.
+
+        A record with the same field hash as before is 'unchanged' even if the page
+        itself differed (e.g. a rotated ad); only its page fingerprint is refreshed.
+        """
+        headers = headers or {}
+        known = self.get(url)
+        digest = record_hash(record)
+        now = time.time()
+        if known is None or known['removed']:
+            change = 'new'
+        else:
+            change = 'unchanged' if known['record_hash'] == digest else 'changed'
+        self.db.execute(
+            """
+            INSERT INTO listings (listing_id, scope, url, page_hash, record_hash, record, etag, last_modified,
+                                  first_seen, last_changed, last_run)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (listing_id) DO UPDATE SET
+                url = excluded.url, page_hash = excluded.page_hash, etag = excluded.etag,
+                last_modified = excluded.last_modified, last_run = excluded.last_run, removed = 0,
+                record_hash = excluded.record_hash, record = excluded.record,
+                last_changed = CASE WHEN listings.record_hash = excluded.record_hash
+                                    THEN listings.last_changed ELSE excluded.last_changed END
+            """,
+            (listing_id(url), scope, url, page_hash(body), digest, json.dumps(record.to_row()),
+             headers.get('ETag'), headers.get('Last-Modified'), now, now, run_id),
+        )
+        self.db.commit()
+        return change
+
+    def finish_run(self, scope, run_id, counts=None):
+        """
+        Close a refresh and return (url, last BusinessRecord) of every listing the scope no longer lists.
+
+        Those listings are flagged removed; they come back as 'new' if they reappear.
+        """
+        rows = self.db.execute(
+            "SELECT listing_id, url, record FROM listings WHERE scope = ? AND removed = 0 AND (last_run IS NULL OR last_run < ?)",
+            (scope, run_id),
+        ).fetchall()
+        self.db.executemany("UPDATE listings SET removed = 1 WHERE listing_id = ?", ((row[0],) for row in rows))
+        self.db.execute(
+            "UPDATE runs SET finished_at = ?, counts = ? WHERE run_id = ?", (time.time(), json.dumps(counts or {}), run_id)
+        )
+        self.db.commit()
+        return [(url, BusinessRecord.from_row(json.loads(record)) if record else None) for _, url, record in rows]
+
+    def close(self):
+        self.db.close()
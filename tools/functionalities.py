@@ -1,7 +1,44 @@
 import re
 import os
-import yaml
-import random
+import logging
+from urllib.parse import urlencode
+
+from tools.resources import get_registry, UserAgentPool, load_yaml
+
+
+DEFAULT_BASE_URL = 'https://www.yellowpages.com'
+
+
+def base_url():
+    """
+    Site root that search urls and scraped links are built on.
+
+    Set YP_BASE_URL (or call set_base_url) to point every scraper at another
+    server, e.g. the local stand-in used by benchmark.py.
+    """
+    return os.environ.get('YP_BASE_URL', DEFAULT_BASE_URL).rstrip('/')
+
+
+def set_base_url(url):
+    # Through the environment so ParsePool workers and child processes inherit it
+    os.environ['YP_BASE_URL'] = url.rstrip('/')
+
+
+def search_url(search_terms, geo_location_terms):
+    return f"{base_url()}/search?{urlencode({'search_terms': search_terms, 'geo_location_terms': geo_location_terms})}"
+
+
+def configure_logging(level=None):
+    """
+    Leveled console logging for the scripts.
+
+    Defaults to INFO, where the hot loop logs nothing per listing; run with
+    YP_LOG_LEVEL=DEBUG (or pass level) to see every request again.
+    """
+    logging.basicConfig(
+        level=(level or os.environ.get('YP_LOG_LEVEL', 'INFO')).upper(),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+    )
 
 
 def yp_lists(yp_url, max_pages=100):
@@ -16,23 +53,12 @@ def yp_lists(yp_url, max_pages=100):
         List of page URLs
     """
     total_page_urls = [f"{yp_url}&page={num}" for num in range(1, max_pages + 1)]
-    print(f"DEBUG: Generated {len(total_page_urls)} page URLs (max_pages={max_pages})")
-    print(f"DEBUG: First few URLs: {total_page_urls[:3]}")
+    logging.getLogger(__name__).debug("Generated %d page URLs (max_pages=%d), first: %s", len(total_page_urls), max_pages, total_page_urls[:3])
     return total_page_urls
 
-# random time interval between each requests made to server:
-# You can decrease the time interval for faster scraping however I discourage you to do so as it may hurt the server.
-# Scrape responsibly:
-def randomTime(val):
-    ranges = [i for i in range(2, val+1)]
-    return random.randint(0,len(ranges))
-
-
-# Hundreds of thousands of user agents for server:
+# Hundreds of thousands of user agents for server (loaded once, reloaded if the file changes):
 def userAgents():
-    with open('user-agents.txt') as f:
-        agents = f.read().split("\n")
-        return random.choice(agents)
+    return get_registry().load('user_agents', 'user-agents.txt', UserAgentPool.from_file).choice()
     
 
 def verify_yellow(yp_url):    
@@ -44,10 +70,7 @@ def verify_yellow(yp_url):
 
 
 def yaml_by_select(selectors):
-    with open(f"scrapers//{selectors}.yml") as file:
-        sel = yaml.load(file, Loader=yaml.SafeLoader)
-        print(f"DEBUG: Loaded YAML selectors: {list(sel.keys())}")
-        return sel
+    return get_registry().load(f'yaml:{selectors}', f"scrapers//{selectors}.yml", load_yaml)
 
 
 def create_path(dir_name):
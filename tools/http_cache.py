@@ -0,0 +1,190 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# Query parameters that only track the visitor and never change the page:
+TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid')
+
+
+def normalize_url(url):
+    """Lower-case scheme and host, drop fragments and tracking parameters, sort the query."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in TRACKING_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+
+def page_type(url):
+    return 'search' if urlsplit(url).path.startswith('/search') else 'detail'
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed HTTP response cache.
+
+    Entries are keyed by normalized url in a small SQLite index; bodies are stored
+    zlib-compressed under the sha256 of their content, so identical pages share a
+    file. Search pages and detail pages get their own TTL, stale entries with an
+    ETag/Last-Modified are revalidated, and the least recently used entries are
+    evicted once the stored bodies exceed max_bytes.
+
+    Args:
+        path: Cache directory
+        search_ttl: Seconds a search page stays fresh
+        detail_ttl: Seconds a business detail page stays fresh
+        max_bytes: Upper bound for the compressed bodies on disk
+    """
+
+    def __init__(self, path='.yp_cache', search_ttl=6 * 3600, detail_ttl=30 * 86400, max_bytes=2_000_000_000):
+        self.path = path
+        self.ttl = {'search': search_ttl, 'detail': detail_ttl}
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(path, 'bodies'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, 'index.sqlite3'))
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+
+    def _body_path(self, digest):
+        return os.path.join(self.path, 'bodies', digest[:2], digest)
+
+    def get(self, url):
+        """
+        Look a url up. Returns None on a miss, otherwise a dict with the body,
+        whether it is still fresh, and the validators for revalidation.
+        """
+        key = normalize_url(url)
+        row = self.db.execute(
+            "SELECT digest, etag, last_modified, stored_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        digest, etag, last_modified, stored_at = row
+        try:
+            with open(self._body_path(digest), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.db.commit()
+            self.stats['misses'] += 1
+            return None
+        fresh = time.time() - stored_at < self.ttl[page_type(url)]
+        if fresh:
+            self.hit(url, body)
+        else:
+            self.stats['stale'] += 1
+        return {'body': body, 'fresh': fresh, 'etag': etag, 'last_modified': last_modified}
+
+    def hit(self, url, body, revalidated=False):
+        """Record that a cached body was served (directly or after a 304)."""
+        now = time.time()
+        if revalidated:
+            self.stats['revalidated'] += 1
+            self.db.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, normalize_url(url)))
+        else:
+            self.stats['hits'] += 1
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, normalize_url(url)))
+        self.db.commit()
+        self.stats['bytes_saved'] += len(body)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, body, headers=None):
+        """Store a successful response body."""
+        headers = headers or {}
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            with open(body_path + '.tmp', 'wb') as f:
+                f.write(zlib.compress(body, 6))
+            os.replace(body_path + '.tmp', body_path)
+        key = normalize_url(url)
+        previous = self.db.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, digest, os.path.getsize(body_path),
+             headers.get('ETag'), headers.get('Last-Modified'), now, now),
+        )
+        self.db.commit()
+        if previous and previous[0] != digest:
+            self._drop_body(previous[0])
+        self.stats['stored'] += 1
+        if self.stats['stored'] % 100 == 0:
+            self.evict()
+
+    def _drop_body(self, digest):
+        """Delete a body file once no entry points at it any more."""
+        if self.db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is not None:
+            return False
+        try:
+            os.remove(self._body_path(digest))
+        except OSError:
+            pass
+        return True
+
+    def evict(self):
+        """Drop least recently used entries until the stored bodies fit in max_bytes."""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, digest, size in self.db.execute(
+            "SELECT key, digest, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.stats['evicted'] += 1
+            if self._drop_body(digest):
+                total -= size
+            if total <= self.max_bytes:
+                break
+        self.db.commit()
+
+    def summary(self):
+        s = self.stats
+        lookups = s['hits'] + s['stale'] + s['misses']
+        return (
+            f"Cache: {s['hits']} hits, {s['stale']} stale ({s['revalidated']} revalidated), {s['misses']} misses of {lookups} lookups | "
+            f"{s['bytes_saved'] / 1_000_000:.1f} MB saved | {s['stored']} stored, {s['evicted']} evicted"
+        )
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+
+_cache = None
+
+
+def get_response_cache():
+    """Return the process-wide ResponseCache shared by the aiohttp and Playwright fetch paths."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def set_response_cache(cache):
+    """Replace the process-wide cache, e.g. with an empty one in a scratch directory for benchmarks."""
+    global _cache
+    _cache = cache
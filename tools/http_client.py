@@ -0,0 +1,201 @@
+import re
+import time
+import codecs
+import aiohttp
+from collections import namedtuple
+
+from tools.functionalities import userAgents
+from tools.rate_limiter import get_rate_limiter
+from tools.http_cache import get_response_cache, page_type
+from tools.metrics import get_metrics
+from tools.concurrency import get_concurrency
+from tools.retry import RETRYABLE_STATUSES, get_retry_policy, status_error
+
+
+# Session-wide headers that make aiohttp look more like a real browser:
+BROWSER_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Cache-Control': 'max-age=0',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+# cached: the body came from the ResponseCache (fresh, or revalidated with a 304).
+# body is always UTF-8 (see utf8_body), like the Playwright pages we encode ourselves.
+FetchResult = namedtuple('FetchResult', ['url', 'status', 'headers', 'body', 'cached'], defaults=(False,))
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def utf8_body(body, charset=None):
+    """
+    A response body re-encoded as UTF-8, so the extractor can parse every body the same way.
+
+    The charset is the Content-Type's, else the page's <meta charset>, else UTF-8;
+    a body that already is UTF-8 (or names an unknown charset) is returned as is.
+    """
+    if not charset:
+        match = META_CHARSET.search(body[:2048])
+        charset = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        if codecs.lookup(charset).name == 'utf-8':
+            return body
+    except LookupError:
+        return body
+    return body.decode(charset, 'replace').encode('utf-8')
+
+
+def connect_trace(engine):
+    """
+    aiohttp TraceConfig timing every new connection into the 'dns_connect' stage.
+
+    A connection's creation spans its DNS lookup (or DNS cache hit), TCP connect
+    and TLS handshake, so each connection is one observation; reused keep-alive
+    connections record nothing.
+    """
+    metrics = get_metrics()
+
+    async def started(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def finished(session, context, params):
+        metrics.observe('dns_connect', time.perf_counter() - context.connect_started, engine=engine)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_start.append(started)
+    trace.on_connection_create_end.append(finished)
+    return trace
+
+
+class YellowPagesClient:
+    """
+    Long-lived aiohttp client shared by search and detail fetches for a whole run.
+
+    Owns a single TCPConnector with keep-alive and a DNS cache, so thousands of
+    listings reuse a handful of warm connections instead of one handshake each.
+
+    Args:
+        limit: Total number of simultaneous connections
+        limit_per_host: Simultaneous connections per host
+        keepalive_timeout: Seconds an idle connection is kept open for reuse
+        dns_cache_ttl: Seconds a resolved host is cached
+        timeout: Total timeout in seconds for a single request
+        limiter: HostRateLimiter pacing every request (defaults to the shared one)
+        cache: ResponseCache consulted before the network (defaults to the shared one, False disables it)
+        engine: Engine label of this client's metrics
+        concurrency: AdaptiveConcurrency deciding how many requests are in flight
+                     (default: the engine's shared one, AIMD from 4 up to limit_per_host)
+        retry: RetryPolicy for timeouts, resets, 429 and 5xx (defaults to the shared one)
+    """
+
+    def __init__(self, limit=20, limit_per_host=16, keepalive_timeout=60, dns_cache_ttl=300, timeout=60, limiter=None, cache=None,
+                 engine='static', concurrency=None, retry=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.limiter = limiter or get_rate_limiter()
+        self.cache = get_response_cache() if cache is None else cache
+        self.engine = engine
+        self.metrics = get_metrics()
+        self.concurrency = concurrency or get_concurrency(engine, initial=min(4, limit_per_host), max_limit=limit_per_host)
+        self.retry = retry or get_retry_policy()
+        self.session = None
+
+    async def start(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                cookie_jar=aiohttp.CookieJar(),
+                headers=BROWSER_HEADERS,
+                trace_configs=[connect_trace(self.engine)],
+            )
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def fetch(self, url, headers=None, revalidate=False):
+        """
+        GET a url over the shared pool and return a FetchResult with the raw body.
+
+        Fresh cached responses are served without touching the network; stale ones
+        are revalidated with If-None-Match / If-Modified-Since (fresh ones too with
+        revalidate=True, as a refresh wants the current page). Validators passed in
+        headers replace the cache's, and a 304 to them is returned as a 304.
+        Timeouts, resets, 429 and 5xx are retried with backoff; FetchFailed is
+        raised once they run out. Other statuses are returned for the caller to
+        judge. Search pages are cached as they arrive, detail pages only through
+        store().
+        """
+        return await self.retry.run(url, lambda: self._fetch_once(url, headers, revalidate), self.engine)
+
+    async def _fetch_once(self, url, headers=None, revalidate=False):
+        labels = {'engine': self.engine, 'page_type': page_type(url)}
+        entry = self.cache.get(url) if self.cache else None
+        if entry and entry['fresh'] and not revalidate:
+            self.metrics.inc('cache_hits', **labels)
+            return FetchResult(url, 200, {}, entry['body'], cached=True)
+
+        await self.start()
+        await self.limiter.acquire(url)
+        request_headers = {'User-Agent': userAgents()}
+        if headers:
+            request_headers.update(headers)
+        # Validators of the caller's own (e.g. refreshMe's FingerprintStore) win over the cache's,
+        # and a 304 then answers them, so it goes back to the caller as is
+        own_validators = any(name.lower() in ('if-none-match', 'if-modified-since') for name in request_headers)
+        if entry and not own_validators:
+            request_headers.update(self.cache.conditional_headers(entry))
+        try:
+            async with self.concurrency.slot() as outcome:
+                with self.metrics.timer('fetch', **labels):
+                    async with self.session.get(url, headers=request_headers) as response:
+                        body = utf8_body(await response.read(), response.charset)
+                outcome.status = response.status
+        except Exception:
+            self.metrics.inc('fetch_errors', **labels)
+            raise
+        self.metrics.inc('responses', status=response.status, **labels)
+        if response.status in RETRYABLE_STATUSES:
+            raise status_error(url, response.status, response.headers)
+        if response.status == 304 and entry and not own_validators:
+            self.cache.hit(url, entry['body'], revalidated=True)
+            return FetchResult(str(response.url), 200, response.headers, entry['body'], cached=True)
+        # Detail pages are only cached once their record came out complete (see store())
+        if response.status == 200 and self.cache and labels['page_type'] == 'search':
+            self.cache.put(url, body, response.headers)
+        return FetchResult(str(response.url), response.status, response.headers, body)
+
+    def store(self, url, response):
+        """
+        Cache a fetched detail page once its record turned out complete.
+
+        A 200 placeholder or block page would otherwise be served from the cache
+        for the whole detail TTL; left uncached it is fetched again next time.
+        """
+        if self.cache and response.status == 200 and not response.cached:
+            self.cache.put(url, response.body, response.headers)
@@ -0,0 +1,101 @@
+from urllib.parse import urlsplit
+
+
+# Resource types the scrapers never read; they only need the DOM text and attributes.
+BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+# Analytics / ads hosts whose scripts and beacons are dropped whatever their type.
+DENIED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'googletagservices.com',
+    'doubleclick.net', 'googlesyndication.com', 'adservice.google.com',
+    'facebook.net', 'facebook.com', 'connect.facebook.net',
+    'scorecardresearch.com', 'quantserve.com', 'hotjar.com', 'newrelic.com',
+    'nr-data.net', 'criteo.com', 'criteo.net', 'adsrvr.org', 'amazon-adsystem.com',
+    'taboola.com', 'outbrain.com', 'bing.com', 'yahoo.com', 'moatads.com',
+)
+
+# Blocked requests never download, so bytes saved are estimated from typical sizes.
+ESTIMATED_BYTES = {
+    'image': 40_000,
+    'media': 250_000,
+    'font': 30_000,
+    'stylesheet': 25_000,
+    'script': 35_000,
+}
+
+
+def _matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+def _is_main_frame_navigation(request):
+    try:
+        return request.is_navigation_request() and request.frame.parent_frame is None
+    except Exception:
+        return False  # Service worker requests have no frame
+
+
+class InterceptionProfile:
+    """
+    Route-interception layer for Playwright browser contexts.
+
+    Aborts requests by resource type and by domain allow/deny lists, and keeps
+    count of what it blocked.
+
+    Args:
+        block_types: Resource types to abort (image, media, font, stylesheet, ...)
+        deny_domains: Hosts (and their subdomains) whose requests are always aborted
+        allow_domains: If given, requests to any other host are aborted, except the page itself
+    """
+
+    def __init__(self, block_types=BLOCKED_RESOURCE_TYPES, deny_domains=DENIED_DOMAINS, allow_domains=None):
+        self.block_types = set(block_types)
+        self.deny_domains = tuple(deny_domains)
+        self.allow_domains = tuple(allow_domains) if allow_domains else None
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_reason = {}
+        self.estimated_bytes_saved = 0
+
+    def block_reason(self, url, resource_type, main_frame=False):
+        """
+        Return why a request should be aborted, or None to let it through.
+
+        Only the page's own navigation (main_frame) is always let through; an
+        iframe document is judged like any other request, so ad and analytics
+        frames are stopped before they load their own subresources.
+        """
+        if main_frame:
+            return None
+        host = urlsplit(url).hostname or ''
+        if _matches(host, self.deny_domains):
+            return 'denied domain'
+        if self.allow_domains is not None and not _matches(host, self.allow_domains):
+            return 'third party'
+        if resource_type in self.block_types:
+            return resource_type
+        return None
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type, _is_main_frame_navigation(request))
+        if reason is None:
+            self.allowed += 1
+            await route.continue_()
+            return
+        self.blocked += 1
+        self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+        self.estimated_bytes_saved += ESTIMATED_BYTES.get(request.resource_type, 0)
+        await route.abort()
+
+    async def install(self, context):
+        """Start intercepting every request made by a browser context."""
+        await context.route('**/*', self._handle)
+        return context
+
+    def summary(self):
+        total = self.allowed + self.blocked
+        return (
+            f"Blocked {self.blocked}/{total} requests "
+            f"(~{self.estimated_bytes_saved / 1_000_000:.1f} MB saved): {self.blocked_by_reason}"
+        )
@@ -0,0 +1,233 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+log = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram in the Prometheus sense.
+
+    With samples, every observation is also kept so quantile() is exact instead
+    of a bucket bound; meant for short runs such as benchmarks.
+    """
+
+    __slots__ = ('counts', 'sum', 'count', 'samples')
+
+    def __init__(self, samples=False):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.samples = [] if samples else None
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if self.samples is not None:
+            self.samples.append(seconds)
+
+    def quantile(self, q):
+        """The q-th quantile: exact with samples, else the upper bound of its bucket (None when empty)."""
+        if not self.count:
+            return None
+        if self.samples is not None:
+            ordered = sorted(self.samples)
+            return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+        target, seen = q * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+class Metrics:
+    """
+    In-process counters, gauges and latency histograms for every stage of a run.
+
+    Stages are 'dns_connect', 'fetch', 'parse', 'extract' and 'write'; label them
+    with engine ('static', 'playwright', 'hybrid') and page_type ('search',
+    'detail'). Recording is a dict lookup and an addition, cheap enough for the
+    hot loop. Export with prometheus() or snapshot(), or periodically with
+    MetricsExporter.
+
+    Args:
+        samples: Keep every latency so stage quantiles are exact (see Histogram)
+    """
+
+    def __init__(self, samples=False):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.samples = samples
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, _labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.samples)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time the block into the stage's histogram (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE yp_{name}_total counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f"yp_{name}_total{_format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.gauges}):
+            lines.append(f"# TYPE yp_{name} gauge")
+            for (gauge, labels), value in sorted(self.gauges.items()):
+                if gauge == name:
+                    lines.append(f"yp_{name}{_format_labels(labels)} {value}")
+        lines.append("# TYPE yp_stage_seconds histogram")
+        for (stage, labels), histogram in sorted(self.histograms.items()):
+            labels = (('stage', stage),) + labels
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f"yp_stage_seconds_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"yp_stage_seconds_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"yp_stage_seconds_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"yp_stage_seconds_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict, with p50/p95 per stage."""
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            'gauges': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.gauges.items())
+            ],
+            'stages': [
+                {'stage': stage, 'labels': dict(labels), 'count': h.count, 'sum_seconds': round(h.sum, 6),
+                 'p50_seconds': h.quantile(0.5), 'p95_seconds': h.quantile(0.95)}
+                for (stage, labels), h in sorted(self.histograms.items())
+            ],
+        }
+
+    def merged(self, stage):
+        """One Histogram of a stage over all its label sets."""
+        merged = Histogram(self.samples)
+        for (name, _), histogram in self.histograms.items():
+            if name == stage:
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.sum += histogram.sum
+                if merged.samples is not None:
+                    merged.samples += histogram.samples
+        return merged
+
+    def summary(self):
+        """One line per run: listings written and p95 per stage."""
+        written = sum(value for (name, _), value in self.counters.items() if name == 'records_written')
+        stages = {stage: self.merged(stage) for stage, _ in self.histograms}
+        timings = ', '.join(f"{stage} p95 {h.quantile(0.95)}s" for stage, h in sorted(stages.items()))
+        return f"Metrics: {written} records written | {timings}"
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+        self.started = time.time()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class MetricsExporter:
+    """
+    Writes <prefix>.prom and <prefix>.json every interval seconds while a run is going.
+
+    Use as an async context manager around the run; a final snapshot is written on exit.
+
+    Args:
+        metrics: Metrics to export (defaults to the shared one)
+        prefix: Path prefix of the snapshot files
+        interval: Seconds between snapshots
+    """
+
+    def __init__(self, metrics=None, prefix='metrics', interval=30.0):
+        self.metrics = metrics or get_metrics()
+        self.prefix = prefix
+        self.interval = interval
+        self._task = None
+
+    def write(self):
+        for suffix, content in (('.prom', self.metrics.prometheus()), ('.json', json.dumps(self.metrics.snapshot(), indent=2))):
+            with open(self.prefix + suffix + '.tmp', 'w') as f:
+                f.write(content)
+            os.replace(self.prefix + suffix + '.tmp', self.prefix + suffix)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+            log.info(self.metrics.summary())
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.write()
+
+
+_metrics = None
+
+
+def get_metrics():
+    """Return the process-wide Metrics every stage records into."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def set_metrics(metrics):
+    """Replace the process-wide Metrics, e.g. with one keeping raw samples for a benchmark."""
+    global _metrics
+    _metrics = metrics
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from contextlib import aclosing
+
+
+log = logging.getLogger(__name__)
+
+
+class PagePool:
+    """
+    Pool of Playwright pages spread over several browser contexts of a BrowserService.
+
+    Workers pull items from one shared queue, so one browser process scrapes many
+    listings at once. A failure in one worker never stops the others, and a page
+    that crashes or gets closed is replaced before the worker takes its next item.
+    A context the service marks as due for recycling (too many navigations, or the
+    browser over its memory limit) is swapped for a fresh one between items; the
+    old one closes once its last page is done.
+
+    Args:
+        service: BrowserService the contexts come from
+        pages: Number of pages (concurrent workers) in the pool
+        contexts: Number of browser contexts the pages are spread over
+        context_options: Keyword arguments passed to service.new_context
+        interception: Optional InterceptionProfile installed on every context
+    """
+
+    def __init__(self, service, pages=4, contexts=2, context_options=None, interception=None):
+        self.service = service
+        self.pages = max(1, pages)
+        self.contexts = max(1, min(contexts, self.pages))
+        self.context_options = context_options or {}
+        self.interception = interception
+        self._contexts = []
+        # context -> number of pool pages open in it
+        self._open_pages = {}
+        self.replaced = 0
+        self.recycled = 0
+
+    async def _new_context(self):
+        context = await self.service.new_context(interception=self.interception, **self.context_options)
+        self._open_pages[context] = 0
+        return context
+
+    async def _new_page(self, slot):
+        context = self._contexts[slot]
+        try:
+            page = await context.new_page()
+        except Exception:
+            # The whole context (or browser) went away; rebuild it for this slot.
+            self._open_pages.pop(context, None)
+            await self.service.close_context(context)
+            context = self._contexts[slot] = await self._new_context()
+            page = await context.new_page()
+        self._open_pages[context] += 1
+        page.crashed = False
+        page.on('crash', lambda *_: setattr(page, 'crashed', True))
+        return page
+
+    async def _close_page(self, page):
+        context = page.context
+        try:
+            await page.close()
+        except Exception:
+            pass
+        if context in self._open_pages:
+            self._open_pages[context] -= 1
+            # Last page of a context that was already swapped out of its slot
+            if self._open_pages[context] <= 0 and context not in self._contexts:
+                del self._open_pages[context]
+                await self.service.close_context(context, recycled=True)
+
+    async def _replace_page(self, page, slot):
+        self.replaced += 1
+        await self._close_page(page)
+        return await self._new_page(slot)
+
+    async def _recycle(self, page, slot):
+        """Give the slot a fresh context (unless a sibling worker already did) and move this worker onto it."""
+        if self._contexts[slot] is page.context:
+            self._contexts[slot] = await self._new_context()
+            self.recycled += 1
+        await self._close_page(page)
+        return await self._new_page(slot)
+
+    async def run(self, items, handler):
+        """
+        Run handler(page, item) for every item and return the results in input order.
+
+        Items whose handler raised come back as None. items may also be an async
+        generator (e.g. of urls still being discovered); its items are handed to
+        the pages as they arrive.
+        """
+        self._contexts = [await self._new_context() for _ in range(self.contexts)]
+        queue = asyncio.Queue()
+        results = {}
+
+        async def feed():
+            try:
+                if hasattr(items, '__aiter__'):
+                    idx = 0
+                    async with aclosing(items):
+                        async for item in items:
+                            results[idx] = None
+                            queue.put_nowait((idx, item))
+                            idx += 1
+                else:
+                    for idx, item in enumerate(items):
+                        results[idx] = None
+                        queue.put_nowait((idx, item))
+            finally:
+                for _ in range(self.pages):
+                    queue.put_nowait(None)
+
+        async def worker(number):
+            slot = number % self.contexts
+            page = await self._new_page(slot)
+            try:
+                while (entry := await queue.get()) is not None:
+                    idx, item = entry
+                    try:
+                        results[idx] = await handler(page, item)
+                    except Exception as e:
+                        log.warning("Worker %d failed on %s: %s", number, item, e)
+                    self.service.navigated(page.context)
+                    if page.crashed or page.is_closed():
+                        log.warning("Worker %d page crashed, replacing it", number)
+                        page = await self._replace_page(page, slot)
+                    elif self.service.due_for_recycle(page.context):
+                        page = await self._recycle(page, slot)
+            finally:
+                await self._close_page(page)
+
+        workers = [asyncio.create_task(worker(number)) for number in range(self.pages)]
+        try:
+            await feed()
+            await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            # Only still running if feeding the items failed or we were cancelled
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for context in list(self._open_pages):
+                await self.service.close_context(context)
+            self._open_pages.clear()
+            self._contexts = []
+        return [results[idx] for idx in sorted(results)]
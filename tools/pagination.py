@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+async def fetch_remaining_pages(page_urls, fetch_page, concurrency=4, collect='business_urls'):
+    """
+    Fetch search pages concurrently and collect their business urls (or another list, e.g. cards) in page order.
+
+    Args:
+        page_urls: Search page urls, in page order
+        fetch_page: Coroutine taking a url and returning the extractor's search_page
+                    dict, or None when the page failed and should just be skipped
+        concurrency: Maximum number of pages in flight at once
+        collect: Key of the search_page list gathered from every page
+
+    As soon as one page returns "No results" or no business links, every page
+    after it that is still queued or in flight is cancelled.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    last_page = [len(page_urls)]
+
+    async def run(idx, url):
+        async with semaphore:
+            if idx >= last_page[0]:
+                return
+            try:
+                search = await fetch_page(url)
+            except Exception as e:
+                log.warning("Error processing page %s: %s", url, e)
+                return
+        if search is None:
+            return
+        if search['no_results'] or not search['business_urls']:
+            log.debug("End of results at %s, cancelling later pages", url)
+            last_page[0] = min(last_page[0], idx)
+            for later in tasks[idx + 1:]:
+                later.cancel()
+            return
+        results[idx] = search[collect]
+
+    tasks = [asyncio.create_task(run(idx, url)) for idx, url in enumerate(page_urls)]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    business_urls = []
+    for idx in sorted(results):
+        if idx < last_page[0]:
+            business_urls.extend(results[idx])
+    return business_urls
+
+
+async def stream_remaining_pages(page_urls, fetch_page, concurrency=4, collect='business_urls'):
+    """
+    fetch_remaining_pages as an async generator: yields each page's list as soon as that page is in.
+
+    Pages finish out of order, so lists come roughly, not strictly, in page order.
+    The first "No results" page still cancels every page after it; a later page
+    that finished before it was seen is yielded all the same.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    last_page = [len(page_urls)]
+
+    async def run(idx, url):
+        async with semaphore:
+            if idx >= last_page[0]:
+                return None
+            try:
+                search = await fetch_page(url)
+            except Exception as e:
+                log.warning("Error processing page %s: %s", url, e)
+                return None
+        if search is None:
+            return None
+        if search['no_results'] or not search['business_urls']:
+            log.debug("End of results at %s, cancelling later pages", url)
+            last_page[0] = min(last_page[0], idx)
+            for later in tasks[idx + 1:]:
+                later.cancel()
+            return None
+        return search[collect]
+
+    tasks = [asyncio.create_task(run(idx, url)) for idx, url in enumerate(page_urls)]
+    pending = set(tasks)
+    try:
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                if not task.cancelled() and task.result():
+                    yield task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,187 @@
+import os
+import asyncio
+import inspect
+import logging
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.extraction import extract_business, timed_extract_business
+from tools.metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
+
+
+class ParsePool:
+    """
+    Runs the CPU-bound HTML parsing and extraction in worker processes.
+
+    Each worker keeps its own compiled selectors, so the event loop only ships
+    raw bodies out and BusinessRecords back and never stalls on a large page.
+    With workers=0 parsing happens inline, which is handy when debugging.
+
+    Args:
+        workers: Number of worker processes (default: one per core)
+        engine: Engine label of the parse/extract metrics
+    """
+
+    def __init__(self, workers=None, engine='static'):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.engine = engine
+        self._executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+
+    async def parse(self, body, url):
+        """Extract the business records of one detail page body."""
+        if self._executor is None:
+            return extract_business(body, url, self.engine)
+        records, parse_seconds, extract_seconds = await asyncio.get_running_loop().run_in_executor(
+            self._executor, timed_extract_business, body, url
+        )
+        metrics = get_metrics()
+        metrics.observe('parse', parse_seconds, engine=self.engine, page_type='detail')
+        metrics.observe('extract', extract_seconds, engine=self.engine, page_type='detail')
+        return records
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def run_pipeline(urls, fetch, parse, write, fetchers=20, parsers=None, queue_size=64, on_error=None):
+    """
+    Scrape urls through three stages connected by bounded queues: fetch -> parse -> write.
+
+    Args:
+        urls: Detail page urls to scrape; an async generator (e.g. of urls still being
+              discovered) is consumed while the pipeline runs
+        fetch: Coroutine taking a url and returning its body (None to skip it)
+        parse: Coroutine taking (body, url) and returning a list of records
+        write: Function (or coroutine) taking (url, records), called from a single writer task
+        fetchers: Number of concurrent fetch tasks
+        parsers: Number of bodies handed to parse at once (default: one per core)
+        queue_size: Capacity of each queue; a slow stage makes the ones before it wait
+        on_error: Optional function taking (url, exception) for every url whose fetch or parse failed
+
+    Returns the number of records written. If any stage raises, the whole
+    pipeline is cancelled and the error propagates.
+    """
+    parsers = parsers or os.cpu_count() or 1
+    parse_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    written = [0]
+    if hasattr(urls, '__aiter__'):
+        url_queue = asyncio.Queue(maxsize=queue_size)
+
+        async def feed():
+            async with aclosing(urls):
+                async for url in urls:
+                    await url_queue.put(url)
+            for _ in range(fetchers):
+                await url_queue.put(None)
+
+        next_url = url_queue.get
+    else:
+        pending = iter(urls)
+
+        async def feed():
+            pass
+
+        async def next_url():
+            return next(pending, None)
+
+    async def fetcher():
+        while (url := await next_url()) is not None:
+            try:
+                body = await fetch(url)
+            except Exception as e:
+                log.warning("Fetch failed for %s: %s", url, e)
+                body = None
+                if on_error is not None:
+                    on_error(url, e)
+            await parse_queue.put((url, body))
+
+    async def parser():
+        while (item := await parse_queue.get()) is not None:
+            url, body = item
+            records = []
+            if body:
+                try:
+                    records = await parse(body, url)
+                except Exception as e:
+                    log.warning("Parse failed for %s: %s", url, e)
+                    if on_error is not None:
+                        on_error(url, e)
+            await write_queue.put((url, records))
+
+    async def writer():
+        while (item := await write_queue.get()) is not None:
+            url, records = item
+            result = write(url, records)
+            if inspect.isawaitable(result):
+                await result
+            written[0] += len(records)
+
+    async def fetch_stage():
+        workers = [asyncio.create_task(fetcher()) for _ in range(fetchers)]
+        try:
+            await feed()
+            await asyncio.gather(*workers)
+        finally:
+            # Only still running if feeding the urls failed or we were cancelled
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        for _ in range(parsers):
+            await parse_queue.put(None)
+
+    async def parse_stage():
+        await asyncio.gather(*[parser() for _ in range(parsers)])
+        await write_queue.put(None)
+
+    tasks = [asyncio.create_task(stage()) for stage in (fetch_stage, parse_stage, writer)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return written[0]
+
+
+async def stream_records(produce, queue_size=64):
+    """
+    Run produce(emit) in the background and yield every record it emits, as it emits it.
+
+    emit is a coroutine taking one record. The queue in between is bounded, so a
+    consumer that falls behind pauses the producer instead of piling records up.
+    An error in produce is raised from the iteration; leaving the loop early
+    cancels produce.
+    """
+    records = asyncio.Queue(maxsize=queue_size)
+    done = object()
+    error = []
+
+    async def run():
+        try:
+            await produce(records.put)
+        except Exception as e:
+            error.append(e)
+        await records.put(done)
+
+    producer = asyncio.create_task(run())
+    try:
+        while (record := await records.get()) is not done:
+            yield record
+        if error:
+            raise error[0]
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
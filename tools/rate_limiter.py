@@ -0,0 +1,77 @@
+import os
+import random
+import asyncio
+from urllib.parse import urlsplit
+
+
+class HostRateLimiter:
+    """
+    Asyncio token bucket per host.
+
+    Every fetch (aiohttp or Playwright) awaits acquire(url) before it goes out.
+    Waiting happens with asyncio.sleep, so only the request being paced waits
+    while everything already in flight keeps running. The bucket is only a
+    ceiling: below it the AdaptiveConcurrency limits find the sustainable
+    throughput, and a rate of 0 leaves pacing to them entirely.
+
+    Args:
+        rate: Requests per second allowed for each host (0: no limit)
+        burst: Requests a host may receive back to back before pacing starts (default: max(2, rate))
+        jitter: Up to this many extra seconds added at random to every paced wait
+        per_host: Optional {host: (rate, burst)} overrides
+    """
+
+    def __init__(self, rate=1.0, burst=None, jitter=0.5, per_host=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(2, int(rate))
+        self.jitter = jitter
+        self.per_host = per_host or {}
+        self._buckets = {}
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.per_host.get(host, (self.rate, self.burst))
+            bucket = self._buckets[host] = {
+                'rate': rate,
+                'burst': burst,
+                'tokens': float(burst),
+                'updated': asyncio.get_running_loop().time(),
+            }
+        return bucket
+
+    def reserve(self, url):
+        """Take a token for the url's host and return how long the caller must wait for it."""
+        bucket = self._bucket(urlsplit(url).hostname or '')
+        if bucket['rate'] <= 0:
+            return 0
+        now = asyncio.get_running_loop().time()
+        bucket['tokens'] = min(bucket['burst'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+        bucket['tokens'] -= 1
+        if bucket['tokens'] >= 0:
+            return 0
+        # A negative balance is the queue of callers already waiting on this host.
+        return -bucket['tokens'] / bucket['rate'] + random.uniform(0, self.jitter)
+
+    async def acquire(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    """Return the process-wide HostRateLimiter shared by every fetch path, at YP_RATE requests/s per host (default 1)."""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostRateLimiter(rate=float(os.environ.get('YP_RATE', 1.0)))
+    return _limiter
+
+
+def set_rate_limiter(limiter):
+    """Replace the process-wide limiter, e.g. to lift the politeness limit against a local server."""
+    global _limiter
+    _limiter = limiter
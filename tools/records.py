@@ -0,0 +1,73 @@
+import sys
+
+
+# Record attribute -> exported column name. The single source of truth for the
+# business schema: extraction, the sinks and the checkpoint all go through it.
+COLUMNS = (
+    ('business', 'Business'),
+    ('contact', 'Contact'),
+    ('email', 'Email'),
+    ('address', 'Address'),
+    ('map_and_direction', 'Map and direction'),
+    ('review', 'Review'),
+    ('review_count', 'Review count'),
+    ('hyperlink', 'Hyperlink'),
+    ('images', 'Images'),
+    ('website', 'Website'),
+)
+
+FIELDS = tuple(field for field, _ in COLUMNS)
+COLUMN_NAMES = tuple(column for _, column in COLUMNS)
+FIELD_BY_COLUMN = {column: field for field, column in COLUMNS}
+
+# Low-cardinality fields; equal values share one string object across all records.
+INTERNED = ('review', 'review_count')
+
+
+class BusinessRecord:
+    """
+    One scraped business listing.
+
+    A slotted object instead of a dict keyed by display names: no per-record key
+    storage or hash table, and the categorical fields in INTERNED are interned, so
+    large in-memory batches take a fraction of the memory. Use to_row() / values()
+    to get the exported column names back.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, business='', contact='', email='', address='', map_and_direction='',
+                 review='', review_count='', hyperlink='', images='', website=''):
+        self.business = business
+        self.contact = contact
+        self.email = email
+        self.address = address
+        self.map_and_direction = map_and_direction
+        self.review = sys.intern(review)
+        self.review_count = sys.intern(review_count)
+        self.hyperlink = hyperlink
+        self.images = images
+        self.website = website
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a dict keyed by the exported column names (e.g. a checkpointed row)."""
+        return cls(**{FIELD_BY_COLUMN[column]: value or '' for column, value in row.items() if column in FIELD_BY_COLUMN})
+
+    def merged(self, other):
+        """A copy of this record with its blank fields taken from other."""
+        return BusinessRecord(**{field: getattr(self, field) or getattr(other, field) for field in FIELDS})
+
+    def values(self):
+        """Field values in COLUMN_NAMES order."""
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def to_row(self):
+        """Dict keyed by the exported column names, as the Excel/CSV/JSONL outputs expect."""
+        return dict(zip(COLUMN_NAMES, self.values()))
+
+    def __eq__(self, other):
+        return isinstance(other, BusinessRecord) and self.values() == other.values()
+
+    def __repr__(self):
+        return f"BusinessRecord(business={self.business!r}, hyperlink={self.hyperlink!r})"
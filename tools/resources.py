@@ -0,0 +1,106 @@
+import os
+import time
+import random
+import logging
+import threading
+from array import array
+
+import yaml
+
+
+log = logging.getLogger(__name__)
+
+
+class UserAgentPool:
+    """
+    User agents packed into one bytes blob plus an array of line offsets.
+
+    Eight thousand agents cost a few hundred KB this way instead of one str
+    object (and list slot) per line.
+    """
+
+    def __init__(self, lines):
+        encoded = [line.encode('utf-8') for line in lines if line.strip()]
+        self._blob = b''.join(encoded)
+        self._offsets = array('I', [0])
+        for line in encoded:
+            self._offsets.append(self._offsets[-1] + len(line))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(f.read().splitlines())
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        return self._blob[self._offsets[idx]:self._offsets[idx + 1]].decode('utf-8')
+
+    def choice(self):
+        return self[random.randrange(len(self))]
+
+
+def load_yaml(path):
+    with open(path) as file:
+        return yaml.load(file, Loader=yaml.SafeLoader)
+
+
+class ResourceRegistry:
+    """
+    Process-wide, load-once cache of file-backed resources (selectors, user agents).
+
+    A resource is loaded lazily on first use and kept in memory. At most every
+    check_interval seconds its file's mtime is compared with the one it was loaded
+    from, and the file is reloaded only when it changed, so a fixed selectors.yml
+    is picked up by a long run without a restart. If a reload fails (e.g. the file
+    is saved half-edited) the previous version stays in use.
+
+    Args:
+        check_interval: Seconds between mtime checks of the same resource
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, name, path, loader):
+        """Return the resource called name, loading path with loader(path) the first time or after it changed."""
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and now - entry['checked_at'] < self.check_interval:
+            return entry['value']
+        with self._lock:
+            entry = self._entries.get(name)
+            mtime = os.stat(path).st_mtime_ns
+            if entry is None:
+                entry = self._entries[name] = {'value': loader(path), 'mtime': mtime, 'checked_at': now}
+            elif mtime != entry['mtime']:
+                try:
+                    entry['value'] = loader(path)
+                    log.info("Reloaded %s", path)
+                except Exception as e:
+                    log.warning("Could not reload %s, keeping the previous version: %s", path, e)
+                entry['mtime'] = mtime
+            entry['checked_at'] = now
+            return entry['value']
+
+    def invalidate(self, name=None):
+        """Forget one resource (or all of them) so the next load reads the file again."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+_registry = None
+
+
+def get_registry():
+    """Return the process-wide ResourceRegistry."""
+    global _registry
+    if _registry is None:
+        _registry = ResourceRegistry()
+    return _registry
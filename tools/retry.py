@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+
+import aiohttp
+
+from tools.metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
+
+# Statuses worth asking again for; any other non-2xx answer will not change
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class FetchFailed(Exception):
+    """
+    A fetch that did not produce a usable page.
+
+    Args:
+        url: The url that failed
+        reason: Short description, e.g. "HTTP 503" or "timeout"
+        retryable: Whether asking again later could succeed
+        retry_after: Seconds the server asked us to wait (Retry-After), if any
+    """
+
+    def __init__(self, url, reason, retryable=False, retry_after=None):
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.reason = reason
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def status_error(url, status, headers=None):
+    """FetchFailed for a non-200 response, retryable for 429/5xx and honouring Retry-After."""
+    retry_after = None
+    headers = headers or {}
+    # aiohttp headers are case-insensitive, Playwright's are lower-cased
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if value:
+        try:
+            retry_after = float(value)
+        except ValueError:
+            pass  # HTTP-date form; fall back to our own backoff
+    return FetchFailed(url, f"HTTP {status}", status in RETRYABLE_STATUSES, retry_after)
+
+
+def is_retryable(error):
+    """Timeouts, connection resets and 429/5xx are transient; everything else is permanent."""
+    if isinstance(error, FetchFailed):
+        return error.retryable
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError)):
+        return True
+    # Playwright raises its own TimeoutError and net::ERR_* errors for resets and DNS hiccups
+    return type(error).__name__ == 'TimeoutError' or 'net::ERR_' in str(error)
+
+
+def describe(error):
+    if isinstance(error, FetchFailed):
+        return error.reason
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+class RetryPolicy:
+    """
+    Capped exponential backoff with full jitter, within a per-url and a per-run budget.
+
+    Every fetch path runs its attempt through run(); transient failures are retried
+    after a random delay between 0 and min(max_delay, base_delay * 2 ** retry),
+    or the server's Retry-After if that is longer. Once the run budget is spent,
+    failures are no longer retried, so a dead host costs a bounded amount of time.
+
+    Args:
+        max_attempts: Attempts per url, the first one included
+        base_delay: Seconds of the first backoff step
+        max_delay: Cap of a single backoff
+        run_budget: Retries allowed across the whole run
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0, run_budget=1000):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.run_budget = run_budget
+        self.retries = 0
+        self.metrics = get_metrics()
+
+    def delay(self, retry, retry_after=None):
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        if retry_after:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+    async def run(self, url, attempt, engine='static'):
+        """
+        Await attempt() until it succeeds, fails permanently or the budgets run out.
+
+        Raises FetchFailed (or the permanent error itself) with the last failure.
+        """
+        for number in range(1, self.max_attempts + 1):
+            try:
+                return await attempt()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if number == self.max_attempts or self.retries >= self.run_budget:
+                    self.metrics.inc('retries_exhausted', engine=engine)
+                    raise FetchFailed(url, f"{describe(e)} after {number} attempts", True) from e
+                self.retries += 1
+                self.metrics.inc('retries', engine=engine)
+                wait = self.delay(number - 1, getattr(e, 'retry_after', None))
+                log.debug("Retrying %s in %.1fs (attempt %d failed: %s)", url, wait, number, describe(e))
+                await asyncio.sleep(wait)
+
+    def summary(self):
+        return f"Retries: {self.retries} used of a {self.run_budget} run budget"
+
+
+class DeadLetters:
+    """
+    Append-only JSON lines file of urls that still failed after their retries.
+
+    One line per failure with the url, its kind ('search' or 'detail'), the reason
+    and whether it is worth replaying. replay_dead_letters.py feeds them back
+    through the scrapers later.
+
+    Args:
+        path: Path of the dead-letter file
+    """
+
+    def __init__(self, path='dead_letters.jsonl'):
+        self.path = path
+        self.added = 0
+
+    def add(self, url, error, kind='detail', retryable=None):
+        """Record a failed url; error is the exception (or a reason string)."""
+        if retryable is None:
+            retryable = is_retryable(error) if isinstance(error, BaseException) else True
+        entry = {
+            'url': url,
+            'kind': kind,
+            'reason': describe(error) if isinstance(error, BaseException) else str(error),
+            'retryable': retryable,
+            'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.added += 1
+        get_metrics().inc('dead_letters', kind=kind)
+        log.warning("Gave up on %s (%s), saved to %s", url, entry['reason'], self.path)
+
+    def entries(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def latest(self):
+        """Every failed url once, with its most recent entry. The file is left as it is."""
+        return list({entry['url']: entry for entry in self.entries()}.values())
+
+    def replace(self, entries):
+        """Rewrite the file with entries only (e.g. what still fails after a replay), atomically."""
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(self.path + '.tmp', self.path)
+
+    def summary(self):
+        return f"Dead letters: {self.added} urls saved to {self.path} this run"
+
+
+_policy = None
+_dead_letters = None
+
+
+def get_retry_policy():
+    """Return the process-wide RetryPolicy (its run budget is shared by every fetch path)."""
+    global _policy
+    if _policy is None:
+        _policy = RetryPolicy()
+    return _policy
+
+
+def set_retry_policy(policy):
+    global _policy
+    _policy = policy
+
+
+def get_dead_letters():
+    """Return the process-wide DeadLetters file."""
+    global _dead_letters
+    if _dead_letters is None:
+        _dead_letters = DeadLetters(os.environ.get('YP_DEAD_LETTERS', 'dead_letters.jsonl'))
+    return _dead_letters
+
+
+def set_dead_letters(dead_letters):
+    global _dead_letters
+    _dead_letters = dead_letters
@@ -0,0 +1,56 @@
+import asyncio
+
+
+# 2020 census population in millions. Listing counts scale roughly with it, so it
+# orders states sensibly before any real counts are known.
+STATE_POPULATION = {
+    'AL': 5.0, 'AK': 0.7, 'AZ': 7.2, 'AR': 3.0, 'CA': 39.5, 'CO': 5.8, 'CT': 3.6, 'DE': 1.0,
+    'FL': 21.5, 'GA': 10.7, 'HI': 1.5, 'ID': 1.8, 'IL': 12.8, 'IN': 6.8, 'IA': 3.2, 'KS': 2.9,
+    'KY': 4.5, 'LA': 4.7, 'ME': 1.4, 'MD': 6.2, 'MA': 7.0, 'MI': 10.1, 'MN': 5.7, 'MS': 3.0,
+    'MO': 6.2, 'MT': 1.1, 'NE': 2.0, 'NV': 3.1, 'NH': 1.4, 'NJ': 9.3, 'NM': 2.1, 'NY': 20.2,
+    'NC': 10.4, 'ND': 0.8, 'OH': 11.8, 'OK': 4.0, 'OR': 4.2, 'PA': 13.0, 'RI': 1.1, 'SC': 5.1,
+    'SD': 0.9, 'TN': 6.9, 'TX': 29.1, 'UT': 3.3, 'VT': 0.6, 'VA': 8.6, 'WA': 7.7, 'WV': 1.8,
+    'WI': 5.9, 'WY': 0.6,
+}
+
+
+def estimate_sizes(keys, known=None, prior=STATE_POPULATION):
+    """
+    Expected number of listings for each job key.
+
+    Keys with a known count (e.g. from an earlier run) use it. The rest get their
+    prior (population by default) scaled by the listings-per-prior ratio of the
+    known keys, so known and estimated sizes are comparable.
+    """
+    known = {key: count for key, count in (known or {}).items() if count}
+    known_prior = sum(prior.get(key, 0) for key in known)
+    ratio = sum(known.values()) / known_prior if known_prior else 1
+    return {key: known.get(key, prior.get(key, 0) * ratio) for key in keys}
+
+
+async def run_longest_first(jobs, sizes, concurrency=3, on_done=None):
+    """
+    Run jobs concurrently, biggest first, at most concurrency at a time.
+
+    Starting the longest jobs first (LPT scheduling) keeps a big state like CA
+    from running alone at the end while small ones fill the remaining slots.
+
+    Args:
+        jobs: Dict of job key -> coroutine function taking no arguments
+        sizes: Dict of job key -> expected size (see estimate_sizes)
+        concurrency: Number of jobs running at once
+        on_done: Optional function called with (key, result) as each job finishes
+
+    Returns a dict of key -> result, in completion order.
+    """
+    order = iter(sorted(jobs, key=lambda key: sizes.get(key, 0), reverse=True))
+    results = {}
+
+    async def worker():
+        for key in order:
+            results[key] = await jobs[key]()
+            if on_done is not None:
+                on_done(key, results[key])
+
+    await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, len(jobs))))])
+    return results
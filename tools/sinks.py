@@ -0,0 +1,296 @@
+import os
+import re
+import csv
+import json
+import time
+import uuid
+from urllib.parse import urlsplit, parse_qs
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from tools.functionalities import create_path
+from tools.records import COLUMN_NAMES
+from tools.metrics import get_metrics
+
+
+class RecordSink:
+    """
+    Receives BusinessRecords one by one as each listing finishes.
+
+    Subclasses implement _write_record; write() counts records and close() must be
+    called once the run is over.
+    """
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, record):
+        self._write_record(record)
+        self.written += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _write_record(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _FileSink(RecordSink):
+    """Buffered text-file sink that flushes and fsyncs at most every fsync_interval seconds."""
+
+    def __init__(self, path, fsync_interval=5.0, buffer_records=200, append=False):
+        super().__init__()
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.buffer_records = buffer_records
+        self._append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def write(self, record):
+        super().write(record)
+        self._pending += 1
+        if self._pending >= self.buffer_records or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+class JsonlSink(_FileSink):
+    """One JSON object per line."""
+
+    def _write_record(self, record):
+        self._file.write(json.dumps(record.to_row(), ensure_ascii=False) + '\n')
+
+
+class ChangeSink(_FileSink):
+    """JSON lines of refresh changes: {"change": "new" | "changed" | "removed", "url": ..., <record columns>}."""
+
+    def write_change(self, change, url, record=None):
+        self.write((change, url, record))
+
+    def _write_record(self, item):
+        change, url, record = item
+        row = {'change': change, 'url': url}
+        if record is not None:
+            row.update(record.to_row())
+        self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+class CsvSink(_FileSink):
+    """CSV with the record columns as header."""
+
+    def __init__(self, path, fsync_interval=5.0, buffer_records=200, append=False):
+        super().__init__(path, fsync_interval, buffer_records, append)
+        self._writer = csv.writer(self._file)
+        if not self._append:
+            self._writer.writerow(COLUMN_NAMES)
+
+    def _write_record(self, record):
+        self._writer.writerow(record.values())
+
+
+class ExcelSink(RecordSink):
+    """
+    Streams rows into an .xlsx with openpyxl's write-only mode, so memory stays flat.
+
+    The workbook is only valid once close() saves it; pair it with a JSONL or CSV
+    sink when partial output has to survive a crash.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(COLUMN_NAMES)
+
+    def _write_record(self, record):
+        self._sheet.append(record.values())
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.save(self.path)
+            self._workbook = None
+
+
+# Typed columns of the Parquet output; everything else stays a string.
+PARQUET_TYPES = {'Review': pa.float32(), 'Review count': pa.int32()}
+PARQUET_SCHEMA = pa.schema([(column, PARQUET_TYPES.get(column, pa.string())) for column in COLUMN_NAMES])
+
+RATING_WORDS = {'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5}
+
+
+def parse_rating(text):
+    """Star rating from the rating class words, e.g. "four half" -> 4.5. None when missing."""
+    words = str(text or '').lower().split()
+    stars = [RATING_WORDS[word] for word in words if word in RATING_WORDS]
+    if not stars:
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return None
+    return stars[0] + (0.5 if 'half' in words else 0.0)
+
+
+def parse_count(text):
+    digits = re.sub(r"\D", "", str(text or ''))
+    return int(digits) if digits else None
+
+
+def normalize_phone(text):
+    """US numbers as +1XXXXXXXXXX; anything else is kept as scraped (None when empty)."""
+    text = str(text or '').strip()
+    digits = re.sub(r"\D", "", text)
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return f"+1{digits}"
+    return text or None
+
+
+def typed_record(record):
+    """Convert a scraped (all-string) BusinessRecord to the Parquet column types."""
+    row = {column: value or None for column, value in zip(COLUMN_NAMES, record.values())}
+    row['Contact'] = normalize_phone(record.contact)
+    row['Review'] = parse_rating(record.review)
+    row['Review count'] = parse_count(record.review_count)
+    return row
+
+
+def partition_value(value):
+    """Make a state/category safe to use as a directory name."""
+    return re.sub(r"[^\w.-]+", "_", str(value).strip()).strip('_') or 'unknown'
+
+
+def search_partition(search_url):
+    """
+    State and category partition of a search url, plus the part file its records go to.
+
+    "?search_terms=Barbers&geo_location_terms=Moreno Valley, CA"
+        -> {'state': 'CA', 'category': 'barbers', 'part': 'moreno_valley_ca'}
+
+    Searches of several cities of one state land in the same partition, each in a
+    part file named after its location.
+    """
+    query = parse_qs(urlsplit(search_url).query)
+    geo = query.get('geo_location_terms', [''])[0].strip()
+    state = geo.split(',')[-1].strip()
+    return {
+        'state': state.upper() if len(state) == 2 else geo or 'unknown',
+        'category': query.get('search_terms', ['unknown'])[0].strip().lower(),
+        'part': partition_value(geo).lower(),
+    }
+
+
+class ParquetSink(RecordSink):
+    """
+    Typed Parquet output, hive-partitioned as <root>/state=<state>/category=<category>/.
+
+    Rows are buffered column by column and written as row groups of row_group_size.
+    Strings are dictionary encoded and the file is zstd compressed. Each sink
+    writes its own part-<part>.parquet next to the other parts of the partition,
+    under a temporary name that close() moves into place, so a crashed run never
+    leaves a half-written file behind. A resumed run of the same search (same
+    part) replaces its own part file only; without a part the file gets a unique
+    name and is never replaced.
+
+    Args:
+        root: Directory holding the partitioned dataset
+        state: Value of the state partition (e.g. 'WA')
+        category: Value of the category partition (e.g. 'restaurants')
+        part: Name of this sink's part file, e.g. the searched location (default: a uuid)
+        row_group_size: Rows per Parquet row group
+    """
+
+    def __init__(self, root, state, category, part=None, row_group_size=50_000):
+        super().__init__()
+        directory = os.path.join(root, f"state={partition_value(state)}", f"category={partition_value(category)}")
+        os.makedirs(directory, exist_ok=True)
+        part = partition_value(part) if part else uuid.uuid4().hex
+        self.path = os.path.join(directory, f'part-{part}.parquet')
+        self.row_group_size = row_group_size
+        self._columns = {name: [] for name in PARQUET_SCHEMA.names}
+        self._buffered = 0
+        self._writer = None
+
+    def _write_record(self, record):
+        for name, value in typed_record(record).items():
+            self._columns[name].append(value)
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path + '.tmp', PARQUET_SCHEMA, compression='zstd', use_dictionary=True)
+        self._writer.write_table(pa.Table.from_pydict(self._columns, schema=PARQUET_SCHEMA))
+        self._columns = {name: [] for name in PARQUET_SCHEMA.names}
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self.path + '.tmp', self.path)
+
+
+def load_parquet(root='Yellowpage database//parquet', states=None, columns=None):
+    """
+    Load the partitioned Parquet dataset into one pandas DataFrame.
+
+    state and category come back as categorical columns; pass states (e.g. ['WA', 'OR'])
+    to read only those partitions.
+    """
+    dataset = ds.dataset(root, format='parquet', partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+    filter = ds.field('state').isin(states) if states else None
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def default_sinks(filename_prefix, directory='Yellowpage database', partition=None):
+    """
+    The standard outputs for a run: a crash-safe CSV that grows as we go, plus the usual .xlsx.
+
+    With a partition ({'state': ..., 'category': ..., 'part': ...}, see search_partition())
+    the records also go to the typed Parquet dataset under <directory>/parquet.
+    """
+    create_path(directory)
+    sinks = [
+        CsvSink(f'{directory}//{filename_prefix}.csv'),
+        ExcelSink(f'{directory}//{filename_prefix}.xlsx'),
+    ]
+    if partition:
+        sinks.append(ParquetSink(f'{directory}//parquet', **partition))
+    return sinks
+
+
+def write_all(sinks, records):
+    metrics = get_metrics()
+    with metrics.timer('write'):
+        for sink in sinks:
+            sink.write_many(records)
+    metrics.inc('records_written', len(records))
+
+
+def close_all(sinks):
+    for sink in sinks:
+        sink.close()
@@ -0,0 +1,197 @@
+import zlib
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+
+RATINGS = ('one', 'one half', 'two', 'two half', 'three', 'three half', 'four', 'four half', 'five')
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><title>{terms} in {geo} | YP.com</title></head>
+<body>
+<div class="breadcrumb"><span>{terms_title}</span> <span>{geo}</span></div>
+<div class="search-term"><h1>{heading}</h1></div>
+<div class="search-results organic">
+{results}
+</div>
+<div class="pagination"><span>Showing {first}-{last} of {total}</span></div>
+{padding}
+</body></html>"""
+
+SEARCH_RESULT = """<div class="result"><div class="info">
+<div class="info-section info-primary"><h2 class="n"><a class="business-name" href="{path}"><span>{name}</span></a></h2>
+<div class="categories"><a>{kind}</a><a>Restaurants</a></div>
+<a class="rating hasExtraRating" href="{path}#reviews"><div class="result-rating {rating} "></div><span class="count">({reviews})</span></a></div>
+<div class="info-section info-secondary"><div class="phones phone primary">{phone}</div>
+<div class="adr"><div class="street-address">{street}</div><div class="locality">{city}, {state} {zip}</div></div>
+<div class="links">{website_link}</div></div>
+</div></div>"""
+
+# Search cards only link the website of some listings, like the real result list
+CARD_WEBSITE = '<a class="track-visit-website" href="https://www.{slug}.example.com">Website</a>'
+
+
+BUSINESS_PAGE = """<!DOCTYPE html>
+<html><head><title>{name} - {city}, {state} | YP.com</title></head>
+<body>
+<header id="main-header"><h1 class="dockable business-name">{name}</h1>
+<a class="yp-ratings hasExtraRating" href="#reviews"><div class="rating-stars {rating}"></div><span class="count">({reviews})</span></a>
+</header>
+<section id="details-card">
+<a class="phone dockable" href="tel:{digits}"><strong>{phone}</strong></a>
+<a class="email-business" href="mailto:info@{slug}.example.com">Email Business</a>
+<span class="address">{street}, {city}, {state} {zip}</span>
+<a class="directions small-btn" href="/{city_slug}-{state_slug}/mip/{slug}-{lid}/directions">Directions</a>
+<a class="website-link dockable" href="https://www.{slug}.example.com">Visit Website</a>
+<img class="biz-card-thumbnail" src="https://i.example.com/{lid}.jpg">
+</section>
+{padding}
+</body></html>"""
+
+NAMES = ('Joe', 'Maria', 'Golden', 'Blue Door', 'Harbor', 'Main Street', 'Sunset', 'Old Town', 'Lucky', 'Green Leaf')
+KINDS = ('Pizza', 'Diner', 'Grill', 'Cafe', 'Taqueria', 'Noodle House', 'Bistro', 'BBQ', 'Bakery', 'Kitchen')
+
+
+def padding(kb):
+    """Filler markup so pages weigh about as much as real ones (parsing cost scales with size)."""
+    block = '<div class="filler"><p>' + 'lorem ipsum dolor sit amet ' * 12 + '</p></div>\n'
+    return block * (kb * 1024 // len(block))
+
+
+def listing_id(geo, page, idx):
+    """Stable listing id of result idx on a search page."""
+    return 1_000_000 + zlib.crc32(f"{geo}|{page}|{idx}".encode()) % 90_000_000
+
+
+def listing(lid, city, state):
+    """Deterministic fake listing; the search result and the detail page of one id always agree."""
+    rng = random.Random(lid)
+    first, kind = rng.choice(NAMES), rng.choice(KINDS)
+    name = f"{first} {kind}"
+    slug = '-'.join(name.lower().replace("'", '').split())
+    digits = f"{rng.randint(201, 989)}{rng.randint(200, 999)}{rng.randint(0, 9999):04d}"
+    return {
+        'lid': lid, 'name': name, 'slug': slug, 'city': city, 'state': state,
+        'city_slug': city.lower().replace(' ', '-'), 'state_slug': state.lower(),
+        'street': f"{rng.randint(1, 9999)} {rng.choice(('Main', 'Oak', 'Pine', '1st', 'Market'))} St",
+        'zip': f"{rng.randint(10000, 99999)}",
+        'digits': digits, 'phone': f"({digits[:3]}) {digits[3:6]}-{digits[6:]}",
+        'rating': rng.choice(RATINGS), 'reviews': rng.randint(1, 900), 'kind': kind,
+        'website_link': CARD_WEBSITE.format(slug=slug) if lid % 3 else '',
+    }
+
+
+def standin_app(pages=5, per_page=30, latency=0.05, jitter=0.5, error_rate=0.0, throttle_rate=0.0,
+                padding_kb=60, seed=0):
+    """
+    Local YellowPages stand-in serving search and business pages with the real markup.
+
+    Listings are generated deterministically from the search and page number, so
+    every run sees the same data. Point the scrapers at it with set_base_url() /
+    YP_BASE_URL / --base-url.
+
+    Args:
+        pages: Result pages per search; later pages answer "No results found"
+        per_page: Listings per search page
+        latency: Mean response delay in seconds
+        jitter: Delay varies uniformly by +/- this fraction of latency
+        error_rate: Fraction of requests answered with 503
+        throttle_rate: Fraction of requests answered with 429 and Retry-After
+        padding_kb: Filler added to every page, in KB
+        seed: Seed of the random latency/error injection
+    """
+    rng = random.Random(seed)
+    filler = padding(padding_kb)
+    stats = {'requests': 0, 'search': 0, 'detail': 0, '200': 0, '304': 0, '429': 0, '503': 0}
+
+    async def inject():
+        """Delay the response and maybe fail it. Returns an error response or None."""
+        stats['requests'] += 1
+        if latency:
+            await asyncio.sleep(latency * rng.uniform(1 - jitter, 1 + jitter))
+        roll = rng.random()
+        if roll < throttle_rate:
+            stats['429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'}, text='Too Many Requests')
+        if roll < throttle_rate + error_rate:
+            stats['503'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+        stats['200'] += 1
+        return None
+
+    async def search(request):
+        error = await inject()
+        if error is not None:
+            return error
+        stats['search'] += 1
+        terms = request.query.get('search_terms', 'restaurants')
+        geo = request.query.get('geo_location_terms', 'WA')
+        city = geo.split(',')[0].strip() if ',' in geo else 'Springfield'
+        state = geo.split(',')[-1].strip().upper()[:2]
+        page = int(request.query.get('page', 1))
+        total = pages * per_page
+        if page > pages:
+            results, heading = '', f"No results found for {terms}"
+        else:
+            heading = f"{terms.title()} in {geo}"
+            results = '\n'.join(
+                SEARCH_RESULT.format(
+                    path=f"/{item['city_slug']}-{item['state_slug']}/mip/{item['slug']}-{item['lid']}?lid={item['lid']}",
+                    **item,
+                )
+                for item in (listing(listing_id(geo, page, idx), city, state) for idx in range(per_page))
+            )
+        body = SEARCH_PAGE.format(
+            terms=terms, terms_title=terms.title(), geo=geo, heading=heading, results=results,
+            first=(page - 1) * per_page + 1, last=min(page * per_page, total), total=total, padding=filler,
+        )
+        return web.Response(text=body, content_type='text/html')
+
+    async def business(request):
+        error = await inject()
+        if error is not None:
+            return error
+        stats['detail'] += 1
+        lid = int(request.match_info['slug'].rsplit('-', 1)[-1])
+        city, _, state = request.match_info['city'].rpartition('-')
+        item = listing(lid, city.replace('-', ' ').title(), state.upper())
+        body = BUSINESS_PAGE.format(padding=filler, **item)
+        # Detail pages carry an ETag and answer If-None-Match like the real site's CDN
+        etag = f'"{zlib.crc32(body.encode()):08x}"'
+        if request.headers.get('If-None-Match') == etag:
+            stats['304'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=body, content_type='text/html', headers={'ETag': etag})
+
+    async def get_stats(request):
+        response = web.json_response(stats)
+        if request.query.get('reset'):
+            for key in stats:
+                stats[key] = 0
+        return response
+
+    app = web.Application()
+    app['stats'] = stats
+    app.add_routes([
+        web.get('/search', search),
+        web.get('/__stats', get_stats),
+        web.get('/{city}/mip/{slug}', business),
+    ])
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local YellowPages stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=5, help="result pages per search")
+    parser.add_argument('--per-page', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument('--padding-kb', type=int, default=60)
+    args = parser.parse_args()
+    web.run_app(standin_app(args.pages, args.per_page, args.latency, error_rate=args.error_rate,
+                            throttle_rate=args.throttle_rate, padding_kb=args.padding_kb),
+                host=args.host, port=args.port)
@@ -0,0 +1,169 @@
+import json
+import time
+import sqlite3
+
+
+class WorkQueue:
+    """
+    Lease-based work queue on SQLite, shared by any number of worker processes on one host.
+
+    Every task has a kind ('search' or 'listing') and a key that is unique per
+    kind, so the same listing can only ever be queued once. Workers lease a single
+    search or a batch of listings for ttl seconds, heartbeat to keep them, and complete or fail them.
+    A lease that runs out (crashed or stalled worker) goes back to the queue, and
+    a late completion from the worker that lost it is ignored.
+
+    Args:
+        path: SQLite file holding the queue
+        max_attempts: Times a task is handed out before it is marked failed
+    """
+
+    def __init__(self, path='crawl_queue.sqlite3', max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                UNIQUE (kind, key)
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, kind, id)")
+
+    def enqueue(self, kind, items):
+        """Queue (key, payload) pairs; keys already queued for this kind are skipped. Returns the number added."""
+        before = self.db.total_changes
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.executemany(
+            "INSERT OR IGNORE INTO tasks (kind, key, payload) VALUES (?, ?, ?)",
+            [(kind, str(key), json.dumps(payload)) for key, payload in items],
+        )
+        self.db.execute("COMMIT")
+        return self.db.total_changes - before
+
+    def lease(self, worker, batch=50, ttl=120, kinds=None):
+        """
+        Hand pending tasks to worker for ttl seconds. Returns a list of task dicts.
+
+        A search is a whole discovery, so searches go out one per lease (before any
+        listing) and every idle worker picks up one of its own; listings go out in
+        batches of up to batch.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self._requeue_expired(now)
+            kinds = kinds or ('search', 'listing')
+            rows = []
+            if 'search' in kinds:
+                rows = self.db.execute(
+                    "SELECT id, kind, key, payload FROM tasks WHERE status = 'pending' AND kind = 'search' "
+                    "ORDER BY id LIMIT 1"
+                ).fetchall()
+            if not rows and 'listing' in kinds:
+                rows = self.db.execute(
+                    "SELECT id, kind, key, payload FROM tasks WHERE status = 'pending' AND kind = 'listing' "
+                    "ORDER BY id LIMIT ?",
+                    (batch,),
+                ).fetchall()
+            self.db.executemany(
+                "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker, now + ttl, row[0]) for row in rows],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return [{'id': r[0], 'kind': r[1], 'key': r[2], 'payload': json.loads(r[3])} for r in rows]
+
+    def _requeue_expired(self, now):
+        self.db.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, error = COALESCE(error, 'lease expired') WHERE status = 'leased' AND lease_expires < ?",
+            (self.max_attempts, now),
+        )
+
+    def heartbeat(self, worker, ids, ttl=120):
+        """Extend worker's leases on ids. Returns the ids it still holds."""
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.executemany(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+            [(time.time() + ttl, task_id, worker) for task_id in ids],
+        )
+        held = self._held(worker, ids)
+        self.db.execute("COMMIT")
+        return held
+
+    def complete(self, worker, results):
+        """Store results ({task id: result}) for tasks worker still holds. Returns the accepted ids."""
+        self.db.execute("BEGIN IMMEDIATE")
+        held = self._held(worker, list(results))
+        self.db.executemany(
+            "UPDATE tasks SET status = 'done', owner = NULL, result = ?, error = NULL WHERE id = ?",
+            [(json.dumps(results[task_id]), task_id) for task_id in held],
+        )
+        self.db.execute("COMMIT")
+        return held
+
+    def fail(self, worker, ids, error=''):
+        """Give tasks back after an error; they are retried until max_attempts, then marked failed."""
+        self.db.execute("BEGIN IMMEDIATE")
+        held = self._held(worker, ids)
+        self.db.executemany(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, error = ? WHERE id = ?",
+            [(self.max_attempts, str(error), task_id) for task_id in held],
+        )
+        self.db.execute("COMMIT")
+        return held
+
+    def _held(self, worker, ids):
+        ids = [int(task_id) for task_id in ids]
+        if not ids:
+            return []
+        rows = self.db.execute(
+            f"SELECT id FROM tasks WHERE owner = ? AND status = 'leased' AND id IN ({','.join('?' * len(ids))})",
+            (worker, *ids),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        """Task counts per kind and status, e.g. {'listing': {'pending': 10, 'done': 5}}."""
+        stats = {}
+        for kind, status, count in self.db.execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+            stats.setdefault(kind, {})[status] = count
+        return stats
+
+    def results(self, kind):
+        """Yield (key, payload, result) of every finished task of a kind, in queue order."""
+        for key, payload, result in self.db.execute(
+            "SELECT key, payload, result FROM tasks WHERE kind = ? AND status = 'done' ORDER BY id", (kind,)
+        ).fetchall():
+            yield key, json.loads(payload), json.loads(result)
+
+    def close(self):
+        self.db.close()
+
+
+class AsyncWorkQueue:
+    """Async face of a local WorkQueue, so workers use it exactly like a RemoteWorkQueue."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __getattr__(self, name):
+        method = getattr(self.queue, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call